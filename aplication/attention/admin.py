@@ -1,4 +1,5 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.db import transaction
 from aplication.attention.models import (
     HorarioAtencion,
     CitaMedica,
@@ -7,7 +8,20 @@ from aplication.attention.models import (
     ExamenSolicitado,
     ServiciosAdicionales,
     CostosAtencion,
+    MovimientoMedicamento,
+    ResumenIngreso,
 )
+from aplication.attention.stock import StockInsuficiente, sincronizar_dispensacion
+from doctor.mixins import BusquedaPacienteAdminMixin, TablaGrandeAdminMixin
+
+
+# descuenta del stock lo recetado; sin stock suficiente se revierte todo el guardado
+def _dispensar(request, atencion_id):
+    try:
+        sincronizar_dispensacion(atencion_id)
+    except StockInsuficiente as error:
+        transaction.set_rollback(True)
+        messages.error(request, f'No se guardaron los cambios: {error}')
 
 # Admin para HorarioAtencion
 @admin.register(HorarioAtencion)
@@ -17,34 +31,81 @@ class HorarioAtencionAdmin(admin.ModelAdmin):
 
 # Admin para CitaMedica
 @admin.register(CitaMedica)
-class CitaMedicaAdmin(admin.ModelAdmin):
+class CitaMedicaAdmin(BusquedaPacienteAdminMixin, TablaGrandeAdminMixin, admin.ModelAdmin):
     list_display = ('paciente', 'fecha', 'hora_cita', 'estado')
     list_filter = ('estado', 'fecha')
-    search_fields = ('paciente__nombre',)
+    # __str__ del paciente en cada fila: se trae con el mismo JOIN
+    list_select_related = ('paciente',)
+    search_fields = ('paciente__apellidos', 'paciente__nombres', 'paciente__cedula')
+    autocomplete_fields = ('paciente',)
 
 # Admin para DetalleAtencion
 class DetalleAtencionInline(admin.TabularInline):
     model = DetalleAtencion
     extra = 1  # Número de formularios vacíos a mostrar
+    autocomplete_fields = ('medicamento',)
 
 # Admin para Atencion
 @admin.register(Atencion)
-class AtencionAdmin(admin.ModelAdmin):
+class AtencionAdmin(BusquedaPacienteAdminMixin, TablaGrandeAdminMixin, admin.ModelAdmin):
     list_display = ('paciente', 'fecha_atencion', 'motivo_consulta')
-    search_fields = ('paciente__nombre',)
+    list_select_related = ('paciente',)
+    search_fields = ('paciente__apellidos', 'paciente__nombres', 'paciente__cedula')
+    # el select multiple cargaria todo el catalogo CIE-10 en cada formulario
+    autocomplete_fields = ('paciente', 'diagnostico')
     inlines = [DetalleAtencionInline]  # Configura DetalleAtencion como inline
 
+    def get_queryset(self, request):
+        # __str__ muestra el paciente (autocompletado de atencion en detalles y costos)
+        return super().get_queryset(request).select_related('paciente')
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        _dispensar(request, form.instance.pk)
+
 # Admin para DetalleAtencion
 @admin.register(DetalleAtencion)
-class DetalleAtencionAdmin(admin.ModelAdmin):
+class DetalleAtencionAdmin(BusquedaPacienteAdminMixin, TablaGrandeAdminMixin, admin.ModelAdmin):
     list_display = ('atencion', 'medicamento', 'cantidad', 'prescripcion')
-    search_fields = ('atencion__paciente__nombre', 'medicamento__nombre')
+    # atencion -> paciente y medicamento -> tipo en el __str__ de cada fila
+    list_select_related = ('atencion__paciente', 'medicamento__tipo')
+    search_fields = ('atencion__paciente__apellidos', 'atencion__paciente__nombres', 'atencion__paciente__cedula',
+                     'medicamento__nombre')
+    paciente_lookup = 'atencion__paciente'
+    prefijo_fields = ('medicamento__nombre',)
+    autocomplete_fields = ('atencion', 'medicamento')
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        _dispensar(request, obj.atencion_id)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        _dispensar(request, obj.atencion_id)
+
+# Kardex de medicamentos: solo lectura, los movimientos los genera attention/stock.py
+@admin.register(MovimientoMedicamento)
+class MovimientoMedicamentoAdmin(TablaGrandeAdminMixin, admin.ModelAdmin):
+    list_display = ('fecha', 'medicamento', 'tipo', 'cantidad', 'atencion')
+    list_filter = ('tipo',)
+    list_select_related = ('medicamento__tipo', 'atencion__paciente')
+    search_fields = ('medicamento__nombre',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
 # Admin para ExamenSolicitado
 @admin.register(ExamenSolicitado)
-class ExamenSolicitadoAdmin(admin.ModelAdmin):
+class ExamenSolicitadoAdmin(BusquedaPacienteAdminMixin, TablaGrandeAdminMixin, admin.ModelAdmin):
     list_display = ('nombre_examen', 'paciente', 'fecha_solicitud', 'estado')
-    search_fields = ('nombre_examen', 'paciente__nombre')
+    list_select_related = ('paciente',)
+    list_filter = ('estado',)
+    search_fields = ('nombre_examen', 'paciente__apellidos', 'paciente__nombres', 'paciente__cedula')
+    prefijo_fields = ('nombre_examen',)
+    autocomplete_fields = ('paciente',)
 
 # Admin para ServiciosAdicionales
 @admin.register(ServiciosAdicionales)
@@ -54,8 +115,24 @@ class ServiciosAdicionalesAdmin(admin.ModelAdmin):
 
 # Admin para CostosAtencion
 @admin.register(CostosAtencion)
-class CostosAtencionAdmin(admin.ModelAdmin):
+class CostosAtencionAdmin(BusquedaPacienteAdminMixin, TablaGrandeAdminMixin, admin.ModelAdmin):
     list_display = ('atencion', 'total', 'fecha_registro')
-    search_fields = ('atencion__paciente__nombre',)
+    list_select_related = ('atencion__paciente',)
+    search_fields = ('atencion__paciente__apellidos', 'atencion__paciente__nombres', 'atencion__paciente__cedula')
+    paciente_lookup = 'atencion__paciente'
+    autocomplete_fields = ('atencion', 'servicios_adicionales')
+    # el total lo mantienen las señales de servicios_adicionales (attention/costs.py)
+    readonly_fields = ('total',)
+
+# Resumenes de ingresos: solo lectura, los mantiene attention/revenue.py
+@admin.register(ResumenIngreso)
+class ResumenIngresoAdmin(admin.ModelAdmin):
+    list_display = ('periodo', 'fecha', 'total', 'costos')
+    list_filter = ('periodo',)
+    date_hierarchy = 'fecha'
 
+    def has_add_permission(self, request):
+        return False
 
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,57 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from aplication.attention.models import CitaMedica
+
+# Agenda de citas por dia o semana. Cada dia se arma con una sola consulta con JOIN
+# a Paciente (values_list, sin instancias) y se guarda en cache ya listo para el JSON:
+# [id, 'HH:MM', estado, 'Apellidos Nombres', cedula]. Los dias pasados no cambian
+# salvo correcciones, asi que se cachean sin vencimiento; la invalidacion (ver
+# aplication/attention/signals.py) borra el dia cuando cambia una de sus citas o el
+# paciente de alguna de ellas.
+
+CAMPOS = ('id', 'hora', 'estado', 'paciente', 'cedula')
+TIMEOUT = 60 * 60
+
+
+def _clave(fecha):
+    return f'agenda:dia:{fecha.isoformat()}'
+
+
+def inicio_semana(fecha):
+    return fecha - timedelta(days=fecha.weekday())
+
+
+def agenda(desde, hasta=None):
+    # {fecha: [[id, hora, estado, paciente, cedula], ...]} para cada dia de [desde, hasta]
+    hasta = hasta or desde
+    fechas = [desde + timedelta(days=i) for i in range((hasta - desde).days + 1)]
+    encontrados = cache.get_many([_clave(fecha) for fecha in fechas])
+    dias = {fecha: encontrados[_clave(fecha)] for fecha in fechas if _clave(fecha) in encontrados}
+    faltantes = [fecha for fecha in fechas if fecha not in dias]
+    if faltantes:
+        nuevos = {fecha: [] for fecha in faltantes}
+        filas = (CitaMedica.objects.filter(fecha__range=(faltantes[0], faltantes[-1]))
+                 .order_by('fecha', 'hora_cita')
+                 .values_list('id', 'fecha', 'hora_cita', 'estado', 'paciente__apellidos', 'paciente__nombres', 'paciente__cedula'))
+        for id, fecha, hora, estado, apellidos, nombres, cedula in filas:
+            if fecha in nuevos:
+                nuevos[fecha].append([id, hora.strftime('%H:%M'), estado, f'{apellidos} {nombres}', cedula])
+        hoy = timezone.localdate()
+        pasados = {_clave(fecha): citas for fecha, citas in nuevos.items() if fecha < hoy}
+        vigentes = {_clave(fecha): citas for fecha, citas in nuevos.items() if fecha >= hoy}
+        if pasados:
+            cache.set_many(pasados, None)
+        if vigentes:
+            cache.set_many(vigentes, TIMEOUT)
+        dias.update(nuevos)
+    return {fecha: dias[fecha] for fecha in fechas}
+
+
+def invalidar_agenda(*fechas):
+    claves = [_clave(fecha) for fecha in fechas]
+    cache.delete_many(claves)
+    transaction.on_commit(lambda: cache.delete_many(claves))
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AttentionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'aplication.attention'
+
+    def ready(self):
+        # registra los receptores de señales (cache de disponibilidad)
+        from aplication.attention import signals  # noqa: F401
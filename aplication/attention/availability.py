@@ -0,0 +1,184 @@
+import bisect
+from datetime import date, datetime, time, timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from aplication.attention.models import CitaMedica, HorarioAtencion
+from aplication.core.models import Doctor
+
+# Motor de disponibilidad de turnos. La atencion es de la clinica (HorarioAtencion
+# y CitaMedica no tienen doctor), asi que la duracion del turno es la de los doctores
+# activos (Doctor.duracion_cita; 30 min si no hay ninguno).
+#
+# Para cada dia de la semana se compila una plantilla: la lista ordenada de inicios
+# de turno (minutos desde las 00:00) entre hora_inicio y hora_fin que no pisan el
+# descanso Intervalo_desde/Intervalo_hasta. La disponibilidad de un dia es un
+# bitmap (un int de Python, bit i = turno i libre) al que se le apagan los turnos
+# que se solapan con una cita no cancelada. Las citas canceladas ('C') liberan el turno.
+#
+# Cache: la plantilla (clave PLANTILLAS) y las horas ocupadas de cada fecha
+# (clave de ocupadas). Ver aplication/attention/signals.py para la invalidacion.
+
+PLANTILLAS = 'disponibilidad:plantillas'
+TIMEOUT = 60 * 60 * 24
+DURACION_POR_DEFECTO = 30
+HORIZONTE_DIAS = 120
+
+DIAS = {
+    'lunes': 0, 'martes': 1, 'miercoles': 2, 'miércoles': 2, 'jueves': 3,
+    'viernes': 4, 'sabado': 5, 'sábado': 5, 'domingo': 6,
+}
+
+
+def _clave_ocupadas(fecha):
+    return f'disponibilidad:ocupadas:{fecha.isoformat()}'
+
+
+def _minutos(hora):
+    return hora.hour * 60 + hora.minute
+
+
+def _hora(minutos):
+    return time(minutos // 60, minutos % 60)
+
+
+def duracion_turno():
+    duraciones = Doctor.objects.filter(activo=True, duracion_cita__gt=0).values_list('duracion_cita', flat=True)
+    return min(duraciones, default=DURACION_POR_DEFECTO)
+
+
+def compilar_plantilla(inicio, fin, descanso_desde, descanso_hasta, duracion):
+    # inicios de turno del dia; un turno que toca el descanso no se ofrece
+    inicios = []
+    actual = inicio
+    while actual + duracion <= fin:
+        if actual + duracion <= descanso_desde or actual >= descanso_hasta:
+            inicios.append(actual)
+            actual += duracion
+        else:
+            # el turno pisa el descanso: se retoma justo al final del descanso
+            actual = descanso_hasta
+    return inicios
+
+
+def plantillas():
+    # {dia_semana (0-6): (duracion, [inicios en minutos])}
+    datos = cache.get(PLANTILLAS)
+    if datos is None:
+        duracion = duracion_turno()
+        datos = {}
+        for horario in HorarioAtencion.objects.filter(activo=True):
+            dia = DIAS.get(horario.dia_semana.lower())
+            if dia is None:
+                continue
+            datos[dia] = (duracion, compilar_plantilla(
+                _minutos(horario.hora_inicio), _minutos(horario.hora_fin),
+                _minutos(horario.Intervalo_desde), _minutos(horario.Intervalo_hasta), duracion,
+            ))
+        cache.set(PLANTILLAS, datos, TIMEOUT)
+    return datos
+
+
+def ocupadas(desde, hasta):
+    # {fecha: [minutos de inicio de citas no canceladas]} para [desde, hasta]:
+    # una lectura de cache y a lo sumo una consulta para los dias faltantes
+    fechas = [desde + timedelta(days=i) for i in range((hasta - desde).days + 1)]
+    encontradas = cache.get_many([_clave_ocupadas(fecha) for fecha in fechas])
+    resultado = {fecha: encontradas[_clave_ocupadas(fecha)] for fecha in fechas if _clave_ocupadas(fecha) in encontradas}
+    faltantes = [fecha for fecha in fechas if fecha not in resultado]
+    if faltantes:
+        nuevas = {fecha: [] for fecha in faltantes}
+        citas = (CitaMedica.objects.filter(fecha__range=(faltantes[0], faltantes[-1])).exclude(estado='C')
+                 .order_by().values_list('fecha', 'hora_cita'))
+        for fecha, hora in citas:
+            if fecha in nuevas:
+                nuevas[fecha].append(_minutos(hora))
+        cache.set_many({_clave_ocupadas(fecha): minutos for fecha, minutos in nuevas.items()}, TIMEOUT)
+        resultado.update(nuevas)
+    return resultado
+
+
+def bitmap_dia(inicios, duracion, citas):
+    # todos los turnos libres y luego se apagan los que se solapan con cada cita:
+    # el turno [s, s+d) pisa la cita [c, c+d) si c-d < s < c+d
+    libres = (1 << len(inicios)) - 1
+    for cita in citas:
+        primero = bisect.bisect_right(inicios, cita - duracion)
+        ultimo = bisect.bisect_left(inicios, cita + duracion)
+        if primero < ultimo:
+            libres &= ~(((1 << (ultimo - primero)) - 1) << primero)
+    return libres
+
+
+def _turnos(bitmap, inicios, minimo):
+    turnos = []
+    while bitmap:
+        bit = bitmap & -bitmap
+        inicio = inicios[bit.bit_length() - 1]
+        if inicio >= minimo:
+            turnos.append(_hora(inicio))
+        bitmap ^= bit
+    return turnos
+
+
+def _minimo_del_dia(fecha, ahora):
+    # hoy solo cuentan los turnos que aun no empiezan
+    if fecha < ahora.date():
+        return 24 * 60
+    return _minutos(ahora.time()) + 1 if fecha == ahora.date() else 0
+
+
+def turnos_libres(desde, hasta=None):
+    # {fecha: [time, ...]} con los turnos libres de cada dia de [desde, hasta]
+    hasta = hasta or desde
+    ahora = timezone.localtime()
+    disponibles = plantillas()
+    citas = ocupadas(desde, hasta)
+    resultado = {}
+    for fecha, minutos in citas.items():
+        if fecha.weekday() not in disponibles:
+            continue
+        duracion, inicios = disponibles[fecha.weekday()]
+        bitmap = bitmap_dia(inicios, duracion, minutos)
+        turnos = _turnos(bitmap, inicios, _minimo_del_dia(fecha, ahora))
+        if turnos:
+            resultado[fecha] = turnos
+    return dict(sorted(resultado.items()))
+
+
+def proximos_libres(cantidad, desde=None, ventana=14):
+    # los proximos 'cantidad' turnos libres como datetime, buscando por ventanas
+    desde = desde or timezone.localdate()
+    limite = desde + timedelta(days=HORIZONTE_DIAS)
+    encontrados = []
+    while len(encontrados) < cantidad and desde <= limite:
+        hasta = min(desde + timedelta(days=ventana - 1), limite)
+        for fecha, turnos in turnos_libres(desde, hasta).items():
+            encontrados.extend(datetime.combine(fecha, hora) for hora in turnos)
+            if len(encontrados) >= cantidad:
+                break
+        desde = hasta + timedelta(days=1)
+    return encontrados[:cantidad]
+
+
+def esta_libre(fecha, hora):
+    return hora in turnos_libres(fecha).get(fecha, [])
+
+
+def como_fecha(fecha):
+    # una cita recien creada puede traer la fecha como texto 'AAAA-MM-DD'
+    return fecha if isinstance(fecha, date) else date.fromisoformat(fecha)
+
+
+def invalidar_fecha(*fechas):
+    claves = [_clave_ocupadas(como_fecha(fecha)) for fecha in fechas if fecha]
+    cache.delete_many(claves)
+    # una lectura concurrente pudo volver a cachear el dia antes del commit
+    transaction.on_commit(lambda: cache.delete_many(claves))
+
+
+def invalidar_plantillas():
+    cache.delete(PLANTILLAS)
+    transaction.on_commit(lambda: cache.delete(PLANTILLAS))
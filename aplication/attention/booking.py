@@ -0,0 +1,86 @@
+import random
+import time as reloj
+from datetime import date, datetime, time
+
+from django.db import IntegrityError, OperationalError, connections, router, transaction
+from django.utils import timezone
+
+from aplication.attention.availability import _minutos, plantillas, proximos_libres
+from aplication.attention.models import CitaMedica
+
+# Reserva de citas sin dobles reservas. La exclusividad del turno la garantiza la
+# restriccion parcial uniq_cita_turno (fecha, hora_cita) sobre las citas no
+# canceladas, asi que aunque dos recepcionistas reserven a la vez solo una fila entra.
+# En Postgres ademas se toma un advisory lock de transaccion por turno: las reservas
+# del mismo turno se esperan entre si y las de turnos distintos no se bloquean.
+# Un turno ocupado se responde con TurnoNoDisponible y algunas alternativas libres.
+
+REINTENTOS = 3
+ESPERA = 0.05  # segundos, se duplica en cada reintento (mas un azar para no reintentar en bloque)
+ALTERNATIVAS = 3
+
+
+class TurnoNoDisponible(Exception):
+    def __init__(self, mensaje, alternativas=()):
+        super().__init__(mensaje)
+        self.alternativas = list(alternativas)
+
+
+def _clave_lock(fecha, hora):
+    # entero unico por turno para pg_advisory_xact_lock
+    return fecha.toordinal() * 1440 + _minutos(hora)
+
+
+def validar_turno(fecha, hora):
+    # el turno debe existir en la plantilla del dia y no haber empezado
+    plantilla = plantillas().get(fecha.weekday())
+    if plantilla is None or _minutos(hora) not in plantilla[1] or hora.second:
+        raise TurnoNoDisponible('El horario no corresponde a un turno de atención.', _alternativas(fecha))
+    if timezone.make_aware(datetime.combine(fecha, hora)) <= timezone.now():
+        raise TurnoNoDisponible('El turno ya pasó.', _alternativas(timezone.localdate()))
+
+
+def _alternativas(fecha):
+    # son una sugerencia: si la lectura falla por un bloqueo se responde sin ellas
+    try:
+        return proximos_libres(ALTERNATIVAS, max(fecha, timezone.localdate()))
+    except OperationalError:
+        return []
+
+
+def _insertar(paciente, fecha, hora, using):
+    with transaction.atomic(using=using):
+        connection = connections[using]
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_xact_lock(%s)', [_clave_lock(fecha, hora)])
+        # con el lock tomado la comprobacion es exacta; en otros motores decide la restriccion
+        if CitaMedica.objects.using(using).filter(fecha=fecha, hora_cita=hora).exclude(estado='C').exists():
+            return None
+        return CitaMedica.objects.using(using).create(paciente=paciente, fecha=fecha, hora_cita=hora, estado='P')
+
+
+def reservar_cita(paciente, fecha, hora, reintentos=REINTENTOS):
+    if isinstance(fecha, str):
+        fecha = date.fromisoformat(fecha)
+    if isinstance(hora, str):
+        hora = time.fromisoformat(hora)
+    validar_turno(fecha, hora)
+    using = router.db_for_write(CitaMedica)
+    espera = ESPERA
+    for intento in range(reintentos + 1):
+        try:
+            cita = _insertar(paciente, fecha, hora, using)
+        except IntegrityError:
+            # otra transaccion confirmo el mismo turno entre la comprobacion y el INSERT
+            cita = None
+        except OperationalError:
+            # bloqueo o timeout del motor (p. ej. SQLite 'database is locked'): se reintenta
+            if intento == reintentos:
+                raise
+            reloj.sleep(espera * (1 + random.random()))
+            espera *= 2
+            continue
+        if cita is None:
+            raise TurnoNoDisponible('El turno ya está reservado.', _alternativas(fecha))
+        return cita
@@ -0,0 +1,63 @@
+from decimal import Decimal
+
+from django.db import router, transaction
+from django.db.models import DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from aplication.attention.models import CostosAtencion
+
+# Total de CostosAtencion mantenido al escribir: total = suma de costo_servicio de sus
+# servicios_adicionales. Cada cambio (servicios agregados/quitados, precio de un
+# servicio modificado, servicio borrado) recalcula solo los costos afectados con un
+# UPDATE ... SET total = (SELECT SUM(...)) correlacionado, que se evalua dentro de la
+# misma sentencia: no hay lectura previa que otra transaccion pueda dejar vieja.
+# Ver attention/signals.py. Los cambios hechos fuera del ORM (QuerySet.update, SQL)
+# se corrigen con el comando recalcular_costos.
+
+Servicios = CostosAtencion.servicios_adicionales.through
+CENTAVO = Decimal('0.01')
+CERO = Value(Decimal('0.00'), output_field=DecimalField(max_digits=10, decimal_places=2))
+
+
+def _suma_servicios():
+    return Subquery(
+        Servicios.objects.filter(costosatencion_id=OuterRef('pk')).order_by()
+        .values('costosatencion_id').annotate(suma=Sum('serviciosadicionales__costo_servicio')).values('suma')
+    )
+
+
+def recalcular_totales(costos, using=None):
+    # costos: ids o queryset de CostosAtencion. Devuelve las filas actualizadas
+    using = using or router.db_for_write(CostosAtencion)
+    return CostosAtencion.objects.using(using).filter(pk__in=costos).update(total=Coalesce(_suma_servicios(), CERO))
+
+
+def costos_con_servicio(servicio_id, using=None):
+    # subconsulta con los ids de los costos que incluyen el servicio
+    return (Servicios.objects.using(using).filter(serviciosadicionales_id=servicio_id)
+            .values_list('costosatencion_id', flat=True))
+
+
+def verificar_totales(lote=5000, corregir=False, using=None):
+    # Recorre CostosAtencion por bloques de pk con una consulta agregada por bloque
+    # (LEFT JOIN + GROUP BY) y devuelve [(id, total guardado, total calculado)] de los
+    # que no cuadran. Con corregir=True los recalcula en la misma pasada.
+    using = using or router.db_for_write(CostosAtencion)
+    diferencias = []
+    ultimo = 0
+    while True:
+        with transaction.atomic(using=using):
+            filas = list(
+                CostosAtencion.objects.using(using).filter(pk__gt=ultimo).order_by('pk')
+                .annotate(calculado=Coalesce(Sum('servicios_adicionales__costo_servicio'), CERO))
+                .values_list('pk', 'total', 'calculado')[:lote]
+            )
+            if not filas:
+                return diferencias
+            # SQLite suma los decimales como REAL: se redondea a centavos antes de comparar
+            distintos = [(pk, total, calculado.quantize(CENTAVO)) for pk, total, calculado in filas
+                         if total != calculado.quantize(CENTAVO)]
+            if distintos and corregir:
+                recalcular_totales([pk for pk, _, _ in distintos], using)
+            diferencias.extend(distintos)
+        ultimo = filas[-1][0]
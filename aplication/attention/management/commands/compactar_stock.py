@@ -0,0 +1,31 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from aplication.attention.stock import compactar_movimientos, stock_bajo
+
+# Mantenimiento periodico del kardex (cron semanal/mensual):
+#   python manage.py compactar_stock [--antes-de AAAA-MM-DD] [--stock-bajo]
+
+
+class Command(BaseCommand):
+    help = 'Compacta el kardex de medicamentos en saldos y verifica el stock'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--antes-de', metavar='AAAA-MM-DD', help='por defecto, el limite de las atenciones abiertas')
+        parser.add_argument('--stock-bajo', action='store_true', help='lista ademas los medicamentos con stock bajo')
+
+    def handle(self, *args, **options):
+        antes_de = None
+        if options['antes_de']:
+            try:
+                fecha = datetime.date.fromisoformat(options['antes_de'])
+            except ValueError:
+                raise CommandError('La fecha debe tener el formato AAAA-MM-DD.')
+            antes_de = timezone.make_aware(datetime.datetime.combine(fecha, datetime.time()))
+        compactados, ajustes = compactar_movimientos(antes_de)
+        self.stdout.write(f'{compactados} movimientos compactados, {ajustes} ajustes')
+        if options['stock_bajo']:
+            for nombre, cantidad in stock_bajo().values_list('nombre', 'cantidad'):
+                self.stdout.write(f'{cantidad:>6}  {nombre}')
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from aplication.attention.uploads import HORAS_VIGENCIA, limpiar_vencidas
+
+# Borra las cargas por partes de resultados de examenes abandonadas y sus archivos .part.
+# Uso: python manage.py limpiar_cargas [--horas 48]
+
+
+class Command(BaseCommand):
+    help = 'Borra las cargas de resultados pendientes sin actividad'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--horas', type=int, default=HORAS_VIGENCIA, help='horas sin recibir partes')
+
+    def handle(self, *args, **options):
+        borradas = limpiar_vencidas(options['horas'])
+        self.stdout.write(self.style.SUCCESS(f'{borradas} cargas borradas'))
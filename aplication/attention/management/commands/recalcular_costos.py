@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from aplication.attention.costs import verificar_totales
+
+# Recalcula CostosAtencion.total a partir de los servicios adicionales (datos previos
+# al mantenimiento por señales o cambios hechos fuera del ORM).
+# Uso: python manage.py recalcular_costos [--lote 5000]
+#      python manage.py recalcular_costos --check   (solo verifica; sale con error si hay diferencias)
+
+
+class Command(BaseCommand):
+    help = 'Recalcula o verifica el total de los costos de atencion'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=5000, help='costos por consulta')
+        parser.add_argument('--check', action='store_true', help='no corrige, solo informa las diferencias')
+        parser.add_argument('--mostrar', type=int, default=20, help='diferencias a listar')
+
+    def handle(self, *args, **options):
+        diferencias = verificar_totales(lote=options['lote'], corregir=not options['check'])
+        for pk, total, calculado in diferencias[:options['mostrar']]:
+            self.stdout.write(f'{pk:>8}  guardado {total:>12}  calculado {calculado:>12}')
+        if options['check']:
+            if diferencias:
+                raise CommandError(f'{len(diferencias)} costos con el total desactualizado')
+            self.stdout.write(self.style.SUCCESS('Todos los totales cuadran'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{len(diferencias)} totales corregidos'))
@@ -0,0 +1,32 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from aplication.attention.revenue import DIAS_POR_LOTE, reconstruir
+
+# Reconstruye los resumenes de ingresos (ResumenIngreso y ResumenIngresoServicio) a
+# partir de CostosAtencion. Necesario una vez tras migrar (los datos previos no tienen
+# resumen) y despues de cambios hechos fuera del ORM; se puede repetir sin problema.
+# Uso: python manage.py reconstruir_ingresos [--desde AAAA-MM-DD] [--hasta AAAA-MM-DD] [--lote 31]
+
+
+def _fecha(texto):
+    try:
+        return datetime.date.fromisoformat(texto) if texto else None
+    except ValueError:
+        raise CommandError('La fecha debe tener el formato AAAA-MM-DD.')
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye los resumenes diarios y mensuales de ingresos por lotes de dias'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', metavar='AAAA-MM-DD', help='por defecto, el primer costo registrado')
+        parser.add_argument('--hasta', metavar='AAAA-MM-DD', help='por defecto, hoy')
+        parser.add_argument('--lote', type=int, default=DIAS_POR_LOTE, help='dias por transaccion')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        dias = reconstruir(_fecha(options['desde']), _fecha(options['hasta']), dias_por_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'{dias} dias reconstruidos en {time.perf_counter() - inicio:.1f} s'))
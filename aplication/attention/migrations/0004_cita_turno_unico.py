@@ -0,0 +1,31 @@
+# Generated by Django 5.1.2 on 2026-10-18 14:42
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def cancelar_duplicadas(apps, schema_editor):
+    # la restriccion no se puede crear si ya hay turnos con dos citas activas:
+    # se conserva la primera registrada y las demas pasan a canceladas
+    CitaMedica = apps.get_model('attention', 'CitaMedica')
+    db = schema_editor.connection.alias
+    citas = CitaMedica.objects.using(db).exclude(estado='C')
+    repetidas = (citas.order_by().values('fecha', 'hora_cita')
+                 .annotate(total=Count('id'), primera=Min('id')).filter(total__gt=1))
+    for turno in repetidas:
+        citas.filter(fecha=turno['fecha'], hora_cita=turno['hora_cita']).exclude(pk=turno['primera']).update(estado='C')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attention', '0003_remove_citamedica_doctor_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(cancelar_duplicadas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='citamedica',
+            constraint=models.UniqueConstraint(condition=models.Q(('estado', 'C'), _negated=True), fields=('fecha', 'hora_cita'), name='uniq_cita_turno'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.2 on 2026-10-18 14:51
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def saldo_inicial(apps, schema_editor):
+    # el stock actual de cada medicamento pasa a ser su primer movimiento (saldo)
+    Medicamento = apps.get_model('core', 'Medicamento')
+    MovimientoMedicamento = apps.get_model('attention', 'MovimientoMedicamento')
+    db = schema_editor.connection.alias
+    MovimientoMedicamento.objects.using(db).bulk_create([
+        MovimientoMedicamento(medicamento_id=pk, tipo='S', cantidad=cantidad)
+        for pk, cantidad in Medicamento.objects.using(db).values_list('pk', 'cantidad').iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attention', '0004_cita_turno_unico'),
+        ('core', '0010_medicamento_stock_activo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimientoMedicamento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('S', 'Saldo'), ('D', 'Dispensación'), ('I', 'Ingreso'), ('A', 'Ajuste')], max_length=1, verbose_name='Tipo de Movimiento')),
+                ('cantidad', models.IntegerField(verbose_name='Cantidad')),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Fecha')),
+                ('atencion', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimientos_medicamentos', to='attention.atencion', verbose_name='Atención')),
+                ('medicamento', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='movimientos', to='core.medicamento', verbose_name='Medicamento')),
+            ],
+            options={
+                'verbose_name': 'Movimiento de Medicamento',
+                'verbose_name_plural': 'Movimientos de Medicamentos',
+                'ordering': ['-fecha'],
+                'indexes': [models.Index(fields=['medicamento', 'fecha'], name='idx_movimiento_med_fecha'), models.Index(fields=['atencion', 'medicamento'], name='idx_movimiento_atencion')],
+            },
+        ),
+        migrations.RunPython(saldo_inicial, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.1.2 on 2026-10-18 15:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attention', '0005_movimientomedicamento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenIngreso',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('periodo', models.CharField(choices=[('D', 'Diario'), ('M', 'Mensual')], max_length=1, verbose_name='Periodo')),
+                ('fecha', models.DateField(verbose_name='Fecha')),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Total')),
+                ('costos', models.IntegerField(default=0, verbose_name='Costos')),
+            ],
+            options={
+                'verbose_name': 'Resumen de Ingresos',
+                'verbose_name_plural': 'Resúmenes de Ingresos',
+                'ordering': ['periodo', 'fecha'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenIngresoServicio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('periodo', models.CharField(choices=[('D', 'Diario'), ('M', 'Mensual')], max_length=1, verbose_name='Periodo')),
+                ('fecha', models.DateField(verbose_name='Fecha')),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Total')),
+                ('cantidad', models.IntegerField(default=0, verbose_name='Cantidad')),
+            ],
+            options={
+                'verbose_name': 'Resumen de Ingresos por Servicio',
+                'verbose_name_plural': 'Resúmenes de Ingresos por Servicio',
+                'ordering': ['periodo', 'fecha', 'servicio'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='costosatencion',
+            index=models.Index(fields=['fecha_registro'], name='idx_costos_fecha_registro'),
+        ),
+        migrations.AddConstraint(
+            model_name='resumeningreso',
+            constraint=models.UniqueConstraint(fields=('periodo', 'fecha'), name='uniq_resumen_ingreso'),
+        ),
+        migrations.AddField(
+            model_name='resumeningresoservicio',
+            name='servicio',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_ingresos', to='attention.serviciosadicionales', verbose_name='Servicio'),
+        ),
+        migrations.AddConstraint(
+            model_name='resumeningresoservicio',
+            constraint=models.UniqueConstraint(fields=('periodo', 'fecha', 'servicio'), name='uniq_resumen_ingreso_servicio'),
+        ),
+    ]
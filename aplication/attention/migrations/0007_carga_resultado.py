@@ -0,0 +1,36 @@
+# Generated by Django 5.1.2 on 2026-10-18 15:11
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attention', '0006_resumen_ingresos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CargaResultado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.UUIDField(default=uuid.uuid4, editable=False, unique=True, verbose_name='Token')),
+                ('nombre', models.CharField(max_length=255, verbose_name='Nombre del Archivo')),
+                ('tamano', models.BigIntegerField(verbose_name='Tamaño')),
+                ('sha256', models.CharField(blank=True, max_length=64, verbose_name='SHA-256')),
+                ('recibido', models.BigIntegerField(default=0, verbose_name='Recibido')),
+                ('estado', models.CharField(choices=[('P', 'Pendiente'), ('C', 'Completada')], default='P', max_length=1, verbose_name='Estado')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True, verbose_name='Fecha de Actualización')),
+                ('examen', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cargas', to='attention.examensolicitado', verbose_name='Examen')),
+            ],
+            options={
+                'verbose_name': 'Carga de Resultado',
+                'verbose_name_plural': 'Cargas de Resultados',
+                'ordering': ['-fecha_creacion'],
+                'indexes': [models.Index(fields=['estado', 'fecha_actualizacion'], name='idx_carga_estado_fecha')],
+            },
+        ),
+    ]
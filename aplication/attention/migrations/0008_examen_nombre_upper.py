@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-18 15:43
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attention', '0007_carga_resultado'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='examensolicitado',
+            index=models.Index(django.db.models.functions.text.Upper('nombre_examen'), name='idx_examen_nombre_upper'),
+        ),
+    ]
@@ -1,6 +1,10 @@
+import uuid
+
 from django.db import models
+from django.db.models.functions import Upper
+from django.utils import timezone
 from aplication.core.models import *
-from doctor.const import CITA_CHOICES, DIA_SEMANA_CHOICES, EXAMEN_CHOICES
+from doctor.const import CITA_CHOICES, DIA_SEMANA_CHOICES, CARGA_CHOICES, EXAMEN_CHOICES, MOVIMIENTO_CHOICES, PERIODO_CHOICES
 
 # Modelo que representa los días y horas de atención de un doctor.
 # Incluye los días de la semana, la hora de inicio y la hora de fin de la atención.
@@ -45,12 +49,23 @@ class CitaMedica(models.Model):
     def __str__(self):
         return f"Cita {self.paciente} el {self.fecha} a las {self.hora_cita}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # fecha leida de la BD: si la cita se mueve de dia hay que invalidar ambos
+        instance._fecha_original = instance.__dict__.get('fecha')
+        return instance
+
     class Meta:
         # Ordena las citas por fecha y hora
         ordering = ['fecha', 'hora_cita']
         indexes = [
             models.Index(fields=['fecha', 'hora_cita'], name='idx_fecha_hora'),
         ]
+        constraints = [
+            # un turno solo puede tener una cita activa; las canceladas no lo ocupan
+            models.UniqueConstraint(fields=['fecha', 'hora_cita'], condition=~models.Q(estado='C'), name='uniq_cita_turno'),
+        ]
         # Nombre singular y plural del modelo en la interfaz administrativa
         verbose_name = "Cita Médica"
         verbose_name_plural = "Citas Médicas"
@@ -106,6 +121,31 @@ class DetalleAtencion(models.Model):
         verbose_name = "Detalle de Atención"
         verbose_name_plural = "Detalles de Atención"
 
+# Kardex de medicamentos: cada fila es un movimiento de stock (negativo al dispensar,
+# positivo al ingresar). Solo se agregan filas; la compactacion reemplaza los
+# movimientos antiguos por una fila de saldo por medicamento. Medicamento.cantidad es
+# el stock materializado y siempre vale la suma de los movimientos (ver attention/stock.py).
+class MovimientoMedicamento(models.Model):
+    medicamento = models.ForeignKey(Medicamento, on_delete=models.PROTECT, verbose_name="Medicamento",related_name="movimientos")
+    # atencion que origino la dispensacion (se conserva el movimiento si se borra la atencion)
+    atencion = models.ForeignKey(Atencion, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Atención",related_name="movimientos_medicamentos")
+    tipo = models.CharField(max_length=1, choices=MOVIMIENTO_CHOICES, verbose_name="Tipo de Movimiento")
+    # unidades con signo: negativo sale del inventario, positivo entra
+    cantidad = models.IntegerField(verbose_name="Cantidad")
+    fecha = models.DateTimeField(default=timezone.now, verbose_name="Fecha")
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.cantidad} de {self.medicamento_id}"
+
+    class Meta:
+        ordering = ['-fecha']
+        indexes = [
+            models.Index(fields=['medicamento', 'fecha'], name='idx_movimiento_med_fecha'),
+            models.Index(fields=['atencion', 'medicamento'], name='idx_movimiento_atencion'),
+        ]
+        verbose_name = "Movimiento de Medicamento"
+        verbose_name_plural = "Movimientos de Medicamentos"
+
 # Modelo que representa los exámenes médicos solicitados durante una atención.
 # Permite registrar los exámenes solicitados, su estado y resultados.
 class ExamenSolicitado(models.Model):
@@ -132,6 +172,10 @@ class ExamenSolicitado(models.Model):
     class Meta:
         # Ordena los exámenes por fecha de solicitud
         ordering = ['-fecha_solicitud']
+        indexes = [
+            # busqueda por prefijo sin distinguir mayusculas (admin de examenes)
+            models.Index(Upper('nombre_examen'), name='idx_examen_nombre_upper'),
+        ]
         
         # Nombre singular y plural del modelo en la interfaz administrativa
         verbose_name = "Examen Médico"
@@ -152,6 +196,13 @@ class ServiciosAdicionales(models.Model):
     def __str__(self):
         return self.nombre_servicio
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # precio leido de la BD: si cambia se recalculan los totales de CostosAtencion
+        instance._costo_original = instance.__dict__.get('costo_servicio')
+        return instance
+
     class Meta:
         # Ordena los servicios por nombre
         ordering = ['nombre_servicio']
@@ -176,10 +227,90 @@ class CostosAtencion(models.Model):
     def __str__(self):
         return f"Costos para {self.atencion} - Total: {self.total}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # lo que aporta a los resumenes de ingresos (un costo inactivo no suma)
+        instance._resumen_original = (instance.__dict__.get('activo'), instance.__dict__.get('total'))
+        return instance
+
     class Meta:
         # Ordena los costos por fecha de registro
         ordering = ['-fecha_registro']
+        indexes = [
+            # resumenes de ingresos por dia (attention/revenue.py)
+            models.Index(fields=['fecha_registro'], name='idx_costos_fecha_registro'),
+        ]
         # Nombre singular y plural del modelo en la interfaz administrativa
         verbose_name = "Costo de Atención"
         verbose_name_plural = "Costos de Atención"
 
+# Resumenes de ingresos por dia y por mes (fecha = el dia o el primer dia del mes).
+# Suman los costos activos por su fecha de registro. Al escribir se recalculan los
+# dias afectados (y sus meses) con las filas de esos dias bloqueadas con SELECT ...
+# FOR UPDATE (ver attention/revenue.py); los reportes solo leen estas tablas.
+class ResumenIngreso(models.Model):
+    periodo = models.CharField(max_length=1, choices=PERIODO_CHOICES, verbose_name="Periodo")
+    fecha = models.DateField(verbose_name="Fecha")
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Total")
+    # costos de atencion activos registrados en el periodo
+    costos = models.IntegerField(default=0, verbose_name="Costos")
+
+    def __str__(self):
+        return f"{self.get_periodo_display()} {self.fecha}: {self.total}"
+
+    class Meta:
+        ordering = ['periodo', 'fecha']
+        constraints = [
+            models.UniqueConstraint(fields=['periodo', 'fecha'], name='uniq_resumen_ingreso'),
+        ]
+        verbose_name = "Resumen de Ingresos"
+        verbose_name_plural = "Resúmenes de Ingresos"
+
+# Desglose por servicio adicional de ResumenIngreso
+class ResumenIngresoServicio(models.Model):
+    periodo = models.CharField(max_length=1, choices=PERIODO_CHOICES, verbose_name="Periodo")
+    fecha = models.DateField(verbose_name="Fecha")
+    servicio = models.ForeignKey(ServiciosAdicionales, on_delete=models.CASCADE, verbose_name="Servicio",related_name="resumenes_ingresos")
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Total")
+    # costos que incluyen el servicio
+    cantidad = models.IntegerField(default=0, verbose_name="Cantidad")
+
+    def __str__(self):
+        return f"{self.get_periodo_display()} {self.fecha} {self.servicio_id}: {self.total}"
+
+    class Meta:
+        ordering = ['periodo', 'fecha', 'servicio']
+        constraints = [
+            models.UniqueConstraint(fields=['periodo', 'fecha', 'servicio'], name='uniq_resumen_ingreso_servicio'),
+        ]
+        verbose_name = "Resumen de Ingresos por Servicio"
+        verbose_name_plural = "Resúmenes de Ingresos por Servicio"
+
+# Carga por partes del archivo de resultado de un ExamenSolicitado (ver attention/uploads.py).
+# Las partes se escriben en orden en CARGAS_DIR/<token>.part; al recibir la ultima el
+# archivo se adjunta al examen y este pasa a Realizado.
+class CargaResultado(models.Model):
+    # identificador publico de la carga (la URL para reanudarla)
+    token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False, verbose_name="Token")
+    examen = models.ForeignKey(ExamenSolicitado, on_delete=models.CASCADE, verbose_name="Examen",related_name="cargas")
+    nombre = models.CharField(max_length=255, verbose_name="Nombre del Archivo")
+    tamano = models.BigIntegerField(verbose_name="Tamaño")
+    # SHA-256 del archivo completo (opcional), se verifica antes de adjuntarlo
+    sha256 = models.CharField(max_length=64, blank=True, verbose_name="SHA-256")
+    # bytes recibidos y verificados desde el inicio del archivo
+    recibido = models.BigIntegerField(default=0, verbose_name="Recibido")
+    estado = models.CharField(max_length=1, choices=CARGA_CHOICES, default='P', verbose_name="Estado")
+    fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Creación")
+    fecha_actualizacion = models.DateTimeField(auto_now=True, verbose_name="Fecha de Actualización")
+
+    def __str__(self):
+        return f"{self.nombre} ({self.recibido}/{self.tamano})"
+
+    class Meta:
+        ordering = ['-fecha_creacion']
+        indexes = [
+            models.Index(fields=['estado', 'fecha_actualizacion'], name='idx_carga_estado_fecha'),
+        ]
+        verbose_name = "Carga de Resultado"
+        verbose_name_plural = "Cargas de Resultados"
@@ -0,0 +1,156 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import router, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from aplication.attention.models import CostosAtencion, ResumenIngreso, ResumenIngresoServicio
+
+# Resumenes de ingresos por dia y por mes (ResumenIngreso / ResumenIngresoServicio).
+# Cuando cambia algo que afecta a un dia (alta/baja/anulacion de un costo, servicios
+# agregados o quitados, precio de un servicio) se recalculan solo los dias afectados y
+# sus meses, dentro de la misma transaccion y con un numero fijo de consultas sin
+# importar cuantos dias sean. Antes de agregar se bloquean las filas de esos dias
+# (SELECT ... FOR UPDATE, en orden de fecha): de dos transacciones que tocan el mismo
+# dia la segunda espera y su agregado ya incluye lo que confirmo la primera, asi que
+# el resumen no queda desfasado. El mes se suma desde las filas de sus dias.
+# Los reportes leen solo estas tablas.
+
+Servicios = CostosAtencion.servicios_adicionales.through
+DIAS_POR_LOTE = 31
+CENTAVO = Decimal('0.01')
+
+
+def como_dia(fecha_registro):
+    return timezone.localdate(fecha_registro)
+
+
+def _inicio(dia):
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+
+def _meses(dias):
+    return sorted({dia.replace(day=1) for dia in dias})
+
+
+def _bloquear(periodo, fechas, using):
+    # crea las filas que falten y las bloquea en orden de fecha
+    ResumenIngreso.objects.using(using).bulk_create(
+        [ResumenIngreso(periodo=periodo, fecha=fecha) for fecha in fechas], ignore_conflicts=True)
+    return {resumen.fecha: resumen for resumen in
+            ResumenIngreso.objects.using(using).select_for_update()
+            .filter(periodo=periodo, fecha__in=fechas).order_by('fecha')}
+
+
+def actualizar_dias(dias, using=None):
+    # recalcula los resumenes de 'dias' (fechas locales) y de sus meses
+    dias = sorted(set(dias))
+    if not dias:
+        return
+    using = using or router.db_for_write(ResumenIngreso)
+    with transaction.atomic(using=using):
+        resumenes = _bloquear('D', dias, using)
+        # el rango usa el indice de fecha_registro; si los dias no son consecutivos el
+        # __date__in descarta los intermedios
+        rango = {'fecha_registro__gte': _inicio(dias[0]), 'fecha_registro__lt': _inicio(dias[-1] + timedelta(days=1))}
+        if (dias[-1] - dias[0]).days + 1 != len(dias):
+            rango['fecha_registro__date__in'] = dias
+        costos = (CostosAtencion.objects.using(using).filter(activo=True, **rango)
+                  .annotate(dia=TruncDate('fecha_registro')).order_by().values('dia')
+                  .annotate(total=Sum('total'), costos=Count('id')).values_list('dia', 'total', 'costos'))
+        for resumen in resumenes.values():
+            resumen.total, resumen.costos = 0, 0
+        for dia, total, cantidad in costos:
+            resumenes[dia].total, resumenes[dia].costos = total, cantidad
+        ResumenIngreso.objects.using(using).bulk_update(resumenes.values(), ['total', 'costos'])
+
+        servicios = (Servicios.objects.using(using)
+                     .filter(costosatencion__activo=True,
+                             **{f'costosatencion__{campo}': valor for campo, valor in rango.items()})
+                     .annotate(dia=TruncDate('costosatencion__fecha_registro')).order_by()
+                     .values('dia', 'serviciosadicionales_id')
+                     .annotate(total=Sum('serviciosadicionales__costo_servicio'), cantidad=Count('id'))
+                     .values_list('dia', 'serviciosadicionales_id', 'total', 'cantidad'))
+        ResumenIngresoServicio.objects.using(using).filter(periodo='D', fecha__in=dias).delete()
+        ResumenIngresoServicio.objects.using(using).bulk_create([
+            ResumenIngresoServicio(periodo='D', fecha=dia, servicio_id=servicio, total=total, cantidad=cantidad)
+            for dia, servicio, total, cantidad in servicios
+        ])
+        _actualizar_meses(_meses(dias), using)
+
+
+def _actualizar_meses(meses, using):
+    resumenes = _bloquear('M', meses, using)
+    # los dias de los meses afectados (a lo sumo 31 filas por mes)
+    rango = {'fecha__gte': meses[0], 'fecha__lt': (meses[-1] + timedelta(days=31)).replace(day=1)}
+    totales = (ResumenIngreso.objects.using(using).filter(periodo='D', **rango)
+               .annotate(mes=TruncMonth('fecha')).order_by().values('mes')
+               .annotate(total=Sum('total'), costos=Sum('costos')).values_list('mes', 'total', 'costos'))
+    for resumen in resumenes.values():
+        resumen.total, resumen.costos = 0, 0
+    for mes, total, cantidad in totales:
+        if mes in resumenes:
+            resumenes[mes].total, resumenes[mes].costos = total, cantidad
+    ResumenIngreso.objects.using(using).bulk_update(resumenes.values(), ['total', 'costos'])
+
+    servicios = (ResumenIngresoServicio.objects.using(using).filter(periodo='D', **rango)
+                 .annotate(mes=TruncMonth('fecha')).order_by().values('mes', 'servicio_id')
+                 .annotate(total=Sum('total'), cantidad=Sum('cantidad'))
+                 .values_list('mes', 'servicio_id', 'total', 'cantidad'))
+    ResumenIngresoServicio.objects.using(using).filter(periodo='M', fecha__in=meses).delete()
+    ResumenIngresoServicio.objects.using(using).bulk_create([
+        ResumenIngresoServicio(periodo='M', fecha=mes, servicio_id=servicio, total=total, cantidad=cantidad)
+        for mes, servicio, total, cantidad in servicios if mes in resumenes
+    ])
+
+
+def dias_de_costos(costos, using=None):
+    # dias (locales) de registro de los costos dados (ids o subconsulta)
+    return set(CostosAtencion.objects.using(using).filter(pk__in=costos).annotate(dia=TruncDate('fecha_registro'))
+               .order_by().values_list('dia', flat=True).distinct())
+
+
+def reconstruir(desde=None, hasta=None, dias_por_lote=DIAS_POR_LOTE, using=None):
+    # reconstruye los resumenes de [desde, hasta] por lotes de dias (una transaccion
+    # por lote). Devuelve la cantidad de dias procesados
+    using = using or router.db_for_write(ResumenIngreso)
+    if desde is None:
+        primero = CostosAtencion.objects.using(using).order_by('fecha_registro').values_list('fecha_registro', flat=True).first()
+        if primero is None:
+            return 0
+        desde = como_dia(primero)
+    hasta = hasta or timezone.localdate()
+    dia, procesados = desde, 0
+    while dia <= hasta:
+        lote = [dia + timedelta(days=i) for i in range(min(dias_por_lote, (hasta - dia).days + 1))]
+        actualizar_dias(lote, using)
+        procesados += len(lote)
+        dia = lote[-1] + timedelta(days=1)
+    return procesados
+
+
+def reporte(desde, hasta, periodo='D', using=None):
+    # filas del periodo en [desde, hasta] y el desglose por servicio del rango,
+    # leidos solo de los resumenes
+    if periodo == 'M':
+        desde, hasta = desde.replace(day=1), hasta.replace(day=1)
+    resumenes = ResumenIngreso.objects.using(using).filter(periodo=periodo, fecha__range=(desde, hasta))
+    filas = list(resumenes.order_by('fecha').values('fecha', 'total', 'costos'))
+    servicios = list(
+        ResumenIngresoServicio.objects.using(using).filter(periodo=periodo, fecha__range=(desde, hasta))
+        .order_by().values('servicio_id', 'servicio__nombre_servicio')
+        .annotate(total=Sum('total'), cantidad=Sum('cantidad')).order_by('-total')
+    )
+    for fila in servicios:
+        # SQLite suma los decimales como REAL
+        fila['total'] = fila['total'].quantize(CENTAVO)
+    return {
+        'desde': desde,
+        'hasta': hasta,
+        'total': sum((fila['total'] for fila in filas), Decimal('0.00')),
+        'costos': sum(fila['costos'] for fila in filas),
+        'filas': filas,
+        'servicios': servicios,
+    }
@@ -0,0 +1,120 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from aplication.attention.agenda import invalidar_agenda
+from aplication.attention.availability import como_fecha, invalidar_fecha, invalidar_plantillas
+from aplication.attention.costs import costos_con_servicio, recalcular_totales
+from aplication.attention.models import CitaMedica, CostosAtencion, HorarioAtencion, MovimientoMedicamento, ServiciosAdicionales
+from aplication.attention.revenue import actualizar_dias, como_dia, dias_de_costos
+from aplication.core.models import Doctor, Medicamento, Paciente
+
+
+def _fechas_cita(instance):
+    fechas = {como_fecha(instance.fecha)}
+    original = getattr(instance, '_fecha_original', None)
+    if original:
+        fechas.add(original)
+    return fechas
+
+
+# Cualquier alta, cambio de estado/fecha/hora o borrado de una cita cambia los
+# turnos libres y la agenda de su dia (y del dia anterior si la cita se movio)
+@receiver(post_save, sender=CitaMedica)
+def cita_guardada(sender, instance, **kwargs):
+    fechas = _fechas_cita(instance)
+    invalidar_fecha(*fechas)
+    invalidar_agenda(*fechas)
+    instance._fecha_original = como_fecha(instance.fecha)
+
+
+@receiver(post_delete, sender=CitaMedica)
+def cita_borrada(sender, instance, **kwargs):
+    invalidar_fecha(instance.fecha)
+    invalidar_agenda(como_fecha(instance.fecha))
+
+
+# La agenda muestra nombre y cedula del paciente
+@receiver(post_save, sender=Paciente)
+def paciente_guardado(sender, instance, created, **kwargs):
+    if not created:
+        invalidar_agenda(*CitaMedica.objects.filter(paciente=instance).order_by().values_list('fecha', flat=True).distinct())
+
+
+# Los horarios y la duracion de los turnos cambian la plantilla de todos los dias
+@receiver(post_save, sender=HorarioAtencion)
+@receiver(post_delete, sender=HorarioAtencion)
+@receiver(post_save, sender=Doctor)
+@receiver(post_delete, sender=Doctor)
+def horario_modificado(sender, **kwargs):
+    invalidar_plantillas()
+
+
+# El stock se mueve con el kardex (attention/stock.py). Un medicamento nuevo abre su
+# saldo; despues save() ya no escribe la cantidad (ver Medicamento.save) y los ajustes
+# manuales pasan por registrar_ingreso(tipo='A').
+@receiver(post_save, sender=Medicamento)
+def medicamento_guardado(sender, instance, created, using, **kwargs):
+    if created and instance.cantidad:
+        MovimientoMedicamento.objects.using(using).create(medicamento=instance, tipo='S', cantidad=instance.cantidad)
+
+
+# Totales de CostosAtencion (attention/costs.py) y resumenes de ingresos de sus dias
+# (attention/revenue.py): se recalculan solo los costos cuyos servicios cambiaron,
+# desde cualquiera de los dos lados de la relacion
+@receiver(m2m_changed, sender=CostosAtencion.servicios_adicionales.through)
+def servicios_de_costo_cambiados(sender, instance, action, reverse, pk_set, using, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # despues del clear ya no se sabe que costos tenian el servicio
+        instance._costos_afectados = list(costos_con_servicio(instance.pk, using))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        if action == 'post_clear' or pk_set:
+            recalcular_totales([instance.pk], using)
+            instance.refresh_from_db(using=using, fields=['total'])
+            actualizar_dias([como_dia(instance.fecha_registro)], using)
+        return
+    costos = instance.__dict__.pop('_costos_afectados', []) if action == 'post_clear' else pk_set
+    if costos:
+        recalcular_totales(costos, using)
+        actualizar_dias(dias_de_costos(costos, using), using)
+
+
+@receiver(post_save, sender=ServiciosAdicionales)
+def servicio_guardado(sender, instance, created, using, **kwargs):
+    original = getattr(instance, '_costo_original', None)
+    if not created and original is not None and original != instance.costo_servicio:
+        costos = costos_con_servicio(instance.pk, using)
+        recalcular_totales(costos, using)
+        actualizar_dias(dias_de_costos(costos, using), using)
+    instance._costo_original = instance.costo_servicio
+
+
+@receiver(pre_delete, sender=ServiciosAdicionales)
+def servicio_por_borrar(sender, instance, using, **kwargs):
+    # el borrado elimina las filas intermedias sin enviar m2m_changed
+    instance._costos_afectados = list(costos_con_servicio(instance.pk, using))
+    instance._dias_afectados = dias_de_costos(instance._costos_afectados, using)
+
+
+@receiver(post_delete, sender=ServiciosAdicionales)
+def servicio_borrado(sender, instance, using, **kwargs):
+    costos = instance.__dict__.pop('_costos_afectados', [])
+    if costos:
+        recalcular_totales(costos, using)
+        actualizar_dias(instance.__dict__.pop('_dias_afectados', ()), using)
+
+
+# Un costo nuevo, anulado/reactivado o con otro total cambia el resumen de su dia
+@receiver(post_save, sender=CostosAtencion)
+def costo_guardado(sender, instance, created, using, **kwargs):
+    actual = (instance.activo, instance.total)
+    if created or getattr(instance, '_resumen_original', None) != actual:
+        actualizar_dias([como_dia(instance.fecha_registro)], using)
+    instance._resumen_original = actual
+
+
+@receiver(post_delete, sender=CostosAtencion)
+def costo_borrado(sender, instance, using, **kwargs):
+    actualizar_dias([como_dia(instance.fecha_registro)], using)
@@ -0,0 +1,122 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from aplication.attention.models import Atencion, DetalleAtencion, MovimientoMedicamento
+from aplication.core.models import Medicamento
+
+# Stock de medicamentos. Cada cambio se registra en MovimientoMedicamento y se aplica
+# a Medicamento.cantidad en la misma transaccion con UPDATE ... SET cantidad =
+# cantidad - n (F()), sin leer y reescribir el valor, asi que dos dispensaciones
+# concurrentes no se pisan. La dispensacion se sincroniza por atencion: se compara lo
+# recetado en DetalleAtencion con lo ya descontado y solo se registra la diferencia
+# (una fila y un UPDATE por medicamento), por lo que repetirla no descuenta dos veces.
+# Las atenciones con mas de DIAS_ABIERTA dias quedan cerradas: sus movimientos se
+# pueden compactar y su receta ya no mueve stock.
+
+STOCK_MINIMO = getattr(settings, 'STOCK_MINIMO', 10)
+DIAS_ABIERTA = 90
+
+
+def _limite_abiertas():
+    return timezone.now() - timedelta(days=DIAS_ABIERTA)
+
+
+class StockInsuficiente(Exception):
+    def __init__(self, medicamento_id, solicitado):
+        super().__init__(f'Stock insuficiente del medicamento {medicamento_id} (se requieren {solicitado}).')
+        self.medicamento_id = medicamento_id
+        self.solicitado = solicitado
+
+
+def _aplicar(deltas, tipo, atencion_id, using):
+    # deltas: {medicamento_id: unidades con signo}. Orden fijo de ids para que dos
+    # transacciones no se bloqueen en cruz.
+    movimientos = []
+    for medicamento_id in sorted(deltas):
+        delta = deltas[medicamento_id]
+        if not delta:
+            continue
+        medicamentos = Medicamento.objects.using(using).filter(pk=medicamento_id)
+        if delta < 0:
+            # la condicion va en el mismo UPDATE: nunca queda stock negativo
+            medicamentos = medicamentos.filter(cantidad__gte=-delta)
+        if not medicamentos.update(cantidad=F('cantidad') + delta):
+            raise StockInsuficiente(medicamento_id, -delta)
+        movimientos.append(MovimientoMedicamento(medicamento_id=medicamento_id, atencion_id=atencion_id,
+                                                 tipo=tipo, cantidad=delta))
+    MovimientoMedicamento.objects.using(using).bulk_create(movimientos)
+    return movimientos
+
+
+def sincronizar_dispensacion(atencion):
+    # descuenta (o devuelve) la diferencia entre lo recetado y lo ya dispensado
+    using = router.db_for_write(MovimientoMedicamento)
+    atencion_id = atencion.pk if isinstance(atencion, Atencion) else atencion
+    with transaction.atomic(using=using):
+        # serializa solo las sincronizaciones de esta misma atencion
+        fecha = (Atencion.objects.using(using).select_for_update().filter(pk=atencion_id)
+                 .values_list('fecha_atencion', flat=True).first())
+        if fecha is None or fecha < _limite_abiertas():
+            return []
+        recetado = dict(
+            DetalleAtencion.objects.using(using).filter(atencion_id=atencion_id).order_by()
+            .values('medicamento').annotate(total=Sum('cantidad')).values_list('medicamento', 'total')
+        )
+        dispensado = dict(
+            MovimientoMedicamento.objects.using(using).filter(atencion_id=atencion_id, tipo='D').order_by()
+            .values('medicamento').annotate(total=Sum('cantidad')).values_list('medicamento', 'total')
+        )
+        deltas = {}
+        for medicamento_id in set(recetado) | set(dispensado):
+            # lo dispensado esta en negativo
+            deltas[medicamento_id] = -(recetado.get(medicamento_id, 0) + dispensado.get(medicamento_id, 0))
+        return _aplicar(deltas, 'D', atencion_id, using)
+
+
+def registrar_ingreso(medicamento, cantidad, tipo='I'):
+    # reposicion (cantidad > 0) o ajuste de inventario (tipo 'A', con signo)
+    using = router.db_for_write(MovimientoMedicamento)
+    medicamento_id = getattr(medicamento, 'pk', medicamento)
+    with transaction.atomic(using=using):
+        return _aplicar({medicamento_id: cantidad}, tipo, None, using)
+
+
+def stock_bajo(umbral=None):
+    # usa el indice parcial idx_medicamento_stock_activo
+    umbral = STOCK_MINIMO if umbral is None else umbral
+    return Medicamento.objects.filter(activo=True, cantidad__lte=umbral).order_by('cantidad')
+
+
+def compactar_movimientos(antes_de=None):
+    # Reemplaza los movimientos anteriores a 'antes_de' (como maximo el limite de las
+    # atenciones abiertas) por un saldo por medicamento y verifica que cantidad = suma
+    # del kardex. Si no coincide (cambios hechos fuera del ORM) se registra un ajuste
+    # por la diferencia. Devuelve (movimientos compactados, ajustes).
+    using = router.db_for_write(MovimientoMedicamento)
+    antes_de = min(antes_de or _limite_abiertas(), _limite_abiertas())
+    compactados = ajustados = 0
+    medicamentos = Medicamento.objects.using(using).order_by('pk').values_list('pk', flat=True)
+    for medicamento_id in medicamentos.iterator():
+        with transaction.atomic(using=using):
+            # bloquea el medicamento: ninguna dispensacion corre a la vez sobre el
+            cantidad = (Medicamento.objects.using(using).select_for_update()
+                        .values_list('cantidad', flat=True).get(pk=medicamento_id))
+            movimientos = MovimientoMedicamento.objects.using(using).filter(medicamento_id=medicamento_id)
+            # los de atenciones aun abiertas se conservan: su receta todavia puede cambiar
+            antiguos = movimientos.filter(fecha__lt=antes_de).exclude(atencion__fecha_atencion__gte=antes_de)
+            resumen = antiguos.aggregate(total=Sum('cantidad'), filas=Count('id'), saldos=Count('id', filter=Q(tipo='S')))
+            if resumen['filas'] > 1 or resumen['filas'] != resumen['saldos']:
+                antiguos.delete()
+                MovimientoMedicamento.objects.using(using).create(medicamento_id=medicamento_id, tipo='S',
+                                                                  cantidad=resumen['total'], fecha=antes_de)
+                compactados += resumen['filas']
+            total = movimientos.aggregate(total=Sum('cantidad'))['total'] or 0
+            if total != cantidad:
+                MovimientoMedicamento.objects.using(using).create(medicamento_id=medicamento_id, tipo='A',
+                                                                  cantidad=cantidad - total)
+                ajustados += 1
+    return compactados, ajustados
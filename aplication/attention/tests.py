@@ -1,3 +1,722 @@
-from django.test import TestCase
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import random
+import sys
+import threading
+import time
+from datetime import time as hora, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import IntegrityError, OperationalError, connection, connections, transaction
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from aplication.attention import agenda
+from aplication.attention.availability import compilar_plantilla, plantillas, proximos_libres, turnos_libres
+from aplication.attention.booking import TurnoNoDisponible, reservar_cita
+from aplication.attention.costs import verificar_totales
+from aplication.attention.models import (Atencion, CargaResultado, CitaMedica, CostosAtencion, DetalleAtencion, ExamenSolicitado,
+                                         HorarioAtencion, MovimientoMedicamento, ResumenIngreso, ServiciosAdicionales)
+from aplication.attention.revenue import reconstruir, reporte
+from aplication.attention.stock import (StockInsuficiente, compactar_movimientos, registrar_ingreso,
+                                        sincronizar_dispensacion, stock_bajo)
+from aplication.core.models import Diagnostico, Medicamento, Paciente, TipoMedicamento
+from doctor.routers import ULTIMA_ESCRITURA, desde_replica
+
+
+def crear_horarios():
+    for dia in ('lunes', 'martes', 'miercoles', 'jueves', 'viernes', 'sábado', 'domingo'):
+        HorarioAtencion.objects.create(dia_semana=dia, hora_inicio=hora(8), hora_fin=hora(12),
+                                       Intervalo_desde=hora(10), Intervalo_hasta=hora(10, 30))
+
+
+def crear_paciente(cedula='1710034065'):
+    return Paciente.objects.create(nombres='Ana', apellidos='Perez', cedula=cedula, fecha_nacimiento='1990-01-01',
+                                   telefono='0991234567', sexo='F', estado_civil='S', direccion='Calle 1')
+
+
+def crear_medicamento(cantidad, nombre='Paracetamol'):
+    tipo, _ = TipoMedicamento.objects.get_or_create(nombre='Analgésico')
+    return Medicamento.objects.create(tipo=tipo, nombre=nombre, cantidad=cantidad, precio=1)
+
+
+def crear_atencion(paciente, recetas):
+    atencion = Atencion.objects.create(paciente=paciente, motivo_consulta='Dolor', tratamiento='Reposo')
+    DetalleAtencion.objects.bulk_create([
+        DetalleAtencion(atencion=atencion, medicamento=medicamento, cantidad=cantidad, prescripcion='c/8h')
+        for medicamento, cantidad in recetas
+    ])
+    return atencion
+
+
+def kardex(medicamento):
+    return sum(MovimientoMedicamento.objects.filter(medicamento=medicamento).values_list('cantidad', flat=True))
+
+
+class ReservaCitaTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        crear_horarios()
+        self.paciente = crear_paciente()
+        self.fecha = timezone.localdate() + timedelta(days=7)
+
+    def test_turno_ocupado_ofrece_alternativas(self):
+        reservar_cita(self.paciente, self.fecha, hora(8))
+        with self.assertRaises(TurnoNoDisponible) as contexto:
+            reservar_cita(self.paciente, self.fecha, hora(8))
+        self.assertTrue(contexto.exception.alternativas)
+        self.assertNotIn(hora(8), [turno.time() for turno in contexto.exception.alternativas if turno.date() == self.fecha])
+
+    def test_cita_cancelada_libera_el_turno(self):
+        cita = reservar_cita(self.paciente, self.fecha, hora(9))
+        cita.estado = 'C'
+        cita.save()
+        self.assertEqual(reservar_cita(self.paciente, self.fecha, hora(9)).estado, 'P')
+
+    def test_restriccion_en_la_base(self):
+        # aun sin pasar por reservar_cita la base rechaza el segundo turno activo
+        CitaMedica.objects.create(paciente=self.paciente, fecha=self.fecha, hora_cita=hora(11), estado='P')
+        CitaMedica.objects.create(paciente=self.paciente, fecha=self.fecha, hora_cita=hora(11), estado='C')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            CitaMedica.objects.create(paciente=self.paciente, fecha=self.fecha, hora_cita=hora(11), estado='R')
+
+    def test_hora_fuera_de_la_plantilla(self):
+        with self.assertRaises(TurnoNoDisponible):
+            reservar_cita(self.paciente, self.fecha, hora(10, 15))
+
+
+class DisponibilidadTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        crear_horarios()
+        self.paciente = crear_paciente()
+        self.fecha = timezone.localdate() + timedelta(days=7)
+        # 08:00-12:00 con descanso 10:00-10:30 y turnos de 30 minutos
+        self.turnos = [hora(8), hora(8, 30), hora(9), hora(9, 30), hora(10, 30), hora(11), hora(11, 30)]
+
+    def test_descanso(self):
+        self.assertEqual(turnos_libres(self.fecha), {self.fecha: self.turnos})
+        # un turno que pisa el descanso se retoma al final del descanso
+        self.assertEqual(compilar_plantilla(480, 720, 615, 645, 30), [480, 510, 540, 570, 645, 675])
+        self.assertEqual(compilar_plantilla(480, 600, 600, 600, 45), [480, 525])
+
+    def test_cita_cancelada_libera_el_turno(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            cita = CitaMedica.objects.create(paciente=self.paciente, fecha=self.fecha, hora_cita=hora(9), estado='P')
+        self.assertNotIn(hora(9), turnos_libres(self.fecha)[self.fecha])
+        with self.captureOnCommitCallbacks(execute=True):
+            cita.estado = 'C'
+            cita.save()
+        self.assertEqual(turnos_libres(self.fecha)[self.fecha], self.turnos)
+
+    def test_proximos_cruza_dias(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            CitaMedica.objects.create(paciente=self.paciente, fecha=self.fecha, hora_cita=hora(8), estado='P')
+        siguiente = self.fecha + timedelta(days=1)
+        proximos = proximos_libres(9, desde=self.fecha)
+        self.assertEqual(len(proximos), 9)
+        self.assertEqual([turno.date() for turno in proximos], [self.fecha] * 6 + [siguiente] * 3)
+        self.assertEqual(proximos[0].time(), hora(8, 30))
+        self.assertEqual([turno.time() for turno in proximos[6:]], self.turnos[:3])
+
+    def test_cambio_de_horario_invalida_la_cache(self):
+        turnos_libres(self.fecha)
+        with CaptureQueriesContext(connection) as consultas:
+            turnos_libres(self.fecha)
+        self.assertEqual(len(consultas), 0)
+        dia = ('lunes', 'martes', 'miercoles', 'jueves', 'viernes', 'sábado', 'domingo')[self.fecha.weekday()]
+        with self.captureOnCommitCallbacks(execute=True):
+            horario = HorarioAtencion.objects.get(dia_semana=dia)
+            horario.hora_fin = hora(13)
+            horario.save()
+        self.assertEqual(turnos_libres(self.fecha)[self.fecha], self.turnos + [hora(12), hora(12, 30)])
+        with self.captureOnCommitCallbacks(execute=True):
+            horario.activo = False
+            horario.save()
+        self.assertEqual(turnos_libres(self.fecha), {})
+
+
+class ReservaConcurrenteTest(TransactionTestCase):
+    hilos = 8
+    intentos_por_hilo = 25
+
+    def setUp(self):
+        cache.clear()
+        crear_horarios()
+        self.paciente = crear_paciente()
+        self.fecha = timezone.localdate() + timedelta(days=7)
+
+    def test_sin_dobles_reservas(self):
+        turnos = [hora(m // 60, m % 60) for m in plantillas()[self.fecha.weekday()][1]]
+        resultados = {'reservas': 0, 'ocupados': 0, 'errores': []}
+        candado = threading.Lock()
+        barrera = threading.Barrier(self.hilos)
+
+        def trabajar(numero):
+            try:
+                barrera.wait()
+                for intento in range(self.intentos_por_hilo):
+                    turno = turnos[(numero + intento) % len(turnos)]
+                    try:
+                        # SQLite en memoria compartida devuelve 'table is locked' sin esperar
+                        reservar_cita(self.paciente, self.fecha, turno, reintentos=10)
+                        clave = 'reservas'
+                    except TurnoNoDisponible:
+                        clave = 'ocupados'
+                    except OperationalError as error:
+                        with candado:
+                            resultados['errores'].append(str(error))
+                        continue
+                    with candado:
+                        resultados[clave] += 1
+            finally:
+                connection.close()
+
+        inicio = time.perf_counter()
+        hilos = [threading.Thread(target=trabajar, args=(numero,)) for numero in range(self.hilos)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        segundos = time.perf_counter() - inicio
+
+        activas = CitaMedica.objects.filter(fecha=self.fecha).exclude(estado='C')
+        self.assertEqual(resultados['errores'], [])
+        self.assertEqual(activas.count(), len(turnos))
+        self.assertEqual(activas.values('hora_cita').distinct().count(), len(turnos))
+        self.assertEqual(resultados['reservas'], len(turnos))
+        total = self.hilos * self.intentos_por_hilo
+        sys.stderr.write(f'\n{total} intentos de reserva en {segundos:.2f} s ({total / segundos:.0f}/s), '
+                         f"{resultados['reservas']} reservas, {resultados['ocupados']} rechazos\n")
+
+
+class StockTest(TestCase):
+
+    def setUp(self):
+        self.paciente = crear_paciente()
+        self.medicamento = crear_medicamento(20)
+
+    def test_dispensacion_idempotente_por_atencion(self):
+        otro = crear_medicamento(5, 'Ibuprofeno')
+        atencion = crear_atencion(self.paciente, [(self.medicamento, 3), (self.medicamento, 2), (otro, 1)])
+        sincronizar_dispensacion(atencion)
+        sincronizar_dispensacion(atencion)
+        self.medicamento.refresh_from_db()
+        self.assertEqual(self.medicamento.cantidad, 15)
+        self.assertEqual(MovimientoMedicamento.objects.filter(atencion=atencion).count(), 2)
+        # se corrige la receta: solo se devuelve la diferencia
+        atencion.atenciones.filter(cantidad=3).update(cantidad=1)
+        sincronizar_dispensacion(atencion)
+        self.medicamento.refresh_from_db()
+        self.assertEqual(self.medicamento.cantidad, 17)
+        self.assertEqual(kardex(self.medicamento), 17)
+
+    def test_stock_insuficiente_no_descuenta(self):
+        atencion = crear_atencion(self.paciente, [(self.medicamento, 25)])
+        with self.assertRaises(StockInsuficiente):
+            sincronizar_dispensacion(atencion)
+        self.medicamento.refresh_from_db()
+        self.assertEqual(self.medicamento.cantidad, 20)
+
+    def test_ajuste_manual_y_compactacion(self):
+        registrar_ingreso(self.medicamento, -12, tipo='A')
+        registrar_ingreso(self.medicamento, 4)
+        self.assertEqual(kardex(self.medicamento), 12)
+        self.assertEqual(list(stock_bajo(12)), [self.medicamento])
+        MovimientoMedicamento.objects.update(fecha=timezone.now() - timedelta(days=400))
+        self.assertEqual(compactar_movimientos(), (3, 0))
+        self.assertEqual(MovimientoMedicamento.objects.filter(medicamento=self.medicamento).count(), 1)
+        self.assertEqual(kardex(self.medicamento), 12)
+
+    def test_save_no_reescribe_el_stock(self):
+        # el objeto se leyo antes de la dispensacion (como un formulario abierto)
+        leido = Medicamento.objects.get(pk=self.medicamento.pk)
+        sincronizar_dispensacion(crear_atencion(self.paciente, [(self.medicamento, 5)]))
+        leido.nombre = 'Paracetamol 500'
+        leido.cantidad = 20
+        leido.save()
+        self.medicamento.refresh_from_db()
+        self.assertEqual((self.medicamento.nombre, self.medicamento.cantidad), ('Paracetamol 500', 15))
+        self.assertEqual(kardex(self.medicamento), 15)
+
+    def test_admin_con_dispensacion_intercalada(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@clinica.ec', 'clave-segura-1'))
+        url = reverse('admin:core_medicamento_change', args=[self.medicamento.pk])
+        self.assertEqual(self.client.get(url).status_code, 200)
+        datos = {'tipo': self.medicamento.tipo_id, 'nombre': 'Paracetamol 1g', 'precio': '1.00',
+                 'comercial': 'on', 'activo': 'on', 'cantidad': 20, 'ajuste_stock': ''}
+        # entre el GET y el POST se dispensan 5 unidades
+        sincronizar_dispensacion(crear_atencion(self.paciente, [(self.medicamento, 5)]))
+        self.assertEqual(self.client.post(url, datos).status_code, 302)
+        self.medicamento.refresh_from_db()
+        self.assertEqual((self.medicamento.nombre, self.medicamento.cantidad), ('Paracetamol 1g', 15))
+        # el ajuste se suma al stock actual y queda en el kardex
+        self.assertEqual(self.client.post(url, {**datos, 'ajuste_stock': -3}).status_code, 302)
+        self.medicamento.refresh_from_db()
+        self.assertEqual(self.medicamento.cantidad, 12)
+        self.assertEqual(kardex(self.medicamento), 12)
+        self.assertEqual(MovimientoMedicamento.objects.filter(medicamento=self.medicamento, tipo='A').count(), 1)
+
+
+class StockConcurrenteTest(TransactionTestCase):
+    hilos = 8
+    atenciones_por_hilo = 10
+
+    def test_no_se_pierden_movimientos(self):
+        paciente = crear_paciente()
+        medicamento = crear_medicamento(1000)
+        trabajos = [[crear_atencion(paciente, [(medicamento, 1 + (h + i) % 3)]).pk for i in range(self.atenciones_por_hilo)]
+                    for h in range(self.hilos)]
+        recetado = sum(1 + (h + i) % 3 for h in range(self.hilos) for i in range(self.atenciones_por_hilo))
+        errores = []
+
+        def reintentar(funcion, *args):
+            # SQLite en memoria compartida devuelve 'table is locked' sin esperar;
+            # la transaccion se revierte completa, asi que reintentar es seguro
+            for _ in range(200):
+                try:
+                    return funcion(*args)
+                except OperationalError:
+                    time.sleep(random.uniform(0.001, 0.02))
+            errores.append(funcion.__name__)
+
+        def trabajar(atenciones):
+            try:
+                for atencion_id in atenciones:
+                    reintentar(sincronizar_dispensacion, atencion_id)
+                    reintentar(registrar_ingreso, medicamento.pk, 1)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=trabajar, args=(atenciones,)) for atenciones in trabajos]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        ingresos = self.hilos * self.atenciones_por_hilo
+        medicamento.refresh_from_db()
+        self.assertEqual(errores, [])
+        self.assertEqual(medicamento.cantidad, 1000 - recetado + ingresos)
+        self.assertEqual(kardex(medicamento), medicamento.cantidad)
+        self.assertEqual(MovimientoMedicamento.objects.filter(tipo='D').count(), ingresos)
+
+
+class CostosAtencionTest(TestCase):
+
+    def setUp(self):
+        atencion = crear_atencion(crear_paciente(), [])
+        self.rx = ServiciosAdicionales.objects.create(nombre_servicio='Rayos X', costo_servicio='10.50')
+        self.lab = ServiciosAdicionales.objects.create(nombre_servicio='Laboratorio', costo_servicio='20.00')
+        self.costo = CostosAtencion.objects.create(atencion=atencion)
+        self.otro = CostosAtencion.objects.create(atencion=atencion)
+
+    def total(self, costo):
+        return str(CostosAtencion.objects.get(pk=costo.pk).total)
+
+    def test_altas_y_bajas_de_servicios(self):
+        self.costo.servicios_adicionales.add(self.rx, self.lab)
+        self.assertEqual(str(self.costo.total), '30.50')
+        self.costo.servicios_adicionales.remove(self.rx)
+        self.assertEqual(self.total(self.costo), '20.00')
+        # desde el lado del servicio
+        self.rx.servicios_adicionales.add(self.costo, self.otro)
+        self.assertEqual((self.total(self.costo), self.total(self.otro)), ('30.50', '10.50'))
+        self.rx.servicios_adicionales.clear()
+        self.assertEqual((self.total(self.costo), self.total(self.otro)), ('20.00', '0.00'))
+
+    def test_cambio_de_precio_y_borrado_de_servicio(self):
+        self.costo.servicios_adicionales.set([self.rx, self.lab])
+        self.otro.servicios_adicionales.set([self.lab])
+        lab = ServiciosAdicionales.objects.get(pk=self.lab.pk)
+        lab.costo_servicio = '25.00'
+        lab.save()
+        self.assertEqual((self.total(self.costo), self.total(self.otro)), ('35.50', '25.00'))
+        lab.delete()
+        self.assertEqual((self.total(self.costo), self.total(self.otro)), ('10.50', '0.00'))
+
+    def test_verificacion_y_correccion(self):
+        self.costo.servicios_adicionales.add(self.rx)
+        CostosAtencion.objects.filter(pk=self.costo.pk).update(total=99)
+        self.assertEqual([pk for pk, _, _ in verificar_totales(lote=1)], [self.costo.pk])
+        verificar_totales(lote=1, corregir=True)
+        self.assertEqual(verificar_totales(), [])
+        self.assertEqual(self.total(self.costo), '10.50')
+
+
+class ResumenIngresosTest(TestCase):
+
+    def setUp(self):
+        self.atencion = crear_atencion(crear_paciente(), [])
+        self.rx = ServiciosAdicionales.objects.create(nombre_servicio='Rayos X', costo_servicio='10.00')
+        self.lab = ServiciosAdicionales.objects.create(nombre_servicio='Laboratorio', costo_servicio='25.00')
+        self.hoy = timezone.localdate()
+
+    def resumen(self, desde=None, hasta=None, periodo='D'):
+        datos = reporte(desde or self.hoy, hasta or self.hoy, periodo)
+        servicios = {fila['servicio__nombre_servicio']: (str(fila['total']), fila['cantidad']) for fila in datos['servicios']}
+        return str(datos['total']), datos['costos'], servicios
+
+    def test_se_actualiza_al_registrar_y_cambiar_costos(self):
+        costo = CostosAtencion.objects.create(atencion=self.atencion)
+        costo.servicios_adicionales.add(self.rx, self.lab)
+        otro = CostosAtencion.objects.create(atencion=self.atencion)
+        self.lab.servicios_adicionales.add(otro)
+        self.assertEqual(self.resumen(), ('60.00', 2, {'Laboratorio': ('50.00', 2), 'Rayos X': ('10.00', 1)}))
+        lab = ServiciosAdicionales.objects.get(pk=self.lab.pk)
+        lab.costo_servicio = '30.00'
+        lab.save()
+        self.assertEqual(self.resumen(periodo='M'), ('70.00', 2, {'Laboratorio': ('60.00', 2), 'Rayos X': ('10.00', 1)}))
+        # un costo anulado deja de sumar
+        otro = CostosAtencion.objects.get(pk=otro.pk)
+        otro.activo = False
+        otro.save()
+        self.assertEqual(self.resumen(), ('40.00', 1, {'Laboratorio': ('30.00', 1), 'Rayos X': ('10.00', 1)}))
+        costo.servicios_adicionales.clear()
+        self.assertEqual(self.resumen(periodo='M'), ('0.00', 1, {}))
+
+    def test_reconstruccion_por_lotes(self):
+        for dias, servicios in ((40, [self.rx]), (3, [self.rx, self.lab]), (0, [self.lab])):
+            costo = CostosAtencion.objects.create(atencion=self.atencion)
+            costo.servicios_adicionales.set(servicios)
+            CostosAtencion.objects.filter(pk=costo.pk).update(fecha_registro=timezone.now() - timedelta(days=dias))
+        # los update() no pasan por las señales: el resumen queda desfasado hasta reconstruir
+        ResumenIngreso.objects.all().delete()
+        reconstruir(self.hoy - timedelta(days=60), self.hoy, dias_por_lote=7)
+        desde = self.hoy - timedelta(days=60)
+        self.assertEqual(self.resumen(desde), ('70.00', 3, {'Laboratorio': ('50.00', 2), 'Rayos X': ('20.00', 2)}))
+        self.assertEqual(self.resumen(desde, periodo='M'), self.resumen(desde))
+        self.assertEqual(self.resumen(self.hoy - timedelta(days=3), self.hoy - timedelta(days=3)),
+                         ('35.00', 1, {'Laboratorio': ('25.00', 1), 'Rayos X': ('10.00', 1)}))
+
+
+class HistorialPacienteTest(TestCase):
+
+    def setUp(self):
+        self.paciente = crear_paciente()
+        self.medicamentos = [crear_medicamento(1000, nombre) for nombre in ('Paracetamol', 'Ibuprofeno')]
+        self.diagnosticos = [Diagnostico.objects.create(codigo=codigo, descripcion=codigo) for codigo in ('J00', 'R51')]
+        self.url = reverse('attention:patient_timeline', args=[self.paciente.pk])
+
+    def agregar_visita(self, dias):
+        atencion = crear_atencion(self.paciente, [(medicamento, 1) for medicamento in self.medicamentos])
+        atencion.diagnostico.set(self.diagnosticos)
+        Atencion.objects.filter(pk=atencion.pk).update(fecha_atencion=timezone.now() - timedelta(days=dias))
+        ExamenSolicitado.objects.create(paciente=self.paciente, nombre_examen='Hemograma', estado='S')
+        CitaMedica.objects.bulk_create([CitaMedica(paciente=self.paciente, fecha=timezone.localdate() - timedelta(days=dias),
+                                                   hora_cita=hora(9), estado='R')])
+
+    def consultar(self, parametros=''):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = Client().get(self.url + parametros)
+            datos = json.loads(b''.join(respuesta.streaming_content))
+        return len(consultas), datos
+
+    def test_consultas_constantes(self):
+        self.agregar_visita(30)
+        consultas_una, datos = self.consultar()
+        self.assertEqual(len(datos['eventos']), 3)
+        for dias in (20, 10, 5, 1):
+            self.agregar_visita(dias)
+        consultas_cinco, datos = self.consultar()
+        self.assertEqual(consultas_cinco, consultas_una)
+        self.assertEqual(len(datos['eventos']), 15)
+        atencion = next(evento for evento in datos['eventos'] if evento['tipo'] == 'atencion')
+        self.assertEqual([d['codigo'] for d in atencion['diagnosticos']], ['J00', 'R51'])
+        self.assertEqual(len(atencion['medicamentos']), 2)
+
+    def test_orden_por_fecha(self):
+        for dias in (9, 3, 6):
+            self.agregar_visita(dias)
+        _, datos = self.consultar()
+        fechas = [evento['fecha'] for evento in datos['eventos'] if evento['tipo'] != 'examen']
+        self.assertEqual(fechas, sorted(fechas, reverse=True))
+        self.assertEqual(datos['eventos'][0]['tipo'], 'examen')
+        _, datos = self.consultar('?orden=asc')
+        fechas = [evento['fecha'] for evento in datos['eventos'] if evento['tipo'] != 'examen']
+        self.assertEqual(fechas, sorted(fechas))
+        self.assertEqual(datos['eventos'][-1]['tipo'], 'examen')
+
+    def test_paciente_inexistente(self):
+        self.assertEqual(Client().get(reverse('attention:patient_timeline', args=[0])).status_code, 404)
+
+
+class AgendaTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.paciente = crear_paciente()
+        self.lunes = agenda.inicio_semana(timezone.localdate()) + timedelta(days=14)
+        self.url = reverse('attention:agenda')
+
+    def citar(self, fecha, *horas, paciente=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            for hora_cita in horas:
+                CitaMedica.objects.create(paciente=paciente or self.paciente, fecha=fecha, hora_cita=hora_cita, estado='P')
+
+    def consultar(self, fecha, vista=''):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = Client().get(self.url, {'fecha': fecha.isoformat(), 'vista': vista})
+        self.assertEqual(respuesta.status_code, 200)
+        return len(consultas), respuesta.json()['dias']
+
+    def test_consultas_dia_y_semana(self):
+        self.citar(self.lunes, hora(9))
+        consultas, dias = self.consultar(self.lunes)
+        self.assertEqual((consultas, len(dias[self.lunes.isoformat()])), (1, 1))
+        self.assertEqual(self.consultar(self.lunes)[0], 0)
+        for dia in range(1, 7):
+            self.citar(self.lunes + timedelta(days=dia), hora(9), hora(10), hora(11))
+        # el lunes sale de la cache y los otros seis dias se leen en una sola consulta
+        consultas, dias = self.consultar(self.lunes + timedelta(days=3), vista='semana')
+        self.assertEqual(consultas, 1)
+        self.assertEqual([len(citas) for citas in dias.values()], [1, 3, 3, 3, 3, 3, 3])
+        self.assertEqual(self.consultar(self.lunes, vista='semana')[0], 0)
+
+    def test_invalidacion(self):
+        self.citar(self.lunes, hora(9))
+        martes = self.lunes + timedelta(days=1)
+        self.consultar(self.lunes, vista='semana')
+        cita = CitaMedica.objects.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            cita.fecha = martes
+            cita.save()
+        _, dias = self.consultar(self.lunes, vista='semana')
+        self.assertEqual((dias[self.lunes.isoformat()], len(dias[martes.isoformat()])), ([], 1))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.paciente.apellidos = 'Mora'
+            self.paciente.save()
+        _, dias = self.consultar(martes)
+        self.assertEqual(dias[martes.isoformat()][0][3], 'Mora Ana')
+        with self.captureOnCommitCallbacks(execute=True):
+            cita.delete()
+        self.assertEqual(self.consultar(martes)[1], {martes.isoformat(): []})
+
+    def test_dias_pasados_sin_vencimiento(self):
+        hoy = timezone.localdate()
+        with mock.patch('aplication.attention.agenda.cache', wraps=cache) as espia:
+            agenda.agenda(hoy - timedelta(days=2), hoy + timedelta(days=1))
+        vencimientos = {}
+        for llamada in espia.set_many.call_args_list:
+            claves, timeout = llamada.args
+            vencimientos.update(dict.fromkeys(claves, timeout))
+        self.assertEqual(vencimientos, {
+            f'agenda:dia:{(hoy + timedelta(days=dias)).isoformat()}': None if dias < 0 else agenda.TIMEOUT
+            for dias in (-2, -1, 0, 1)
+        })
+
+
+class AdminConsultasTest(TestCase):
+    # los listados del admin hacen las mismas consultas con 2 o con 6 filas por pagina
+    modelos = ('citamedica', 'atencion', 'detalleatencion', 'costosatencion', 'examensolicitado')
+
+    def setUp(self):
+        self.cliente = Client()
+        self.cliente.force_login(User.objects.create_superuser('admin', 'admin@test.com', 'admin'))
+        self.medicamento = crear_medicamento(1000)
+        self.servicio = ServiciosAdicionales.objects.create(nombre_servicio='Rayos X', costo_servicio='10.00')
+        self.pacientes = 0
+
+    def agregar_filas(self, cantidad):
+        for _ in range(cantidad):
+            self.pacientes += 1
+            paciente = crear_paciente(f'17100340{self.pacientes:02d}')
+            atencion = crear_atencion(paciente, [(self.medicamento, 1)])
+            CostosAtencion.objects.create(atencion=atencion).servicios_adicionales.add(self.servicio)
+            ExamenSolicitado.objects.create(paciente=paciente, nombre_examen='Hemograma', estado='S')
+            CitaMedica.objects.bulk_create([CitaMedica(paciente=paciente, fecha=timezone.localdate() + timedelta(days=self.pacientes),
+                                                       hora_cita=hora(9), estado='P')])
+
+    def consultas(self, url):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.cliente.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        return len(consultas)
+
+    def consultas_por_listado(self, busqueda=''):
+        return {modelo: self.consultas(f'/admin/attention/{modelo}/{busqueda}') for modelo in self.modelos}
+
+    def test_consultas_acotadas(self):
+        for busqueda in ('', '?q=perez', '?q=1710034'):
+            self.agregar_filas(2)
+            pocas = self.consultas_por_listado(busqueda)
+            self.agregar_filas(4)
+            muchas = self.consultas_por_listado(busqueda)
+            self.assertEqual(muchas, pocas, busqueda)
+            for modelo, cantidad in muchas.items():
+                self.assertLessEqual(cantidad, 8, modelo)
+
+    def test_busqueda_por_paciente(self):
+        self.agregar_filas(2)
+        respuesta = self.cliente.get('/admin/attention/detalleatencion/?q=1710034001')
+        self.assertEqual(len(respuesta.context['cl'].result_list), 1)
+
+    def test_busqueda_por_medicamento_y_examen(self):
+        self.agregar_filas(2)
+        ExamenSolicitado.objects.create(paciente=crear_paciente('1710034099'), nombre_examen='Glucosa', estado='S')
+        resultados = {
+            url: len(self.cliente.get(url).context['cl'].result_list)
+            for url in ('/admin/attention/detalleatencion/?q=' + self.medicamento.nombre[:4].lower(),
+                        '/admin/attention/detalleatencion/?q=zzz',
+                        '/admin/attention/examensolicitado/?q=hemo',
+                        '/admin/attention/examensolicitado/?q=GLU',
+                        '/admin/attention/examensolicitado/?q=grama')
+        }
+        self.assertEqual(list(resultados.values()), [2, 0, 2, 1, 0])
+
+    def test_autocompletado(self):
+        self.agregar_filas(1)
+        respuesta = self.cliente.get('/admin/autocomplete/', {
+            'term': 'pere', 'app_label': 'attention', 'model_name': 'atencion', 'field_name': 'paciente'})
+        self.assertEqual(len(respuesta.json()['results']), 1)
+        for url in ('/admin/attention/atencion/add/', '/admin/core/doctor/', '/admin/core/empleado/'):
+            self.assertEqual(self.cliente.get(url).status_code, 200)
+
+
+class CargaResultadoTest(TestCase):
+
+    def setUp(self):
+        self.carpeta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.carpeta)
+        ajustes = override_settings(MEDIA_ROOT=os.path.join(self.carpeta, 'media'),
+                                    CARGAS_DIR=os.path.join(self.carpeta, 'cargas'))
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.examen = ExamenSolicitado.objects.create(paciente=crear_paciente(), nombre_examen='Tomografia', estado='S')
+        self.contenido = os.urandom(250_000)
+        self.partes = [self.contenido[i:i + 100_000] for i in range(0, len(self.contenido), 100_000)]
+
+    def iniciar(self, **datos):
+        datos = {'nombre': 'tomografia.pdf', 'tamano': len(self.contenido),
+                 'sha256': hashlib.sha256(self.contenido).hexdigest(), **datos}
+        respuesta = Client().post(reverse('attention:exam_upload', args=[self.examen.pk]), datos)
+        self.assertEqual(respuesta.status_code, 201)
+        return reverse('attention:exam_upload_chunk', args=[respuesta.json()['token']])
+
+    def enviar(self, url, numero, parte=None, sha256=None):
+        parte = self.partes[numero] if parte is None else parte
+        inicio = numero * 100_000
+        return Client().put(url, parte, content_type='application/octet-stream', headers={
+            'Content-Range': f'bytes {inicio}-{inicio + len(parte) - 1}/{len(self.contenido)}',
+            'X-Content-SHA256': sha256 or hashlib.sha256(parte).hexdigest(),
+        })
+
+    def test_carga_reanudada(self):
+        url = self.iniciar()
+        self.assertEqual(self.enviar(url, 0).json()['recibido'], 100_000)
+        # la tercera antes de la segunda: el cliente debe seguir desde 'recibido'
+        respuesta = self.enviar(url, 2)
+        self.assertEqual((respuesta.status_code, respuesta.json()['recibido']), (409, 100_000))
+        # repetir una parte ya recibida no cambia nada
+        self.assertEqual(self.enviar(url, 0).json()['recibido'], 100_000)
+        self.assertEqual(Client().get(url).json()['recibido'], 100_000)
+        self.enviar(url, 1)
+        respuesta = self.enviar(url, 2)
+        self.assertEqual(respuesta.json()['estado'], 'C')
+        examen = ExamenSolicitado.objects.get(pk=self.examen.pk)
+        self.assertEqual(examen.estado, 'R')
+        with examen.resultado.open('rb') as archivo:
+            self.assertEqual(archivo.read(), self.contenido)
+        self.assertEqual(os.listdir(os.path.join(self.carpeta, 'cargas')), [])
+
+    def test_parte_alterada(self):
+        url = self.iniciar()
+        respuesta = self.enviar(url, 0, sha256=hashlib.sha256(b'otra cosa').hexdigest())
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(Client().get(url).json()['recibido'], 0)
+        self.assertEqual(ExamenSolicitado.objects.get(pk=self.examen.pk).estado, 'S')
+
+    def test_archivo_distinto_reinicia(self):
+        url = self.iniciar(sha256=hashlib.sha256(b'otro archivo').hexdigest())
+        self.enviar(url, 0)
+        self.enviar(url, 1)
+        self.assertEqual(self.enviar(url, 2).status_code, 400)
+        carga = CargaResultado.objects.get()
+        self.assertEqual((carga.recibido, carga.estado), (0, 'P'))
+        examen = ExamenSolicitado.objects.get(pk=self.examen.pk)
+        self.assertEqual((examen.estado, bool(examen.resultado)), ('S', False))
+
+
+@override_settings(REPLICA_ROUTING={'REPLICAS': ['replica'], 'STICKY_SECONDS': 60})
+class ReplicaRoutingTest(TestCase):
+    # 'replica' es otra base local: lo que se crea en una no aparece en la otra
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        self.paciente = crear_paciente()
+        # mismo pk que en la primaria: las secuencias de Postgres no se reinician entre tests
+        Paciente.objects.using('replica').create(pk=self.paciente.pk, nombres='Rosa', apellidos='Replica',
+                                                 cedula='0912345675', fecha_nacimiento='1980-05-05',
+                                                 telefono='0991234567', sexo='F', estado_civil='C',
+                                                 direccion='Calle 2')
+        self.client = Client()
+
+    def consultar(self, url, data=None):
+        with CaptureQueriesContext(connection) as primaria, CaptureQueriesContext(connections['replica']) as replica:
+            respuesta = self.client.get(url, data)
+            if respuesta.streaming:
+                respuesta.streaming_content = [b''.join(respuesta.streaming_content)]
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta, len(primaria), len(replica)
+
+    def test_vista_de_lectura_lee_de_la_replica(self):
+        respuesta, primaria, replica = self.consultar(reverse('core:patient_list'))
+        self.assertContains(respuesta, 'Replica')
+        self.assertNotContains(respuesta, 'Perez')
+        self.assertEqual(primaria, 0)
+        self.assertGreater(replica, 0)
+
+    def test_vistas_con_cache_y_escrituras_usan_la_primaria(self):
+        _, primaria, replica = self.consultar(reverse('core:patient_detail', args=[self.paciente.pk]))
+        self.assertGreater(primaria, 0)
+        self.assertEqual(replica, 0)
+        _, primaria, replica = self.consultar(reverse('core:patient_create'))
+        self.assertEqual(replica, 0)
+        self.assertGreater(primaria, 0)
+
+    def test_la_sesion_lee_de_la_primaria_despues_de_escribir(self):
+        crear_horarios()
+        dia = timezone.localdate() + timedelta(days=1)
+        respuesta = self.client.post(reverse('attention:booking'),
+                                     {'paciente': self.paciente.pk, 'fecha': dia.isoformat(), 'hora': '08:00'})
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertIn(ULTIMA_ESCRITURA, self.client.session)
+        url = reverse('attention:patient_timeline', args=[self.paciente.pk])
+        respuesta, primaria, replica = self.consultar(url)
+        self.assertEqual(json.loads(b''.join(respuesta.streaming_content))['paciente']['apellidos'], 'Perez')
+        self.assertEqual(replica, 0)
+        # pasado STICKY_SECONDS vuelve a la replica
+        with override_settings(REPLICA_ROUTING={'REPLICAS': ['replica'], 'STICKY_SECONDS': 0}):
+            _, primaria, replica = self.consultar(url)
+        self.assertGreater(replica, 0)
+
+    def test_sin_replicas_todo_va_a_la_primaria(self):
+        with override_settings(REPLICA_ROUTING={'REPLICAS': []}):
+            respuesta, primaria, replica = self.consultar(reverse('core:patient_list'))
+        self.assertContains(respuesta, 'Perez')
+        self.assertEqual(replica, 0)
+
+    def test_desde_replica(self):
+        with desde_replica():
+            self.assertEqual(list(Paciente.objects.values_list('apellidos', flat=True)), ['Replica'])
+            nuevo = crear_paciente(cedula='0102030405')
+        self.assertEqual(nuevo._state.db, 'default')
+        self.assertEqual(Paciente.objects.count(), 2)
+
+    def test_vistas_de_lectura_sin_transaccion(self):
+        for url, replica in ((reverse('core:home'), True), (reverse('core:patient_list'), True),
+                             (reverse('attention:revenue'), True), (reverse('attention:agenda'), False),
+                             (reverse('core:patient_detail', args=[1]), False)):
+            vista = resolve(url).func
+            self.assertIn('default', getattr(vista, '_non_atomic_requests', set()), url)
+            self.assertEqual(vista.read_replica, replica, url)
+        self.assertFalse(hasattr(resolve(reverse('attention:booking')).func, '_non_atomic_requests'))
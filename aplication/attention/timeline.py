@@ -0,0 +1,99 @@
+import heapq
+import json
+from datetime import datetime, time
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+
+from aplication.attention.models import Atencion, CitaMedica, DetalleAtencion, ExamenSolicitado
+from aplication.core.models import Diagnostico, Paciente
+
+# Historia clinica de un paciente como una sola linea de tiempo: atenciones (con sus
+# diagnosticos y medicamentos), examenes solicitados y citas. Se arma siempre con las
+# mismas 6 consultas sin importar cuantas visitas tenga el paciente: cada fuente
+# trae solo las columnas que se muestran (only) y lo relacionado de las atenciones va
+# en un Prefetch por relacion. Cada consulta ya viene ordenada por fecha y se mezclan
+# con heapq.merge; el JSON se genera evento por evento (ver PatientTimelineView).
+
+
+def _momento(fecha, hora=time.min):
+    # los examenes solo tienen fecha y las citas fecha + hora: todo a datetime local
+    return timezone.make_aware(datetime.combine(fecha, hora))
+
+
+def _atenciones(paciente_id, descendente):
+    diagnosticos = Prefetch('diagnostico', queryset=Diagnostico.objects.only('id', 'codigo', 'descripcion'))
+    medicamentos = Prefetch('atenciones', queryset=DetalleAtencion.objects.select_related('medicamento').only(
+        'id', 'atencion_id', 'cantidad', 'prescripcion', 'duracion_tratamiento', 'medicamento__nombre',
+        'medicamento__concentracion',
+    ).order_by('id'))
+    atenciones = (Atencion.objects.filter(paciente_id=paciente_id)
+                  .only('id', 'fecha_atencion', 'motivo_consulta', 'tratamiento', 'comentario')
+                  .prefetch_related(diagnosticos, medicamentos)
+                  .order_by('-fecha_atencion' if descendente else 'fecha_atencion', 'id'))
+    return [(atencion.fecha_atencion, {
+        'tipo': 'atencion',
+        'id': atencion.id,
+        'fecha': atencion.fecha_atencion,
+        'motivo': atencion.motivo_consulta,
+        'tratamiento': atencion.tratamiento,
+        'comentario': atencion.comentario,
+        'diagnosticos': [{'codigo': d.codigo, 'descripcion': d.descripcion} for d in atencion.diagnostico.all()],
+        'medicamentos': [{
+            'nombre': detalle.medicamento.nombre,
+            'concentracion': detalle.medicamento.concentracion,
+            'cantidad': detalle.cantidad,
+            'prescripcion': detalle.prescripcion,
+            'duracion_dias': detalle.duracion_tratamiento,
+        } for detalle in atencion.atenciones.all()],
+    }) for atencion in atenciones]
+
+
+def _examenes(paciente_id, descendente):
+    examenes = (ExamenSolicitado.objects.filter(paciente_id=paciente_id)
+                .only('id', 'nombre_examen', 'fecha_solicitud', 'estado', 'resultado', 'comentario')
+                .order_by('-fecha_solicitud' if descendente else 'fecha_solicitud', 'id'))
+    return [(_momento(examen.fecha_solicitud), {
+        'tipo': 'examen',
+        'id': examen.id,
+        'fecha': examen.fecha_solicitud,
+        'nombre': examen.nombre_examen,
+        'estado': examen.estado,
+        'resultado': examen.resultado.url if examen.resultado else None,
+        'comentario': examen.comentario,
+    }) for examen in examenes]
+
+
+def _citas(paciente_id, descendente):
+    orden = ('-fecha', '-hora_cita') if descendente else ('fecha', 'hora_cita')
+    citas = (CitaMedica.objects.filter(paciente_id=paciente_id)
+             .only('id', 'fecha', 'hora_cita', 'estado').order_by(*orden, 'id'))
+    return [(_momento(cita.fecha, cita.hora_cita), {
+        'tipo': 'cita',
+        'id': cita.id,
+        'fecha': _momento(cita.fecha, cita.hora_cita),
+        'estado': cita.estado,
+        'estado_nombre': cita.get_estado_display(),
+    }) for cita in citas]
+
+
+def historial(paciente_id, descendente=True):
+    # (datos del paciente, eventos ordenados por fecha). Las consultas se ejecutan
+    # aqui; el iterador devuelto solo mezcla lo ya leido
+    paciente = get_object_or_404(Paciente.objects.only('id', 'nombres', 'apellidos', 'cedula'), pk=paciente_id)
+    fuentes = [fuente(paciente.id, descendente) for fuente in (_atenciones, _examenes, _citas)]
+    eventos = heapq.merge(*fuentes, key=lambda evento: evento[0], reverse=descendente)
+    datos = {'id': paciente.id, 'nombres': paciente.nombres, 'apellidos': paciente.apellidos, 'cedula': paciente.cedula}
+    return datos, (evento for _, evento in eventos)
+
+
+def como_json(paciente, eventos):
+    # genera el documento {"paciente": {...}, "eventos": [...]} por partes
+    yield f'{{"paciente": {json.dumps(paciente, cls=DjangoJSONEncoder)}, "eventos": ['
+    separador = ''
+    for evento in eventos:
+        yield separador + json.dumps(evento, cls=DjangoJSONEncoder)
+        separador = ', '
+    yield ']}'
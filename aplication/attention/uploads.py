@@ -0,0 +1,192 @@
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import router, transaction
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from aplication.attention.models import CargaResultado, ExamenSolicitado
+
+# Carga por partes y reanudable del resultado de un examen (PDF, imagenes).
+# 1. iniciar_carga: se registra el archivo (nombre, tamaño y opcionalmente su SHA-256)
+#    y se crea CARGAS_DIR/<token>.part vacio.
+# 2. recibir_parte: cada parte trae su posicion y su SHA-256. Se lee del request por
+#    bloques a un temporal (en memoria solo hasta 1 MB) calculando el hash; si coincide
+#    se bloquea la fila de la carga y se escribe en el .part en su posicion. Solo se
+#    acepta la parte que empieza en 'recibido' (las repetidas se ignoran), asi que tras
+#    un corte el cliente consulta el estado y sigue desde ahi.
+# 3. Con la ultima parte se verifica el archivo completo y, en la misma transaccion, se
+#    adjunta al examen (en disco el .part se mueve, no se copia) y el examen pasa a
+#    Realizado ('R').
+# Ninguna etapa carga el archivo completo en memoria.
+
+TAMANO_PARTE_MAXIMO = 16 * 1024 * 1024
+TAMANO_PARTE = 4 * 1024 * 1024  # sugerido al cliente
+BLOQUE = 64 * 1024
+EN_MEMORIA = 1024 * 1024
+HORAS_VIGENCIA = 48
+_sha256 = re.compile(r'^[0-9a-f]{64}$')
+
+
+class CargaInvalida(Exception):
+    pass
+
+
+class ParteFueraDeOrden(Exception):
+    def __init__(self, mensaje, recibido):
+        super().__init__(mensaje)
+        self.recibido = recibido
+
+
+class _ArchivoParcial(File):
+    # FileSystemStorage mueve (os.rename) los archivos que tienen ruta temporal
+    def temporary_file_path(self):
+        return self.name
+
+
+def ruta_parcial(carga):
+    return os.path.join(settings.CARGAS_DIR, f'{carga.token}.part')
+
+
+def _hash_valido(valor):
+    valor = (valor or '').strip().lower()
+    if not _sha256.match(valor):
+        raise CargaInvalida('SHA-256 invalido (64 caracteres hexadecimales).')
+    return valor
+
+
+def iniciar_carga(examen, nombre, tamano, sha256=''):
+    nombre = get_valid_filename(os.path.basename(nombre or ''))[:100]
+    if not nombre:
+        raise CargaInvalida('Nombre de archivo invalido.')
+    if not 0 < tamano <= settings.CARGA_TAMANO_MAXIMO:
+        raise CargaInvalida(f'El tamaño debe estar entre 1 y {settings.CARGA_TAMANO_MAXIMO} bytes.')
+    carga = CargaResultado.objects.create(examen=examen, nombre=nombre, tamano=tamano,
+                                          sha256=_hash_valido(sha256) if sha256 else '')
+    os.makedirs(settings.CARGAS_DIR, exist_ok=True)
+    open(ruta_parcial(carga), 'wb').close()
+    return carga
+
+
+def _leer_parte(flujo, largo, sha256):
+    # copia 'largo' bytes del flujo a un temporal y verifica su hash
+    temporal = tempfile.SpooledTemporaryFile(max_size=EN_MEMORIA)
+    digest = hashlib.sha256()
+    pendiente = largo
+    while pendiente:
+        bloque = flujo.read(min(BLOQUE, pendiente))
+        if not bloque:
+            break
+        digest.update(bloque)
+        temporal.write(bloque)
+        pendiente -= len(bloque)
+    if pendiente:
+        temporal.close()
+        raise CargaInvalida('La parte llego incompleta.')
+    if digest.hexdigest() != sha256:
+        temporal.close()
+        raise CargaInvalida('El SHA-256 de la parte no coincide.')
+    temporal.seek(0)
+    return temporal
+
+
+def _hash_archivo(ruta):
+    digest = hashlib.sha256()
+    with open(ruta, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(BLOQUE), b''):
+            digest.update(bloque)
+    return digest.hexdigest()
+
+
+def recibir_parte(token, inicio, flujo, largo, sha256):
+    # escribe la parte [inicio, inicio + largo) y devuelve la carga actualizada.
+    # CargaResultado.DoesNotExist si el token no existe
+    sha256 = _hash_valido(sha256)
+    if not 0 < largo <= TAMANO_PARTE_MAXIMO:
+        raise CargaInvalida(f'Cada parte debe tener entre 1 y {TAMANO_PARTE_MAXIMO} bytes.')
+    parte = _leer_parte(flujo, largo, sha256)
+    error = None
+    using = router.db_for_write(CargaResultado)
+    with parte, transaction.atomic(using=using):
+        carga = CargaResultado.objects.using(using).select_for_update().get(token=token)
+        fin = inicio + largo
+        if fin > carga.tamano:
+            raise CargaInvalida('La parte excede el tamaño del archivo.')
+        if carga.estado == 'C' or fin <= carga.recibido:
+            # repetida (p. ej. se perdio la respuesta): ya esta escrita
+            return carga
+        if inicio != carga.recibido:
+            raise ParteFueraDeOrden(f'Se esperaba la parte que empieza en {carga.recibido}.', carga.recibido)
+        ruta = ruta_parcial(carga)
+        if not os.path.exists(ruta) and inicio:
+            # se perdio el .part (p. ej. se revirtio la transaccion que lo adjuntaba)
+            carga.recibido = 0
+            error = ParteFueraDeOrden('Se perdieron las partes anteriores; la carga se reinicia.', 0)
+        else:
+            with open(ruta, 'r+b' if inicio else 'wb') as archivo:
+                archivo.seek(inicio)
+                shutil.copyfileobj(parte, archivo, BLOQUE)
+            carga.recibido = fin
+            if fin == carga.tamano:
+                error = _completar(carga, ruta, using)
+        carga.save(update_fields=['recibido', 'estado', 'fecha_actualizacion'])
+    if error:
+        # el reinicio de la carga ya quedo guardado
+        raise error
+    return carga
+
+
+def _completar(carga, ruta, using):
+    # adjunta el archivo al examen o, si no cuadra, reinicia la carga y devuelve el error
+    if os.path.getsize(ruta) != carga.tamano:
+        carga.recibido = 0
+        return CargaInvalida('El archivo recibido no tiene el tamaño indicado; la carga se reinicia.')
+    if carga.sha256 and _hash_archivo(ruta) != carga.sha256:
+        carga.recibido = 0
+        return CargaInvalida('El SHA-256 del archivo no coincide; la carga se reinicia.')
+    examen = ExamenSolicitado.objects.using(using).select_for_update().get(pk=carga.examen_id)
+    with _ArchivoParcial(open(ruta, 'rb'), name=ruta) as archivo:
+        examen.resultado.save(carga.nombre, archivo, save=False)
+    examen.estado = 'R'
+    examen.save(using=using, update_fields=['resultado', 'estado'])
+    carga.estado = 'C'
+    # con otros storages el .part se copio: se borra al confirmar
+    transaction.on_commit(lambda: _borrar(ruta), using=using)
+    return None
+
+
+def _borrar(ruta):
+    try:
+        os.remove(ruta)
+    except FileNotFoundError:
+        pass
+
+
+def estado_carga(carga):
+    return {
+        'token': str(carga.token),
+        'examen': carga.examen_id,
+        'nombre': carga.nombre,
+        'tamano': carga.tamano,
+        'recibido': carga.recibido,
+        'tamano_parte': TAMANO_PARTE,
+        'estado': carga.estado,
+    }
+
+
+def limpiar_vencidas(horas=HORAS_VIGENCIA):
+    # borra las cargas pendientes sin actividad en las ultimas 'horas' y sus .part
+    limite = timezone.now() - timedelta(hours=horas)
+    vencidas = CargaResultado.objects.filter(estado='P', fecha_actualizacion__lt=limite)
+    borradas = 0
+    for carga in vencidas.iterator():
+        _borrar(ruta_parcial(carga))
+        borradas += 1
+    vencidas.delete()
+    return borradas
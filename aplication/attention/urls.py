@@ -0,0 +1,20 @@
+from django.urls import path
+from aplication.attention.views.appointment import AgendaView, AvailabilityView, BookingView
+from aplication.attention.views.history import PatientTimelineView
+from aplication.attention.views.revenue import RevenueReportView
+from aplication.attention.views.uploads import ExamUploadChunkView, ExamUploadView
+
+app_name='attention' # define un espacio de nombre para la aplicacion
+urlpatterns = [
+  # rutas de citas medicas
+  path('availability/', AvailabilityView.as_view(),name='availability'),
+  path('booking/', BookingView.as_view(),name='booking'),
+  path('agenda/', AgendaView.as_view(),name='agenda'),
+  # historia clinica
+  path('patient_timeline/<int:pk>/', PatientTimelineView.as_view(),name='patient_timeline'),
+  # reportes de ingresos
+  path('revenue/', RevenueReportView.as_view(),name='revenue'),
+  # carga por partes del resultado de un examen
+  path('exam_upload/<int:pk>/', ExamUploadView.as_view(),name='exam_upload'),
+  path('exam_upload/chunk/<uuid:token>/', ExamUploadChunkView.as_view(),name='exam_upload_chunk'),
+]
@@ -0,0 +1,91 @@
+from datetime import date, timedelta
+
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.generic import View
+
+from aplication.attention.agenda import CAMPOS as CAMPOS_AGENDA, agenda, inicio_semana
+from aplication.attention.availability import proximos_libres, turnos_libres
+from aplication.attention.booking import TurnoNoDisponible, reservar_cita
+from aplication.core.models import Paciente
+from doctor.mixins import ReadOnlyMixin
+
+
+def _fecha(texto, defecto):
+    try:
+        return date.fromisoformat(texto) if texto else defecto
+    except ValueError:
+        return None
+
+
+class AvailabilityView(ReadOnlyMixin, View):
+    # turnos libres: ?desde=AAAA-MM-DD&hasta=AAAA-MM-DD (rango, maximo 62 dias)
+    # o ?proximos=N (los N siguientes turnos libres desde hoy o desde ?desde)
+    max_dias = 62
+    max_proximos = 50
+    # los turnos ocupados se guardan en la cache: lee de la primaria
+    read_replica = False
+
+    def get(self, request, *args, **kwargs):
+        desde = _fecha(request.GET.get('desde'), date.today())
+        if desde is None:
+            return JsonResponse({'error': 'Fecha invalida (use AAAA-MM-DD).'}, status=400)
+        proximos = request.GET.get('proximos', '')
+        if proximos:
+            if not proximos.isdigit():
+                return JsonResponse({'error': 'proximos debe ser un numero.'}, status=400)
+            turnos = proximos_libres(min(int(proximos), self.max_proximos), desde)
+            return JsonResponse({'turnos': [turno.isoformat(timespec='minutes') for turno in turnos]})
+        hasta = _fecha(request.GET.get('hasta'), desde)
+        if hasta is None or hasta < desde:
+            return JsonResponse({'error': 'Rango de fechas invalido.'}, status=400)
+        hasta = min(hasta, desde + timedelta(days=self.max_dias - 1))
+        dias = turnos_libres(desde, hasta)
+        return JsonResponse({
+            'dias': {fecha.isoformat(): [hora.strftime('%H:%M') for hora in horas] for fecha, horas in dias.items()},
+        })
+
+
+class BookingView(View):
+    # POST paciente, fecha (AAAA-MM-DD), hora (HH:MM). 201 con la cita creada o
+    # 409 con turnos alternativos si el turno ya no esta disponible
+    def post(self, request, *args, **kwargs):
+        pk = request.POST.get('paciente', '')
+        if not pk.isdigit():
+            return JsonResponse({'error': 'Paciente invalido.'}, status=400)
+        paciente = get_object_or_404(Paciente, pk=pk)
+        try:
+            cita = reservar_cita(paciente, request.POST.get('fecha', ''), request.POST.get('hora', ''))
+        except ValueError:
+            return JsonResponse({'error': 'Fecha u hora invalida.'}, status=400)
+        except TurnoNoDisponible as error:
+            return JsonResponse({
+                'error': str(error),
+                'alternativas': [turno.isoformat(timespec='minutes') for turno in error.alternativas],
+            }, status=409)
+        return JsonResponse({
+            'id': cita.id,
+            'fecha': cita.fecha.isoformat(),
+            'hora': cita.hora_cita.strftime('%H:%M'),
+            'estado': cita.estado,
+        }, status=201)
+
+
+class AgendaView(ReadOnlyMixin, View):
+    # citas de un dia (?fecha=AAAA-MM-DD) o de su semana de lunes a domingo (&vista=semana)
+    # la agenda del dia se guarda en la cache: lee de la primaria
+    read_replica = False
+    def get(self, request, *args, **kwargs):
+        fecha = _fecha(request.GET.get('fecha'), date.today())
+        if fecha is None:
+            return JsonResponse({'error': 'Fecha invalida (use AAAA-MM-DD).'}, status=400)
+        if request.GET.get('vista') == 'semana':
+            desde = inicio_semana(fecha)
+            hasta = desde + timedelta(days=6)
+        else:
+            desde = hasta = fecha
+        dias = agenda(desde, hasta)
+        return JsonResponse({
+            'campos': CAMPOS_AGENDA,
+            'dias': {dia.isoformat(): citas for dia, citas in dias.items()},
+        })
@@ -0,0 +1,16 @@
+from django.http import StreamingHttpResponse
+from django.views.generic import View
+
+from aplication.attention.timeline import como_json, historial
+from doctor.mixins import ReadOnlyMixin
+
+
+class PatientTimelineView(ReadOnlyMixin, View):
+    # historia clinica del paciente en orden cronologico (?orden=asc) o del mas
+    # reciente al mas antiguo (por defecto), enviada como JSON por partes
+    query_budget = 8
+    def get(self, request, *args, **kwargs):
+        # las consultas corren aqui, mientras la peticion lee de la replica; el
+        # cuerpo solo serializa lo ya leido
+        paciente, eventos = historial(kwargs['pk'], descendente=request.GET.get('orden') != 'asc')
+        return StreamingHttpResponse(como_json(paciente, eventos), content_type='application/json')
@@ -0,0 +1,44 @@
+from datetime import date, timedelta
+
+from django.http import JsonResponse
+from django.views.generic import View
+
+from aplication.attention.revenue import reporte
+from aplication.attention.views.appointment import _fecha
+from doctor.mixins import ReadOnlyMixin
+
+
+class RevenueReportView(ReadOnlyMixin, View):
+    # ingresos de [desde, hasta] por dia (?periodo=dia, maximo 366 dias) o por mes
+    # (?periodo=mes, meses completos) con el desglose por servicio; solo lee los resumenes
+    max_dias = 366
+    max_meses = 120
+
+    def get(self, request, *args, **kwargs):
+        hoy = date.today()
+        periodo = 'M' if request.GET.get('periodo') == 'mes' else 'D'
+        hasta = _fecha(request.GET.get('hasta'), hoy)
+        desde = _fecha(request.GET.get('desde'), hasta.replace(day=1) if hasta else None)
+        if desde is None or hasta is None or hasta < desde:
+            return JsonResponse({'error': 'Rango de fechas invalido (use AAAA-MM-DD).'}, status=400)
+        if periodo == 'D':
+            desde = max(desde, hasta - timedelta(days=self.max_dias - 1))
+        else:
+            desde = max(desde, date(hasta.year - self.max_meses // 12, hasta.month, 1))
+        datos = reporte(desde, hasta, periodo)
+        return JsonResponse({
+            'periodo': 'mes' if periodo == 'M' else 'dia',
+            'desde': datos['desde'].isoformat(),
+            'hasta': datos['hasta'].isoformat(),
+            'total': datos['total'],
+            'costos': datos['costos'],
+            'filas': [
+                {'fecha': fila['fecha'].isoformat(), 'total': fila['total'], 'costos': fila['costos']}
+                for fila in datos['filas']
+            ],
+            'servicios': [
+                {'id': fila['servicio_id'], 'nombre': fila['servicio__nombre_servicio'],
+                 'total': fila['total'], 'cantidad': fila['cantidad']}
+                for fila in datos['servicios']
+            ],
+        })
@@ -0,0 +1,58 @@
+import re
+
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.generic import View
+
+from aplication.attention.models import CargaResultado, ExamenSolicitado
+from aplication.attention.uploads import (TAMANO_PARTE_MAXIMO, CargaInvalida, ParteFueraDeOrden, estado_carga,
+                                          iniciar_carga, recibir_parte)
+
+_rango = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+class ExamUploadView(View):
+    # POST nombre, tamano (bytes) y sha256 (opcional, del archivo completo): crea la
+    # carga del resultado del examen. 201 con el token para enviar las partes
+    def post(self, request, pk, *args, **kwargs):
+        examen = get_object_or_404(ExamenSolicitado, pk=pk)
+        tamano = request.POST.get('tamano', '')
+        if not tamano.isdigit():
+            return JsonResponse({'error': 'tamano debe ser un numero.'}, status=400)
+        try:
+            carga = iniciar_carga(examen, request.POST.get('nombre', ''), int(tamano), request.POST.get('sha256', ''))
+        except CargaInvalida as error:
+            return JsonResponse({'error': str(error)}, status=400)
+        return JsonResponse(estado_carga(carga), status=201)
+
+
+class ExamUploadChunkView(View):
+    # GET: estado de la carga (desde donde reanudar).
+    # PUT: una parte en el cuerpo, con los encabezados
+    #   Content-Range: bytes <inicio>-<fin inclusive>/<tamano>
+    #   X-Content-SHA256: <sha256 de la parte>
+    # 200 con el estado (estado 'C' cuando el examen ya tiene el resultado), 409 si la
+    # parte no empieza donde termina lo recibido
+    def get(self, request, token, *args, **kwargs):
+        return JsonResponse(estado_carga(get_object_or_404(CargaResultado, token=token)))
+
+    def put(self, request, token, *args, **kwargs):
+        rango = _rango.match(request.headers.get('Content-Range', ''))
+        if not rango:
+            return JsonResponse({'error': 'Content-Range invalido (bytes inicio-fin/tamano).'}, status=400)
+        inicio, fin, _ = (int(valor) for valor in rango.groups())
+        largo = fin - inicio + 1
+        if largo > TAMANO_PARTE_MAXIMO:
+            return JsonResponse({'error': f'Cada parte puede tener hasta {TAMANO_PARTE_MAXIMO} bytes.'}, status=413)
+        if request.headers.get('Content-Length') != str(largo):
+            return JsonResponse({'error': 'Content-Length no coincide con Content-Range.'}, status=400)
+        try:
+            # el cuerpo se lee del request por bloques (request.body lo cargaria entero)
+            carga = recibir_parte(token, inicio, request, largo, request.headers.get('X-Content-SHA256', ''))
+        except CargaResultado.DoesNotExist:
+            return JsonResponse({'error': 'Carga inexistente.'}, status=404)
+        except ParteFueraDeOrden as error:
+            return JsonResponse({'error': str(error), 'recibido': error.recibido}, status=409)
+        except CargaInvalida as error:
+            return JsonResponse({'error': str(error)}, status=400)
+        return JsonResponse(estado_carga(carga))
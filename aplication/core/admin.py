@@ -1,8 +1,22 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
 from aplication.core.models import (
     MarcaMedicamento, TipoSangre, Paciente, Especialidad, Doctor, Cargo, Empleado, TipoMedicamento, 
     Medicamento, Diagnostico, CategoriaExamen, TipoCategoria
 )
+from aplication.attention.stock import StockInsuficiente, registrar_ingreso
+from aplication.core.search import buscar_diagnosticos, buscar_pacientes
+from doctor.mixins import CatalogoAdminMixin, TablaGrandeAdminMixin
+
+
+class MedicamentoAdminForm(forms.ModelForm):
+    # el stock no se edita como valor absoluto: se suma o resta con un movimiento
+    ajuste_stock = forms.IntegerField(required=False, label="Ajuste de stock",
+                                      help_text="Unidades a sumar (o restar, con signo -) al stock actual.")
+
+    class Meta:
+        model = Medicamento
+        fields = '__all__'
 
 # Registro de TipoSangre
 @admin.register(TipoSangre)
@@ -13,13 +27,17 @@ class TipoSangreAdmin(admin.ModelAdmin):
 
 # Registro de Paciente
 @admin.register(Paciente)
-class PacienteAdmin(admin.ModelAdmin):
+class PacienteAdmin(CatalogoAdminMixin, TablaGrandeAdminMixin, admin.ModelAdmin):
     list_display = ('nombres', 'apellidos', 'cedula', 'fecha_nacimiento', 'sexo', 'estado_civil')
     search_fields = ('nombres', 'apellidos', 'cedula')
     list_filter = ('sexo', 'estado_civil', 'tipo_sangre')
     ordering = ['apellidos']
 
-    
+    def get_search_results(self, request, queryset, search_term):
+        # cedula o nombres por indice (ver core/search.py); tambien la usan los
+        # autocompletados de paciente de las citas, atenciones y examenes
+        return buscar_pacientes(queryset, search_term), False
+
 
 # Registro de Especialidad
 @admin.register(Especialidad)
@@ -30,13 +48,14 @@ class EspecialidadAdmin(admin.ModelAdmin):
 
 # Registro de Doctor
 @admin.register(Doctor)
-class DoctorAdmin(admin.ModelAdmin):
+class DoctorAdmin(CatalogoAdminMixin, admin.ModelAdmin):
     list_display = ('nombre_completo', 'cedula', 'codigoUnicoDoctor')
     search_fields = ('nombres', 'apellidos', 'cedula', 'codigoUnicoDoctor')
     list_filter = ('especialidad',)
     
+    # nombre_completo es una propiedad del modelo
     def nombre_completo(self, obj):
-        return obj.nombre_completo()
+        return obj.nombre_completo
     nombre_completo.short_description = "Nombre Completo"
 
 
@@ -49,13 +68,15 @@ class CargoAdmin(admin.ModelAdmin):
 
 # Registro de Empleado
 @admin.register(Empleado)
-class EmpleadoAdmin(admin.ModelAdmin):
+class EmpleadoAdmin(CatalogoAdminMixin, admin.ModelAdmin):
     list_display = ('nombre_completo', 'cedula', 'cargo', 'sueldo')
+    list_select_related = ('cargo',)
     search_fields = ('nombres', 'apellidos', 'cedula')
     list_filter = ('cargo',)
     
+    # nombre_completo es una propiedad del modelo
     def nombre_completo(self, obj):
-        return obj.nombre_completo()
+        return obj.nombre_completo
     nombre_completo.short_description = "Nombre Completo"
 
 
@@ -68,17 +89,49 @@ class TipoMedicamentoAdmin(admin.ModelAdmin):
 
 # Registro de Medicamento
 @admin.register(Medicamento)
-class MedicamentoAdmin(admin.ModelAdmin):
+class MedicamentoAdmin(CatalogoAdminMixin, admin.ModelAdmin):
+    form = MedicamentoAdminForm
     list_display = ('nombre', 'tipo', 'cantidad', 'precio', 'comercial')
+    list_select_related = ('tipo',)
     search_fields = ('nombre', 'tipo__nombre')
     list_filter = ('comercial', 'tipo')
 
+    def get_readonly_fields(self, request, obj=None):
+        # al crear se indica el stock inicial; despues solo cambia con ajustes (kardex)
+        return ('cantidad',) if obj else ()
+
+    def get_fields(self, request, obj=None):
+        fields = super().get_fields(request, obj)
+        return fields if obj else [field for field in fields if field != 'ajuste_stock']
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        ajuste = form.cleaned_data.get('ajuste_stock')
+        if change and ajuste:
+            try:
+                registrar_ingreso(obj, ajuste, tipo='A')
+            except StockInsuficiente:
+                self.message_user(request, f'El ajuste de {ajuste} dejaria el stock de {obj.nombre} en negativo.',
+                                  messages.ERROR)
+
+    def get_queryset(self, request):
+        # __str__ muestra el tipo: lo necesitan tambien el autocompletado y los formularios
+        return super().get_queryset(request).select_related('tipo')
+
 
 # Registro de Diagnostico
 @admin.register(Diagnostico)
 class DiagnosticoAdmin(admin.ModelAdmin):
-    list_display = ('codigo', 'descripcion')
+    list_display = ('codigo', 'descripcion', 'activo')
+    list_filter = ('activo',)
     search_fields = ('codigo', 'descripcion')
+    # el catalogo CIE-10 tiene ~70k filas: sin COUNT(*) del total en cada pagina
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        # prefijo de codigo o descripcion por indice (ver core/search.py); tambien lo usa
+        # el autocompletado de Atencion.diagnostico
+        return buscar_diagnosticos(queryset, search_term), False
 
 # Registro de Diagnostico
 @admin.register(MarcaMedicamento)
@@ -96,8 +149,9 @@ class CategoriaExamenAdmin(admin.ModelAdmin):
 
 # Registro de TipoCategoria
 @admin.register(TipoCategoria)
-class TipoCategoriaAdmin(admin.ModelAdmin):
+class TipoCategoriaAdmin(CatalogoAdminMixin, admin.ModelAdmin):
     list_display = ('nombre', 'categoria_examen')
+    list_select_related = ('categoria_examen',)
     search_fields = ('nombre', 'categoria_examen__nombre')
     list_filter = ('categoria_examen',)
 
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'aplication.core'
+
+    def ready(self):
+        # registra los receptores de señales (contadores)
+        from aplication.core import signals  # noqa: F401
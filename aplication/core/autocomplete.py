@@ -0,0 +1,98 @@
+import bisect
+import unicodedata
+
+from aplication.core.models import Medicamento
+from doctor.catalogs import Versionado, version
+
+# Autocompletado de medicamentos con un indice en memoria del proceso.
+# Se indexa cada palabra (sin tildes y en minusculas) de nombre, concentracion, tipo y
+# marca de los medicamentos activos en dos arreglos ordenados (palabras del nombre y
+# del resto de campos); una consulta es un bisect por el prefijo mas largo y un filtro
+# del resto de palabras sobre las del medicamento, sin tocar la base de datos.
+# El indice se reconstruye cuando cambia la version del catalogo en la cache
+# (se incrementa al guardar o borrar un medicamento, tipo o marca: ver signals.py);
+# la version se consulta como mucho una vez cada VERIFICAR_CADA segundos
+# (doctor/catalogs.py).
+
+VERSION = 'autocomplete:medicamentos:version'
+LIMITE = 10
+
+
+def normalizar(texto):
+    texto = texto or ''
+    if texto.isascii():
+        return texto.casefold()
+    texto = unicodedata.normalize('NFKD', texto)
+    return ''.join(c for c in texto if not unicodedata.combining(c)).casefold()
+
+
+class IndiceMedicamentos:
+
+    def __init__(self, filas):
+        # filas: (id, nombre, concentracion, tipo, marca)
+        self.items = {}
+        nombre, otros = [], []
+        for id, nombre_med, concentracion, tipo, marca in filas:
+            palabras_nombre = normalizar(nombre_med).split()
+            palabras_otras = normalizar(' '.join(filter(None, (concentracion, tipo, marca)))).split()
+            self.items[id] = ({
+                'id': id, 'nombre': nombre_med, 'concentracion': concentracion, 'tipo': tipo, 'marca': marca,
+            }, palabras_nombre + palabras_otras)
+            nombre.extend((palabra, id) for palabra in set(palabras_nombre))
+            otros.extend((palabra, id) for palabra in set(palabras_otras))
+        self.arreglos = []
+        for entradas in (nombre, otros):
+            entradas.sort()
+            self.arreglos.append(([palabra for palabra, _ in entradas], [id for _, id in entradas]))
+
+    def __len__(self):
+        return len(self.items)
+
+    def buscar(self, texto, limite=LIMITE):
+        tokens = normalizar(texto).split()
+        if not tokens:
+            return []
+        # el prefijo mas largo recorre el tramo mas corto del arreglo
+        principal = max(tokens, key=len)
+        resto = [token for token in tokens if token is not principal]
+        encontrados, vistos = [], set()
+        # primero los que coinciden por nombre y luego por concentracion/tipo/marca
+        for palabras, ids in self.arreglos:
+            i = bisect.bisect_left(palabras, principal)
+            while i < len(palabras) and palabras[i].startswith(principal):
+                id = ids[i]
+                i += 1
+                if id in vistos:
+                    continue
+                vistos.add(id)
+                datos, palabras_item = self.items[id]
+                if all(any(palabra.startswith(token) for palabra in palabras_item) for token in resto):
+                    encontrados.append(datos)
+                    if len(encontrados) == limite:
+                        return encontrados
+        return encontrados
+
+
+def cargar_indice():
+    filas = (Medicamento.objects.filter(activo=True).order_by()
+             .values_list('id', 'nombre', 'concentracion', 'tipo__nombre', 'marca_medicamento__nombre'))
+    return IndiceMedicamentos(filas.iterator(chunk_size=5000))
+
+
+_indice = Versionado(VERSION, cargar_indice)
+
+
+def version_catalogo():
+    return version(VERSION)
+
+
+def invalidar_catalogo():
+    _indice.invalidar()
+
+
+def obtener_indice():
+    return _indice.obtener()
+
+
+def autocompletar(texto, limite=LIMITE):
+    return obtener_indice().buscar(texto, limite)
@@ -0,0 +1,82 @@
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.http import Http404
+from django.utils import timezone
+
+from aplication.core.models import Paciente
+
+# Cache del JSON del modal de detalle de paciente (PatientDetailView).
+# Se guarda por paciente la parte que no cambia con el dia (la edad se calcula al
+# responder), su hash como ETag y el momento en que se genero como Last-Modified.
+# Se invalida al guardar o borrar el paciente (ver aplication/core/signals.py).
+
+TIMEOUT = 60 * 60 * 24
+CAMPOS = ('id', 'nombres', 'apellidos', 'foto', 'miniaturas', 'fecha_nacimiento', 'cedula', 'telefono', 'direccion')
+
+
+def _clave(pk):
+    return f'paciente:detalle:{pk}'
+
+
+def _construir(paciente):
+    datos = {
+        'id': paciente.id,
+        'nombres': paciente.nombres,
+        'apellidos': paciente.apellidos,
+        'foto': paciente.get_image('modal'),
+        'fecha_nac': paciente.fecha_nacimiento,
+        'dni': paciente.cedula,
+        'telefono': paciente.telefono,
+        'direccion': paciente.direccion,
+    }
+    firma = json.dumps(datos, cls=DjangoJSONEncoder, sort_keys=True).encode()
+    return {
+        'datos': datos,
+        'etag': hashlib.md5(firma, usedforsecurity=False).hexdigest(),
+        'modificado': timezone.now().replace(microsecond=0),
+    }
+
+
+def detalle_paciente(pk):
+    detalle = cache.get(_clave(pk))
+    if detalle is None:
+        paciente = Paciente.objects.filter(pk=pk).only(*CAMPOS).first()
+        if paciente is None:
+            raise Http404('Paciente no encontrado')
+        detalle = _construir(paciente)
+        cache.set(_clave(pk), detalle, TIMEOUT)
+    return detalle
+
+
+def detalles_pacientes(pks):
+    # variante por lotes: una lectura de cache y a lo sumo una consulta para los faltantes
+    claves = {_clave(pk): pk for pk in pks}
+    encontrados = cache.get_many(list(claves))
+    detalles = {claves[clave]: detalle for clave, detalle in encontrados.items()}
+    faltantes = [pk for pk in pks if pk not in detalles]
+    if faltantes:
+        nuevos = {p.pk: _construir(p) for p in Paciente.objects.filter(pk__in=faltantes).only(*CAMPOS)}
+        cache.set_many({_clave(pk): detalle for pk, detalle in nuevos.items()}, TIMEOUT)
+        detalles.update(nuevos)
+    return [detalles[pk] for pk in pks if pk in detalles]
+
+
+def respuesta(detalle):
+    # datos finales del modal: la edad depende de la fecha de hoy y no se cachea
+    datos = dict(detalle['datos'])
+    datos['edad'] = Paciente.calcular_edad(datos['fecha_nac'])
+    return datos
+
+
+def etag(detalle):
+    return f"{detalle['etag']}-{Paciente.calcular_edad(detalle['datos']['fecha_nac'])}"
+
+
+def invalidar_detalle(pk):
+    cache.delete(_clave(pk))
+    # una lectura concurrente pudo volver a cachear la version anterior antes del commit
+    transaction.on_commit(lambda: cache.delete(_clave(pk)))
@@ -0,0 +1,118 @@
+import csv
+import itertools
+import re
+
+from django.db import router, transaction
+
+from aplication.core.models import Diagnostico
+from aplication.core.search import CODIGO_CIE10, normalizar_codigo
+
+# Carga del catalogo CIE-10 (~70k codigos) en Diagnostico. Se lee por bloques: cada
+# bloque se compara con lo guardado (una consulta por bloque) y solo los codigos nuevos
+# o con descripcion distinta se escriben con un upsert (INSERT ... ON CONFLICT (codigo)
+# DO UPDATE). Volver a cargar el mismo archivo no escribe nada. Los codigos se guardan
+# normalizados (E119 -> E11.9), igual que los busca core/search.py.
+
+COLUMNAS_CODIGO = {'codigo', 'código', 'code', 'cod', 'cie10', 'icd10'}
+COLUMNAS_DESCRIPCION = {'descripcion', 'descripción', 'description', 'desc', 'nombre', 'long_description'}
+_espacios = re.compile(r'\s+')
+
+
+def leer_csv(archivo):
+    # CSV con encabezado (codigo, descripcion) o sin el (codigo en la 1ra columna y
+    # descripcion en la 2da). El separador (, ; tab |) se deduce de la primera linea.
+    primera = next(archivo, '')
+    try:
+        dialecto = csv.Sniffer().sniff(primera, delimiters=',;\t|')
+    except csv.Error:
+        dialecto = csv.excel
+    filas = csv.reader(itertools.chain([primera], archivo), dialecto)
+    primera_fila = next(filas, [])
+    encabezado = [columna.strip().lower() for columna in primera_fila]
+    codigo = next((i for i, c in enumerate(encabezado) if c in COLUMNAS_CODIGO), None)
+    descripcion = next((i for i, c in enumerate(encabezado) if c in COLUMNAS_DESCRIPCION), None)
+    inicio = 2
+    if codigo is None or descripcion is None:
+        # sin encabezado: la primera fila tambien es un codigo
+        codigo, descripcion, inicio = 0, 1, 1
+        filas = itertools.chain([primera_fila], filas)
+    for linea, fila in enumerate(filas, start=inicio):
+        if not fila:
+            continue
+        yield (linea, fila[codigo] if len(fila) > codigo else '',
+               fila[descripcion] if len(fila) > descripcion else '')
+
+
+def leer_texto(archivo):
+    # formato 'codigo<espacios>descripcion' por linea (icd10cm_codes_AAAA.txt del CMS)
+    for linea, texto in enumerate(archivo, start=1):
+        partes = texto.strip().split(None, 1)
+        if partes:
+            yield linea, partes[0], partes[1] if len(partes) > 1 else ''
+
+
+def _limpiar(codigo, descripcion, largo):
+    codigo = normalizar_codigo(codigo or '')
+    descripcion = _espacios.sub(' ', descripcion or '').strip()
+    if not CODIGO_CIE10.match(codigo) or len(codigo) > Diagnostico._meta.get_field('codigo').max_length:
+        return None, f'Codigo invalido: {codigo!r}.'
+    if not descripcion:
+        return None, 'Descripcion vacia.'
+    return (codigo, descripcion[:largo]), None
+
+
+def cargar_catalogo(filas, reporte=None, lote=2000, desactivar_faltantes=False, using=None):
+    # filas: iterable de (linea, codigo, descripcion). reporte: csv.writer para los errores.
+    # Devuelve {'leidas', 'creados', 'actualizados', 'sin_cambios', 'rechazadas', 'desactivados'}
+    using = using or router.db_for_write(Diagnostico)
+    largo = Diagnostico._meta.get_field('descripcion').max_length
+    resumen = dict.fromkeys(('leidas', 'creados', 'actualizados', 'sin_cambios', 'rechazadas', 'desactivados'), 0)
+    vistos = set()
+
+    def guardar(bloque):
+        existentes = {
+            codigo: (descripcion, activo) for codigo, descripcion, activo in
+            Diagnostico.objects.using(using).filter(codigo__in=list(bloque))
+            .values_list('codigo', 'descripcion', 'activo')
+        }
+        escribir = []
+        for codigo, descripcion in bloque.items():
+            actual = existentes.get(codigo)
+            if actual == (descripcion, True):
+                resumen['sin_cambios'] += 1
+                continue
+            resumen['actualizados' if actual else 'creados'] += 1
+            escribir.append(Diagnostico(codigo=codigo, descripcion=descripcion, activo=True))
+        if escribir:
+            with transaction.atomic(using=using):
+                Diagnostico.objects.using(using).bulk_create(
+                    escribir, update_conflicts=True, unique_fields=['codigo'], update_fields=['descripcion', 'activo'],
+                )
+
+    bloque = {}
+    for linea, codigo, descripcion in filas:
+        resumen['leidas'] += 1
+        datos, error = _limpiar(codigo, descripcion, largo)
+        if not error and datos[0] in vistos:
+            error = 'Codigo repetido en el archivo.'
+        if error:
+            resumen['rechazadas'] += 1
+            if reporte is not None:
+                reporte.writerow([linea, codigo, error])
+            continue
+        codigo, descripcion = datos
+        vistos.add(codigo)
+        bloque[codigo] = descripcion
+        if len(bloque) == lote:
+            guardar(bloque)
+            bloque = {}
+    if bloque:
+        guardar(bloque)
+
+    if desactivar_faltantes and vistos:
+        activos = Diagnostico.objects.using(using).filter(activo=True).values_list('pk', 'codigo')
+        faltantes = [pk for pk, codigo in activos.iterator(chunk_size=lote) if codigo not in vistos]
+        for i in range(0, len(faltantes), lote):
+            resumen['desactivados'] += (Diagnostico.objects.using(using)
+                                        .filter(pk__in=faltantes[i:i + lote]).update(activo=False))
+    return resumen
@@ -0,0 +1,162 @@
+from django.db import IntegrityError, router, transaction
+from django.db.models import Count, F
+
+from aplication.core.models import Contador, Paciente
+from doctor.const import SEX_CHOICES
+from doctor.utils import conteo_estimado
+
+# Contadores de pacientes mantenidos en la tabla Contador.
+# Claves: 'paciente' (total), 'paciente:sexo:<M|F>' y 'paciente:activo:<0|1>'.
+# Se actualizan con UPDATE ... SET valor = valor + n dentro de la misma transaccion
+# que crea, modifica o borra el paciente (Paciente.save y la señal post_delete).
+# Las cargas masivas (bulk_create) no pasan por save(): deben llamar a ajustar()
+# con los totales del lote o a recalcular_contadores() al terminar.
+# QuerySet.update() tampoco pasa por save(): para cambiar sexo o activo en bloque usar
+# actualizar_pacientes(); despues de un update() directo sobre esos campos (o de SQL
+# manual) hay que correr recalcular_contadores (tambien como comando).
+
+TOTAL = 'paciente'
+
+
+def clave_sexo(sexo):
+    return f'paciente:sexo:{sexo}'
+
+
+def clave_activo(activo):
+    return f'paciente:activo:{int(bool(activo))}'
+
+
+def _claves(sexo, activo):
+    return [TOTAL, clave_sexo(sexo), clave_activo(activo)]
+
+
+def _conteo_real(clave, using):
+    pacientes = Paciente.objects.using(using)
+    if clave.startswith('paciente:sexo:'):
+        pacientes = pacientes.filter(sexo=clave.rsplit(':', 1)[1])
+    elif clave.startswith('paciente:activo:'):
+        pacientes = pacientes.filter(activo=clave.rsplit(':', 1)[1] == '1')
+    return pacientes.count()
+
+
+def _sembrar(clave, using):
+    # primera lectura/escritura de una clave: se inicializa con el COUNT real,
+    # que ya incluye los cambios de la transaccion en curso
+    try:
+        with transaction.atomic(using=using):
+            return Contador.objects.using(using).get_or_create(
+                clave=clave, defaults={'valor': _conteo_real(clave, using)})[0].valor
+    except IntegrityError:
+        return Contador.objects.using(using).get(clave=clave).valor
+
+
+def ajustar(deltas, using=None):
+    using = using or router.db_for_write(Contador)
+    # orden fijo de claves para que transacciones concurrentes no se bloqueen en cruz
+    for clave in sorted(deltas):
+        if not deltas[clave]:
+            continue
+        actualizadas = Contador.objects.using(using).filter(clave=clave).update(valor=F('valor') + deltas[clave])
+        if not actualizadas:
+            _sembrar(clave, using)
+
+
+def registrar_guardado(paciente, creado):
+    deltas = {}
+    actual = _claves(paciente.sexo, paciente.activo)
+    if creado:
+        for clave in actual:
+            deltas[clave] = deltas.get(clave, 0) + 1
+    else:
+        original = getattr(paciente, '_contadores_originales', None)
+        if original is None or original == (paciente.sexo, paciente.activo):
+            return
+        for clave in _claves(*original):
+            deltas[clave] = deltas.get(clave, 0) - 1
+        for clave in actual:
+            deltas[clave] = deltas.get(clave, 0) + 1
+    ajustar(deltas, using=paciente._state.db)
+    paciente._contadores_originales = (paciente.sexo, paciente.activo)
+
+
+def registrar_borrado(paciente, using):
+    ajustar({clave: -1 for clave in _claves(paciente.sexo, paciente.activo)}, using=using)
+
+
+def deltas_de_lote(pacientes):
+    # totales de un lote de instancias recien insertadas con bulk_create
+    return deltas_de_valores((paciente.sexo, paciente.activo) for paciente in pacientes)
+
+
+def deltas_de_valores(valores):
+    # igual que deltas_de_lote con pares (sexo, activo) de filas insertadas sin instancias
+    deltas = {}
+    for sexo, activo in valores:
+        for clave in _claves(sexo, activo):
+            deltas[clave] = deltas.get(clave, 0) + 1
+    return deltas
+
+
+def actualizar_pacientes(queryset, **valores):
+    # queryset.update(**valores) moviendo los contadores de las filas afectadas.
+    # Bloquea las filas y cuenta sus grupos (sexo, activo) antes del UPDATE, en la
+    # misma transaccion. Con expresiones (F(), Case...) en sexo o activo no se puede
+    # saber el valor nuevo y se recalcula todo al final.
+    using = queryset._db or router.db_for_write(Paciente)
+    queryset = queryset.using(using)
+    campos = {'sexo', 'activo'} & set(valores)
+    if not campos:
+        return queryset.update(**valores)
+    with transaction.atomic(using=using):
+        if any(hasattr(valores[campo], 'resolve_expression') for campo in campos):
+            actualizadas = queryset.update(**valores)
+            recalcular_contadores(using)
+            return actualizadas
+        grupos = {}
+        for grupo in queryset.order_by().select_for_update().values_list('sexo', 'activo').iterator():
+            grupos[grupo] = grupos.get(grupo, 0) + 1
+        actualizadas = queryset.update(**valores)
+        deltas = {}
+        for (sexo, activo), cantidad in grupos.items():
+            for clave in _claves(sexo, activo):
+                deltas[clave] = deltas.get(clave, 0) - cantidad
+            for clave in _claves(valores.get('sexo', sexo), valores.get('activo', activo)):
+                deltas[clave] = deltas.get(clave, 0) + cantidad
+        ajustar(deltas, using=using)
+    return actualizadas
+
+
+def obtener(clave, using=None):
+    using = using or router.db_for_read(Contador)
+    valor = Contador.objects.using(using).filter(clave=clave).values_list('valor', flat=True).first()
+    return _sembrar(clave, router.db_for_write(Contador)) if valor is None else valor
+
+
+def contar_pacientes(sexo=None, activo=None, queryset=None):
+    # O(1) para el total y para los filtros simples; el resto usa conteo_estimado
+    if sexo is None and activo is None:
+        return obtener(TOTAL)
+    if activo is None:
+        return obtener(clave_sexo(sexo))
+    if sexo is None:
+        return obtener(clave_activo(activo))
+    if queryset is None:
+        queryset = Paciente.objects.filter(sexo=sexo, activo=activo)
+    return conteo_estimado(queryset)
+
+
+def recalcular_contadores(using=None):
+    # reconstruye todas las claves con un unico GROUP BY; usar tras cargas masivas
+    using = using or router.db_for_write(Contador)
+    valores = {TOTAL: 0}
+    valores.update({clave_sexo(sexo): 0 for sexo, _ in SEX_CHOICES})
+    valores.update({clave_activo(activo): 0 for activo in (True, False)})
+    filas = Paciente.objects.using(using).order_by().values('sexo', 'activo').annotate(total=Count('id'))
+    for fila in filas:
+        valores[TOTAL] += fila['total']
+        valores[clave_sexo(fila['sexo'])] = valores.get(clave_sexo(fila['sexo']), 0) + fila['total']
+        valores[clave_activo(fila['activo'])] += fila['total']
+    with transaction.atomic(using=using):
+        for clave, valor in valores.items():
+            Contador.objects.using(using).update_or_create(clave=clave, defaults={'valor': valor})
+    return valores
@@ -2,6 +2,8 @@ from django.forms import ModelForm, ValidationError
 from django import forms
 
 from aplication.core.models import Paciente
+from aplication.core.thumbnails import generar_miniaturas_seguro
+from doctor.catalogs import CatalogChoiceField
 
 # Definición de la clase PatientForm que hereda de ModelForm
 class PatientForm(ModelForm):
@@ -10,6 +12,8 @@ class PatientForm(ModelForm):
         model = Paciente
         # campos que se muestran en este mismo orden en el formulario como etiquetas html
         fields = ["nombres","apellidos","cedula","fecha_nacimiento","telefono","email","sexo","estado_civil","direccion","latitud","longitud","tipo_sangre","foto","alergias","enfermedades_cronicas","medicacion_actual","cirugias_previas","antecedentes_personales","antecedentes_familiares","activo"]
+        # opciones del select desde el catalogo en memoria (sin consulta al mostrar el formulario)
+        field_classes = {"tipo_sangre": CatalogChoiceField}
      
         # Mensajes de error personalizados para ciertos campos
         error_messages = {
@@ -164,6 +168,17 @@ class PatientForm(ModelForm):
             "cedula": "Dni",
             
         }
+
+    def save(self, commit=True):
+        if 'foto' in self.changed_data:
+            self.instance.miniaturas = False
+        paciente = super().save(commit)
+        # miniaturas de la foto recien subida (lista y modal)
+        if commit and 'foto' in self.changed_data and paciente.foto:
+            if generar_miniaturas_seguro(paciente.foto.name, forzar=True) is not None:
+                paciente.miniaturas = True
+                paciente.save(update_fields=['miniaturas'])
+        return paciente
 # método de limpieza se ejecuta automáticamente cuando Django valida el campo nombres en el formulario al ejecutar el metodo form_valid()
 def clean_nombres(self):
     nombres = self.cleaned_data.get("nombres")
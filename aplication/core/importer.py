@@ -0,0 +1,269 @@
+import csv
+import json
+import re
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.core.validators import EmailValidator
+from django.db import IntegrityError, connections, router, transaction
+
+from aplication.core.counters import ajustar, deltas_de_valores
+from aplication.core.models import Paciente, TipoSangre
+from doctor.utils import CEDULA_VALIDA, MENSAJES_CEDULA, copiar_filas, phone_regex, valida_cedulas_lote
+
+# Importacion masiva de pacientes desde CSV o JSONL (una fila = un objeto JSON).
+# Valida campo por campo con las mismas reglas del modelo y de PatientForm pero sin
+# construir un formulario por fila: las cedulas se validan por bloque con NumPy, el
+# tipo de sangre se resuelve con un diccionario en memoria y los emails repetidos
+# se buscan con una consulta por bloque. Las filas validas se pasan directo a valores
+# de columna, sin instancias del modelo, y cada bloque se inserta (COPY en Postgres,
+# INSERT con executemany en otros motores) en su propia transaccion (un savepoint si ya
+# hay una abierta), junto con sus contadores. Si el bloque choca con una fila insertada
+# por otro proceso despues de la validacion (email repetido) se reintenta fila por fila
+# y las que chocan se reportan como rechazadas; el resto del archivo sigue.
+# Solo se mantiene en memoria el bloque en curso.
+
+OBLIGATORIOS = ('nombres', 'apellidos', 'cedula', 'fecha_nacimiento', 'telefono', 'sexo', 'estado_civil', 'direccion')
+TEXTOS_OPCIONALES = ('alergias', 'enfermedades_cronicas', 'medicacion_actual', 'cirugias_previas',
+                     'antecedentes_personales', 'antecedentes_familiares')
+FORMATOS_FECHA = ('%d/%m/%Y', '%d-%m-%Y')
+VERDADEROS = {'1', 'true', 'si', 'sí', 's', 'x'}
+FALSOS = {'0', 'false', 'no', 'n'}
+
+_email = EmailValidator()
+# phone_regex.regex es perezoso: cada acceso pasa por un proxy
+_telefono = re.compile(phone_regex.regex.pattern)
+
+
+def leer_csv(archivo):
+    for linea, fila in enumerate(csv.DictReader(archivo), start=2):
+        yield linea, fila
+
+
+def leer_jsonl(archivo):
+    for linea, texto in enumerate(archivo, start=1):
+        if not texto.strip():
+            continue
+        try:
+            fila = json.loads(texto)
+        except ValueError as error:
+            fila = {'__error__': f'JSON invalido: {error}'}
+        if not isinstance(fila, dict):
+            fila = {'__error__': 'Cada linea debe ser un objeto JSON.'}
+        yield linea, fila
+
+
+def _texto(valor):
+    return '' if valor is None else str(valor).strip()
+
+
+def _fecha(valor):
+    if isinstance(valor, date):
+        return valor
+    try:
+        return date.fromisoformat(valor)
+    except ValueError:
+        pass
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(valor, formato).date()
+        except ValueError:
+            continue
+    raise ValidationError('Fecha invalida (use AAAA-MM-DD).')
+
+
+def _coordenada(valor, campo):
+    try:
+        numero = Decimal(valor)
+    except InvalidOperation:
+        raise ValidationError(f'{campo}: debe ser un número.')
+    if not numero.is_finite() or abs(numero) > 180:
+        raise ValidationError(f'{campo}: fuera de rango.')
+    return numero.quantize(Decimal('0.000001'))
+
+
+class ValidadorPaciente:
+    # reglas por campo precalculadas a partir del modelo
+
+    def __init__(self, using=None):
+        self.using = using or router.db_for_write(Paciente)
+        self.longitudes = {f.name: f.max_length for f in Paciente._meta.fields if getattr(f, 'max_length', None)}
+        self.sexos = {clave for clave, _ in Paciente._meta.get_field('sexo').choices}
+        self.estados = {clave for clave, _ in Paciente._meta.get_field('estado_civil').choices}
+        self.tipos_sangre = {
+            tipo.upper(): pk for pk, tipo in TipoSangre.objects.using(self.using).values_list('pk', 'tipo')
+        }
+        # columnas del INSERT y valor de cada una cuando la fila no la trae (el mismo
+        # que guardaria Paciente() vacio: activo=True, foto='', el resto NULL)
+        connection = connections[self.using]
+        vacio = Paciente()
+        self.campos = [campo for campo in Paciente._meta.concrete_fields if not campo.primary_key]
+        self.columnas = [campo.column for campo in self.campos]
+        self.defectos = [campo.get_db_prep_save(campo.pre_save(vacio, True), connection) for campo in self.campos]
+        # solo fechas, decimales y booleanos necesitan conversion; los textos van tal cual
+        self.convertir = [
+            None if campo.get_internal_type() in ('CharField', 'TextField', 'EmailField', 'ForeignKey')
+            else (lambda valor, campo=campo: campo.get_db_prep_save(valor, connection))
+            for campo in self.campos
+        ]
+
+    def _largo(self, campo, valor):
+        if len(valor) > self.longitudes[campo]:
+            raise ValidationError(f'Máximo {self.longitudes[campo]} caracteres.')
+        return valor
+
+    def limpiar(self, fila):
+        # devuelve (datos, errores); la cedula se valida despues, por bloque
+        datos, errores = {}, {}
+        if '__error__' in fila:
+            return None, {'fila': fila['__error__']}
+        for campo in OBLIGATORIOS:
+            valor = _texto(fila.get(campo))
+            if not valor:
+                errores[campo] = 'Este campo es obligatorio.'
+                continue
+            try:
+                if campo == 'fecha_nacimiento':
+                    valor = _fecha(valor)
+                elif campo == 'sexo':
+                    valor = valor.upper()
+                    if valor not in self.sexos:
+                        raise ValidationError(f'Valor invalido: {valor}.')
+                elif campo == 'estado_civil':
+                    valor = valor.upper()
+                    if valor not in self.estados:
+                        raise ValidationError(f'Valor invalido: {valor}.')
+                elif campo == 'telefono':
+                    if not _telefono.match(valor):
+                        raise ValidationError(phone_regex.message)
+                elif campo != 'cedula':
+                    self._largo(campo, valor)
+                datos[campo] = valor
+            except ValidationError as error:
+                errores[campo] = error.messages[0]
+
+        email = _texto(fila.get('email'))
+        if email:
+            try:
+                _email(self._largo('email', email))
+                datos['email'] = email.lower()
+            except ValidationError as error:
+                errores['email'] = error.messages[0]
+        for campo in ('latitud', 'longitud'):
+            valor = _texto(fila.get(campo))
+            if valor:
+                try:
+                    datos[campo] = _coordenada(valor, campo)
+                except ValidationError as error:
+                    errores[campo] = error.messages[0]
+        tipo = _texto(fila.get('tipo_sangre')).upper()
+        if tipo:
+            if tipo in self.tipos_sangre:
+                datos['tipo_sangre_id'] = self.tipos_sangre[tipo]
+            else:
+                errores['tipo_sangre'] = f'Tipo de sangre desconocido: {tipo}.'
+        for campo in TEXTOS_OPCIONALES:
+            valor = _texto(fila.get(campo))
+            if valor:
+                try:
+                    datos[campo] = self._largo(campo, valor) if campo in self.longitudes else valor
+                except ValidationError as error:
+                    errores[campo] = error.messages[0]
+        activo = _texto(fila.get('activo')).lower()
+        if activo:
+            if activo in VERDADEROS or activo in FALSOS:
+                datos['activo'] = activo in VERDADEROS
+            else:
+                errores['activo'] = 'Valor invalido (use 1/0).'
+        return datos, errores
+
+    def fila(self, datos):
+        # valores en el orden de self.columnas
+        return tuple(
+            defecto if campo.attname not in datos
+            else datos[campo.attname] if convertir is None else convertir(datos[campo.attname])
+            for campo, defecto, convertir in zip(self.campos, self.defectos, self.convertir)
+        )
+
+    def validar_bloque(self, bloque):
+        # bloque: [(linea, datos)] ya limpios por fila. Devuelve ([(linea, datos)], errores)
+        errores = []
+        codigos = valida_cedulas_lote([datos['cedula'] for _, datos in bloque])
+        emails = {datos['email'] for _, datos in bloque if 'email' in datos}
+        existentes = set(
+            Paciente.objects.using(self.using).filter(email__in=emails).values_list('email', flat=True)
+        ) if emails else set()
+        vistos = set()
+        pacientes = []
+        for (linea, datos), codigo in zip(bloque, codigos):
+            if codigo != CEDULA_VALIDA:
+                errores.append((linea, 'cedula', MENSAJES_CEDULA[codigo]))
+                continue
+            email = datos.get('email')
+            if email and (email in existentes or email in vistos):
+                errores.append((linea, 'email', 'Ya existe un paciente con este email.'))
+                continue
+            if email:
+                vistos.add(email)
+            pacientes.append((linea, datos))
+        return pacientes, errores
+
+
+def importar(filas, reporte=None, lote=2000, using=None):
+    # filas: iterable de (linea, dict). reporte: csv.writer para los errores.
+    # Devuelve {'leidas', 'importadas', 'rechazadas'}
+    validador = ValidadorPaciente(using)
+    resumen = {'leidas': 0, 'importadas': 0, 'rechazadas': 0}
+
+    def rechazar(linea, campo, mensaje):
+        if reporte is not None:
+            reporte.writerow([linea, campo, mensaje])
+
+    def insertar(pacientes):
+        with transaction.atomic(using=validador.using):
+            copiar_filas(Paciente, validador.columnas, map(validador.fila, pacientes), validador.using, lote=lote)
+            ajustar(deltas_de_valores((datos['sexo'], datos.get('activo', True)) for datos in pacientes),
+                    using=validador.using)
+
+    def guardar(bloque):
+        pacientes, errores = validador.validar_bloque(bloque)
+        for error in errores:
+            rechazar(*error)
+        resumen['rechazadas'] += len(errores)
+        if not pacientes:
+            return
+        try:
+            insertar([datos for _, datos in pacientes])
+            resumen['importadas'] += len(pacientes)
+            return
+        except IntegrityError:
+            pass
+        # otro proceso inserto entre la validacion y el COPY: fila por fila
+        for linea, datos in pacientes:
+            try:
+                insertar([datos])
+                resumen['importadas'] += 1
+            except IntegrityError as error:
+                resumen['rechazadas'] += 1
+                if datos.get('email'):
+                    rechazar(linea, 'email', 'Ya existe un paciente con este email.')
+                else:
+                    rechazar(linea, 'fila', f'No se pudo insertar: {error}')
+
+    bloque = []
+    for linea, fila in filas:
+        resumen['leidas'] += 1
+        datos, errores = validador.limpiar(fila)
+        if errores:
+            resumen['rechazadas'] += 1
+            for campo, mensaje in errores.items():
+                rechazar(linea, campo, mensaje)
+            continue
+        bloque.append((linea, datos))
+        if len(bloque) == lote:
+            guardar(bloque)
+            bloque = []
+    if bloque:
+        guardar(bloque)
+    return resumen
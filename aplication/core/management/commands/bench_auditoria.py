@@ -0,0 +1,47 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from aplication.core.models import AuditUser
+from doctor.audit import AuditBuffer
+from doctor.benchmark import base_de_pruebas
+
+# Compara la insercion fila por fila de AuditUser (save_audit anterior) con el
+# buffer por lotes de doctor/audit.py. Uso: python manage.py bench_auditoria --filas 20000
+
+
+class Command(BaseCommand):
+    help = 'Throughput de la auditoria: save() por fila contra AuditBuffer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=20000)
+        parser.add_argument('--lote', type=int, default=500)
+
+    def _entrada(self, usuario, i):
+        return AuditUser(usuario=usuario, tabla='Paciente', registroid=i, accion='M',
+                         fecha_hora=timezone.now(), estacion='127.0.0.1')
+
+    def handle(self, *args, **options):
+        filas = options['filas']
+        with base_de_pruebas():
+            usuario = User.objects.create(username='bench')
+
+            inicio = time.perf_counter()
+            for i in range(filas):
+                self._entrada(usuario, i).save()
+            por_fila = time.perf_counter() - inicio
+
+            buffer = AuditBuffer(max_size=filas + 1, batch_size=options['lote'], flush_interval=0.5)
+            inicio = time.perf_counter()
+            for i in range(filas):
+                buffer.put(self._entrada(usuario, i))
+            encolado = time.perf_counter() - inicio
+            buffer.stop()
+            total = time.perf_counter() - inicio
+
+            assert AuditUser.objects.count() == filas * 2
+            self.stdout.write(f'save() por fila      {filas / por_fila:>10.0f} filas/s  ({por_fila * 1e6 / filas:.1f} us por peticion)')
+            self.stdout.write(f'buffer (encolar)     {filas / encolado:>10.0f} filas/s  ({encolado * 1e6 / filas:.1f} us por peticion)')
+            self.stdout.write(f'buffer (hasta disco) {filas / total:>10.0f} filas/s')
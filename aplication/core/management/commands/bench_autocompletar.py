@@ -0,0 +1,49 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from aplication.core.autocomplete import IndiceMedicamentos
+from doctor.benchmark import medir
+
+# Mide la construccion y la latencia de consulta del indice de autocompletado de
+# medicamentos con un catalogo sintetico (no usa la base de datos).
+# Uso: python manage.py bench_autocompletar --items 50000
+
+RAICES = ['paraceta', 'ibupro', 'amoxici', 'losar', 'metfor', 'omepra', 'salbuta', 'atorvas', 'cefalex',
+          'diclofe', 'enalap', 'furose', 'azitro', 'lorata', 'ranitid', 'clonaz', 'sertral', 'fluoxe']
+SUFIJOS = ['mol', 'feno', 'lina', 'tán', 'mina', 'zol', 'tina', 'cilina', 'xino', 'nato', 'pril', 'mida']
+TIPOS = ['Analgésico', 'Antibiótico', 'Antihipertensivo', 'Antidiabético', 'Antiinflamatorio', 'Antihistamínico']
+MARCAS = ['Bayer', 'Pfizer', 'Genfar', 'MK', 'La Santé', 'Roemmers', 'Sanofi', 'Novartis', 'Life', 'Acromax']
+CONSULTAS = ['p', 'para', 'paracetamol', 'ibu 400', 'amoxicilina genf', 'ANTIBIÓTICO', 'losartan 50 mg', 'zzz']
+
+
+def catalogo(items, semilla=1):
+    rnd = random.Random(semilla)
+    for id in range(1, items + 1):
+        yield (
+            id,
+            f'{rnd.choice(RAICES)}{rnd.choice(SUFIJOS)} {id}',
+            f'{rnd.choice([5, 10, 50, 100, 250, 400, 500])} mg',
+            rnd.choice(TIPOS),
+            rnd.choice(MARCAS),
+        )
+
+
+class Command(BaseCommand):
+    help = 'Benchmark del indice de autocompletado de medicamentos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', nargs='+', type=int, default=[50000])
+        parser.add_argument('--repeticiones', type=int, default=200)
+
+    def handle(self, *args, **options):
+        for items in options['items']:
+            inicio = time.perf_counter()
+            indice = IndiceMedicamentos(catalogo(items))
+            construccion = (time.perf_counter() - inicio) * 1000
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{items} medicamentos (indice en {construccion:.0f} ms)'))
+            for consulta in CONSULTAS:
+                r = medir(lambda consulta=consulta: indice.buscar(consulta), options['repeticiones'])
+                self.stdout.write(f"  {consulta!r:<22} mediana {r['mediana_ms']:>7.3f} ms   p95 {r['p95_ms']:>7.3f} ms   "
+                                  f"{len(indice.buscar(consulta))} resultados")
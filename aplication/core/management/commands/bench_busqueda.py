@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from aplication.core.models import Paciente
+from aplication.core.search import buscar_pacientes
+from doctor.benchmark import base_de_pruebas, medir, sembrar_pacientes
+
+# Mide la latencia de la busqueda de pacientes (primera pagina de resultados)
+# a distintos volumenes. Uso: python manage.py bench_busqueda --filas 10000 100000 1000000
+
+CONSULTAS = {
+    'apellido': 'zambrano',
+    'nombre y apellido': 'maria cede',
+    'prefijo': 'vill',
+    'cedula exacta': None,
+    'prefijo cedula': '1304',
+    'icontains (anterior)': 'zambrano',
+}
+
+
+class Command(BaseCommand):
+    help = 'Benchmark de la busqueda de pacientes a 10k, 100k y 1M filas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', nargs='+', type=int, default=[10000, 100000, 1000000])
+        parser.add_argument('--repeticiones', type=int, default=20)
+        parser.add_argument('--pagina', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with base_de_pruebas():
+            for filas in sorted(options['filas']):
+                sembrar_pacientes(filas)
+                cedula = Paciente.objects.values_list('cedula', flat=True).order_by('id').first()
+                self.stdout.write(self.style.MIGRATE_HEADING(f'{filas} pacientes'))
+                for nombre, texto in CONSULTAS.items():
+                    texto = texto or cedula
+                    if nombre.startswith('icontains'):
+                        def consulta(texto=texto):
+                            filtro = Q(nombres__icontains=texto) | Q(apellidos__icontains=texto) | Q(cedula__icontains=texto)
+                            return list(Paciente.objects.filter(filtro).order_by('apellidos')[:options['pagina']])
+                    else:
+                        def consulta(texto=texto):
+                            return list(buscar_pacientes(Paciente.objects.all(), texto)[:options['pagina']])
+                    r = medir(consulta, options['repeticiones'])
+                    self.stdout.write(f"  {nombre:<22} mediana {r['mediana_ms']:>9.3f} ms   p95 {r['p95_ms']:>9.3f} ms")
@@ -0,0 +1,140 @@
+import json
+import platform
+import random
+import subprocess
+import time
+from datetime import date, timedelta
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from aplication.core.models import Paciente
+from doctor.benchmark import base_de_pruebas, medir, sembrar_clinica
+from doctor.middleware import RegistroConsultas
+
+# Benchmark de las vistas mas usadas de la clinica con datos sinteticos a distintos
+# volumenes (pacientes con citas, atenciones, medicamentos y examenes proporcionales,
+# ver doctor/benchmark.py). Cada escenario es una peticion completa (middleware, vista,
+# plantilla o JSON) con el cliente de pruebas de Django; se guarda la latencia y las
+# consultas SQL de cada uno en un JSON para comparar entre commits.
+# Corre sobre la base de pruebas del motor configurado (DB_ENGINE): SQLite o Postgres.
+# Uso: python manage.py bench_clinica --filas 10000 100000 1000000 --salida bench/actual.json
+#      python manage.py bench_clinica --filas 10000 --comparar bench/anterior.json
+#      python manage.py bench_clinica --keepdb ...   (reutiliza la base ya sembrada)
+
+REGRESION = 1.2  # mediana 20% mas lenta que la referencia...
+REGRESION_MS = 1.0  # ...y al menos 1 ms (por debajo es ruido)
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def escenarios(rnd):
+    # {nombre: funcion que hace la peticion}; los id y cedulas se eligen al azar en cada llamada
+    cliente = Client()
+    ids = list(Paciente.objects.order_by('?').values_list('id', 'cedula')[:200])
+    fijo = ids[0][0]
+    hoy = date.today()
+
+    def get(url, datos=None, sin_cache=False):
+        def peticion():
+            if sin_cache:
+                cache.clear()
+            respuesta = cliente.get(url() if callable(url) else url, datos)
+            if respuesta.streaming:
+                b''.join(respuesta.streaming_content)
+            assert respuesta.status_code == 200, (url, respuesta.status_code)
+        return peticion
+
+    return {
+        'inicio (dashboard)': get(reverse('core:home')),
+        'listado primera pagina': get(reverse('core:patient_list')),
+        'listado por sexo': get(reverse('core:patient_list'), {'sex': 'F', 'size': 50}),
+        'busqueda apellido': get(reverse('core:patient_list'), {'q': 'zambrano'}),
+        'busqueda nombre y apellido': get(reverse('core:patient_list'), {'q': 'maria cede'}),
+        'busqueda cedula': get(lambda: f"{reverse('core:patient_list')}?q={rnd.choice(ids)[1]}"),
+        'detalle json (cache)': get(reverse('core:patient_detail', args=[fijo])),
+        'detalle json (sin cache)': get(lambda: reverse('core:patient_detail', args=[rnd.choice(ids)[0]]), sin_cache=True),
+        'historial paciente': get(lambda: reverse('attention:patient_timeline', args=[rnd.choice(ids)[0]])),
+        'disponibilidad 7 dias': get(reverse('attention:availability'),
+                                     {'desde': hoy.isoformat(), 'hasta': (hoy + timedelta(days=6)).isoformat()}, sin_cache=True),
+        'proximos turnos': get(reverse('attention:availability'), {'proximos': 10}, sin_cache=True),
+        'agenda dia': get(reverse('attention:agenda'), {'fecha': hoy.isoformat()}, sin_cache=True),
+        'agenda semana': get(reverse('attention:agenda'), {'fecha': hoy.isoformat(), 'vista': 'semana'}, sin_cache=True),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Benchmark de las vistas principales a 10k, 100k y 1M pacientes (resultado en JSON)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', nargs='+', type=int, default=[10000, 100000, 1000000])
+        parser.add_argument('--repeticiones', type=int, default=20)
+        parser.add_argument('--salida', default='bench_clinica.json', help='archivo JSON con los resultados')
+        parser.add_argument('--comparar', help='JSON de una corrida anterior para marcar regresiones')
+        parser.add_argument('--keepdb', action='store_true', help='no destruye la base de pruebas al terminar')
+        parser.add_argument('--semilla', type=int, default=1)
+
+    def handle(self, *args, **options):
+        referencia = None
+        if options['comparar']:
+            try:
+                with open(options['comparar'], encoding='utf-8') as archivo:
+                    referencia = json.load(archivo)
+            except (OSError, ValueError) as error:
+                raise CommandError(f'No se pudo leer {options["comparar"]}: {error}')
+        resultado = {
+            'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'commit': _commit(),
+            'motor': connection.vendor,
+            'django': django.get_version(),
+            'python': platform.python_version(),
+            'repeticiones': options['repeticiones'],
+            'siembra_s': {},
+            'resultados': {},
+        }
+        # sin DEBUG (no se acumula connection.queries) ni el log por peticion
+        with override_settings(DEBUG=False, ALLOWED_HOSTS=['testserver'], QUERY_BUDGET={'ENABLED': False}), \
+                base_de_pruebas(keepdb=options['keepdb']):
+            for filas in sorted(options['filas']):
+                inicio = time.perf_counter()
+                sembrar_clinica(filas, semilla=options['semilla'])
+                resultado['siembra_s'][str(filas)] = round(time.perf_counter() - inicio, 1)
+                self.stdout.write(self.style.MIGRATE_HEADING(
+                    f'{filas} pacientes (siembra {resultado["siembra_s"][str(filas)]} s)'))
+                resultado['resultados'][str(filas)] = self.correr(filas, options, referencia)
+        with open(options['salida'], 'w', encoding='utf-8') as archivo:
+            json.dump(resultado, archivo, indent=2, ensure_ascii=False)
+        self.stdout.write(self.style.SUCCESS(f'Resultados en {options["salida"]}'))
+
+    def correr(self, filas, options, referencia):
+        rnd = random.Random(options['semilla'])
+        anteriores = (referencia or {}).get('resultados', {}).get(str(filas), {})
+        resultados = {}
+        for nombre, peticion in escenarios(rnd).items():
+            registro = RegistroConsultas()
+            with registro.instalar():
+                peticion()
+            r = medir(peticion, options['repeticiones'])
+            r['consultas'] = registro.cantidad
+            resultados[nombre] = r
+            linea = f"  {nombre:<28} mediana {r['mediana_ms']:>9.3f} ms   p95 {r['p95_ms']:>9.3f} ms   {r['consultas']:>3} consultas"
+            anterior = anteriores.get(nombre)
+            if anterior:
+                razon = r['mediana_ms'] / max(anterior['mediana_ms'], 0.001)
+                linea += f'   x{razon:.2f}'
+                lenta = razon > REGRESION and r['mediana_ms'] - anterior['mediana_ms'] > REGRESION_MS
+                if lenta or r['consultas'] > anterior['consultas']:
+                    linea = self.style.WARNING(linea + '  REGRESION')
+            self.stdout.write(linea)
+        return resultados
@@ -0,0 +1,55 @@
+import csv
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from aplication.core.cie10 import cargar_catalogo, leer_csv, leer_texto
+
+# Carga (o actualiza) el catalogo CIE-10 en Diagnostico. Se puede ejecutar las veces
+# que haga falta: solo escribe los codigos nuevos o cuya descripcion cambio.
+# Uso: python manage.py cargar_cie10 cie10.csv [--lote 2000] [--desactivar-faltantes]
+#      python manage.py cargar_cie10 icd10cm_codes_2025.txt --encoding latin-1
+
+
+class Command(BaseCommand):
+    help = 'Carga el catalogo CIE-10 de diagnosticos desde un CSV o un TXT (codigo descripcion)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help="ruta del archivo o '-' para la entrada estandar")
+        parser.add_argument('--formato', choices=('csv', 'texto'), help='por defecto se deduce de la extension (.txt = texto)')
+        parser.add_argument('--encoding', default='utf-8-sig')
+        parser.add_argument('--lote', type=int, default=2000, help='codigos por consulta/transaccion')
+        parser.add_argument('--desactivar-faltantes', action='store_true',
+                            help='marca como inactivos los diagnosticos que no estan en el archivo')
+        parser.add_argument('--errores', help='CSV de filas rechazadas (por defecto <archivo>.errores.csv)')
+
+    def handle(self, *args, **options):
+        archivo = options['archivo']
+        formato = options['formato'] or ('texto' if archivo.endswith('.txt') else 'csv')
+        ruta_errores = options['errores'] or ('cie10.errores.csv' if archivo == '-' else f'{archivo}.errores.csv')
+        if archivo != '-' and not os.path.exists(archivo):
+            raise CommandError(f'No existe el archivo {archivo}')
+
+        entrada = sys.stdin if archivo == '-' else open(archivo, newline='', encoding=options['encoding'])
+        lector = leer_texto if formato == 'texto' else leer_csv
+        inicio = time.perf_counter()
+        try:
+            with open(ruta_errores, 'w', newline='', encoding='utf-8') as salida:
+                reporte = csv.writer(salida)
+                reporte.writerow(['linea', 'codigo', 'mensaje'])
+                resumen = cargar_catalogo(lector(entrada), reporte, lote=options['lote'],
+                                          desactivar_faltantes=options['desactivar_faltantes'])
+        finally:
+            if entrada is not sys.stdin:
+                entrada.close()
+        segundos = time.perf_counter() - inicio
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{resumen['creados']} creados, {resumen['actualizados']} actualizados, "
+            f"{resumen['sin_cambios']} sin cambios, {resumen['desactivados']} desactivados de "
+            f"{resumen['leidas']} en {segundos:.1f} s"
+        ))
+        if resumen['rechazadas']:
+            self.stdout.write(self.style.WARNING(f"{resumen['rechazadas']} rechazados, detalle en {ruta_errores}"))
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from doctor.sintetico import LOTE, generar
+
+# Agrega pacientes sinteticos con cedulas validas y su historia clinica (citas,
+# atenciones, medicamentos, diagnosticos y examenes) para pruebas de carga.
+# Ver doctor/sintetico.py. No usar sobre la base de produccion.
+# Uso: python manage.py generar_datos --pacientes 1000000
+#      python manage.py generar_datos --pacientes 50000 --sin-historias
+
+
+class Command(BaseCommand):
+    help = 'Genera pacientes sinteticos y sus historias clinicas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pacientes', type=int, required=True, help='pacientes a agregar')
+        parser.add_argument('--sin-historias', action='store_true', help='solo pacientes')
+        parser.add_argument('--lote', type=int, default=LOTE, help='pacientes por transaccion')
+        parser.add_argument('--semilla', type=int, default=1)
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        if options['pacientes'] <= 0 or options['lote'] <= 0:
+            raise CommandError('--pacientes y --lote deben ser mayores a cero')
+        inicio = time.perf_counter()
+        try:
+            creados = generar(options['pacientes'], historias=not options['sin_historias'], lote=options['lote'],
+                              semilla=options['semilla'], using=options['database'])
+        except ValueError as error:
+            raise CommandError(str(error))
+        segundos = time.perf_counter() - inicio
+        for tabla, filas in creados.items():
+            self.stdout.write(f'  {tabla:<24} {filas:>12,}')
+        total = sum(creados.values())
+        self.stdout.write(self.style.SUCCESS(f'{total:,} filas en {segundos:.1f} s ({total / segundos:,.0f} filas/s)'))
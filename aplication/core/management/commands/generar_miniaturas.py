@@ -0,0 +1,69 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import django
+from django.core.management.base import BaseCommand
+
+from aplication.core.cache import invalidar_detalle
+from aplication.core.models import Paciente
+from aplication.core.thumbnails import generar_miniaturas_seguro
+
+# Genera las miniaturas de las fotos de pacientes ya existentes en paralelo.
+# Cada proceso recibe solo el nombre del archivo (no toca la base de datos). Los nombres
+# se leen por partes y hay como mucho VENTANA trabajos por proceso en curso. El proceso
+# principal marca Paciente.miniaturas de las fotos que quedaron completas.
+# Uso: python manage.py generar_miniaturas [--procesos 4] [--forzar]
+
+
+VENTANA = 4
+
+
+def _procesar(argumentos):
+    nombre, forzar = argumentos
+    return nombre, generar_miniaturas_seguro(nombre, forzar=forzar)
+
+
+class Command(BaseCommand):
+    help = 'Genera (backfill) las miniaturas de Paciente.foto con un pool de procesos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--forzar', action='store_true', help='regenera aunque la miniatura exista')
+
+    def handle(self, *args, **options):
+        pacientes = Paciente.objects.exclude(foto__isnull=True).exclude(foto='')
+        if not options['forzar']:
+            pacientes = pacientes.filter(miniaturas=False)
+        nombres = pacientes.order_by().values_list('foto', flat=True).distinct().iterator(chunk_size=2000)
+        self.fotos = self.generadas = 0
+        ventana = options['procesos'] * VENTANA
+        # django.setup como inicializador para plataformas que crean los procesos con spawn
+        with ProcessPoolExecutor(max_workers=options['procesos'], initializer=django.setup) as pool:
+            # submit con una ventana acotada (map encolaria todas las fotos de entrada)
+            en_curso = set()
+            for nombre in nombres:
+                en_curso.add(pool.submit(_procesar, (nombre, options['forzar'])))
+                if len(en_curso) >= ventana:
+                    listos, en_curso = wait(en_curso, return_when=FIRST_COMPLETED)
+                    self.informar(listos, options)
+            self.informar(wait(en_curso).done, options)
+        self.stdout.write(self.style.SUCCESS(f'{self.fotos} fotos revisadas, {self.generadas} miniaturas generadas'))
+
+    def informar(self, listos, options):
+        completas = []
+        for trabajo in listos:
+            nombre, escritas = trabajo.result()
+            self.fotos += 1
+            if escritas is None:
+                continue
+            completas.append(nombre)
+            self.generadas += len(escritas)
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{nombre}: {len(escritas)} miniaturas')
+        # update no dispara post_save: el detalle en cache se invalida a mano
+        marcados = Paciente.objects.filter(foto__in=completas, miniaturas=False)
+        pks = list(marcados.values_list('pk', flat=True))
+        if pks:
+            Paciente.objects.filter(pk__in=pks).update(miniaturas=True)
+            for pk in pks:
+                invalidar_detalle(pk)
@@ -0,0 +1,51 @@
+import csv
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from aplication.core.importer import importar, leer_csv, leer_jsonl
+
+# Carga masiva de pacientes. Columnas/llaves con los nombres de los campos de Paciente;
+# tipo_sangre con el texto del tipo (p. ej. O+). Las filas rechazadas se escriben en
+# un CSV (linea, campo, mensaje).
+# Uso: python manage.py importar_pacientes pacientes.csv [--lote 2000] [--errores errores.csv]
+#      python manage.py importar_pacientes pacientes.jsonl
+
+
+class Command(BaseCommand):
+    help = 'Importa pacientes desde un archivo CSV o JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help="ruta del archivo o '-' para la entrada estandar")
+        parser.add_argument('--formato', choices=('csv', 'jsonl'), help='por defecto se deduce de la extension')
+        parser.add_argument('--lote', type=int, default=2000, help='filas por transaccion')
+        parser.add_argument('--errores', help='CSV de filas rechazadas (por defecto <archivo>.errores.csv)')
+
+    def handle(self, *args, **options):
+        archivo = options['archivo']
+        formato = options['formato'] or ('jsonl' if archivo.endswith(('.jsonl', '.json')) else 'csv')
+        ruta_errores = options['errores'] or ('importacion.errores.csv' if archivo == '-' else f'{archivo}.errores.csv')
+        if archivo != '-' and not os.path.exists(archivo):
+            raise CommandError(f'No existe el archivo {archivo}')
+
+        entrada = sys.stdin if archivo == '-' else open(archivo, newline='', encoding='utf-8-sig')
+        lector = leer_jsonl if formato == 'jsonl' else leer_csv
+        inicio = time.perf_counter()
+        try:
+            with open(ruta_errores, 'w', newline='', encoding='utf-8') as salida:
+                reporte = csv.writer(salida)
+                reporte.writerow(['linea', 'campo', 'mensaje'])
+                resumen = importar(lector(entrada), reporte, lote=options['lote'])
+        finally:
+            if entrada is not sys.stdin:
+                entrada.close()
+        segundos = time.perf_counter() - inicio
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{resumen['importadas']} importados, {resumen['rechazadas']} rechazados de {resumen['leidas']} "
+            f"en {segundos:.1f} s ({resumen['leidas'] / max(segundos, 1e-9):.0f} filas/s)"
+        ))
+        if resumen['rechazadas']:
+            self.stdout.write(self.style.WARNING(f'Detalle de errores en {ruta_errores}'))
@@ -0,0 +1,38 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from aplication.core.partitions import crear_particiones, desvincular_particiones, es_particionada, particiones
+
+# Uso tipico (cron mensual):
+#   python manage.py particiones_auditoria --crear 3
+#   python manage.py particiones_auditoria --desvincular-antes 2024-01 [--borrar]
+
+
+class Command(BaseCommand):
+    help = 'Crea, lista y desvincula las particiones mensuales de AuditUser (Postgres)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--crear', type=int, metavar='MESES', help='crea el mes actual y los MESES siguientes')
+        parser.add_argument('--desvincular-antes', metavar='AAAA-MM', help='desvincula las particiones anteriores a ese mes')
+        parser.add_argument('--borrar', action='store_true', help='borra las particiones desvinculadas')
+
+    def handle(self, *args, **options):
+        if not es_particionada():
+            self.stdout.write(self.style.WARNING('AuditUser no esta particionada en este motor (tabla unica).'))
+        if options['crear'] is not None:
+            for nombre in crear_particiones(options['crear']):
+                self.stdout.write(f'creada {nombre}')
+        if options['desvincular_antes']:
+            try:
+                antes_de = datetime.datetime.strptime(options['desvincular_antes'], '%Y-%m').date()
+            except ValueError:
+                raise CommandError('El mes debe tener el formato AAAA-MM.')
+            resultado = desvincular_particiones(antes_de, borrar=options['borrar'])
+            if isinstance(resultado, int):
+                self.stdout.write(f'{resultado} filas borradas')
+            for nombre in resultado if isinstance(resultado, list) else []:
+                self.stdout.write(f"{'borrada' if options['borrar'] else 'desvinculada'} {nombre}")
+        if es_particionada():
+            for nombre, mes in particiones():
+                self.stdout.write(f'{nombre}  {mes:%Y-%m}')
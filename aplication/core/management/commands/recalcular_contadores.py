@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from aplication.core.counters import recalcular_contadores
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye la tabla Contador a partir de Paciente (usar tras cargas masivas)'
+
+    def handle(self, *args, **options):
+        for clave, valor in sorted(recalcular_contadores().items()):
+            self.stdout.write(f'{clave:<22} {valor}')
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from aplication.core.models import Doctor, Empleado, Paciente
+from doctor.utils import CEDULA_VALIDA, MENSAJES_CEDULA, valida_cedulas_lote
+
+# Revisa las cedulas guardadas de pacientes, doctores y empleados con el validador
+# por lotes y lista las invalidas. Lee por bloques, sin cargar las tablas en memoria.
+# Uso: python manage.py verificar_cedulas [--lote 10000] [--resumen]
+
+MODELOS = (Paciente, Doctor, Empleado)
+
+
+class Command(BaseCommand):
+    help = 'Lista las cedulas invalidas de Paciente, Doctor y Empleado'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=10000)
+        parser.add_argument('--resumen', action='store_true', help='solo muestra los totales por modelo')
+
+    def _revisar(self, modelo, filas, resumen):
+        ids, cedulas = zip(*filas)
+        codigos = valida_cedulas_lote(cedulas)
+        invalidas = 0
+        for posicion in (codigos != CEDULA_VALIDA).nonzero()[0]:
+            invalidas += 1
+            if not resumen:
+                self.stdout.write(f'{modelo.__name__}\t{ids[posicion]}\t{cedulas[posicion]}\t{MENSAJES_CEDULA[codigos[posicion]]}')
+        return invalidas
+
+    def handle(self, *args, **options):
+        lote = options['lote']
+        for modelo in MODELOS:
+            # _base_manager: incluye los pacientes inactivos
+            filas = modelo._base_manager.order_by('pk').values_list('pk', 'cedula').iterator(chunk_size=lote)
+            revisadas = invalidas = 0
+            bloque = []
+            for fila in filas:
+                bloque.append(fila)
+                if len(bloque) == lote:
+                    invalidas += self._revisar(modelo, bloque, options['resumen'])
+                    revisadas += len(bloque)
+                    bloque = []
+            if bloque:
+                invalidas += self._revisar(modelo, bloque, options['resumen'])
+                revisadas += len(bloque)
+            estilo = self.style.WARNING if invalidas else self.style.SUCCESS
+            self.stdout.write(estilo(f'{modelo.__name__}: {revisadas} revisadas, {invalidas} invalidas'))
@@ -0,0 +1,68 @@
+# Generated by Django 5.1.2 on 2026-10-18 14:14
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+# Indices de busqueda de pacientes dependientes del motor (ver aplication/core/search.py).
+# Postgres: GIN trigram sobre UPPER(col::text), la misma expresion que genera icontains.
+# SQLite: tabla FTS5 de contenido externo sincronizada por triggers.
+PG_INDICES = [
+    'CREATE INDEX IF NOT EXISTS idx_paciente_apellidos_trgm ON core_paciente USING gin (UPPER(apellidos::text) gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS idx_paciente_nombres_trgm ON core_paciente USING gin (UPPER(nombres::text) gin_trgm_ops)',
+]
+PG_BORRAR = [
+    'DROP INDEX IF EXISTS idx_paciente_apellidos_trgm',
+    'DROP INDEX IF EXISTS idx_paciente_nombres_trgm',
+]
+SQLITE_FTS = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS core_paciente_fts USING fts5(
+        apellidos, nombres, content='core_paciente', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2')""",
+    """CREATE TRIGGER IF NOT EXISTS core_paciente_fts_ai AFTER INSERT ON core_paciente BEGIN
+        INSERT INTO core_paciente_fts(rowid, apellidos, nombres) VALUES (new.id, new.apellidos, new.nombres);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS core_paciente_fts_ad AFTER DELETE ON core_paciente BEGIN
+        INSERT INTO core_paciente_fts(core_paciente_fts, rowid, apellidos, nombres) VALUES ('delete', old.id, old.apellidos, old.nombres);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS core_paciente_fts_au AFTER UPDATE OF apellidos, nombres ON core_paciente BEGIN
+        INSERT INTO core_paciente_fts(core_paciente_fts, rowid, apellidos, nombres) VALUES ('delete', old.id, old.apellidos, old.nombres);
+        INSERT INTO core_paciente_fts(rowid, apellidos, nombres) VALUES (new.id, new.apellidos, new.nombres);
+    END""",
+    "INSERT INTO core_paciente_fts(core_paciente_fts) VALUES ('rebuild')",
+]
+SQLITE_BORRAR = [
+    'DROP TRIGGER IF EXISTS core_paciente_fts_ai',
+    'DROP TRIGGER IF EXISTS core_paciente_fts_ad',
+    'DROP TRIGGER IF EXISTS core_paciente_fts_au',
+    'DROP TABLE IF EXISTS core_paciente_fts',
+]
+
+
+def _ejecutar(schema_editor, por_motor):
+    for sql in por_motor.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def crear_indices_busqueda(apps, schema_editor):
+    _ejecutar(schema_editor, {'postgresql': PG_INDICES, 'sqlite': SQLITE_FTS})
+
+
+def borrar_indices_busqueda(apps, schema_editor):
+    _ejecutar(schema_editor, {'postgresql': PG_BORRAR, 'sqlite': SQLITE_BORRAR})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_alter_paciente_cedula'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='paciente',
+            index=models.Index(fields=['cedula'], name='idx_paciente_cedula'),
+        ),
+        # solo actua en Postgres; en otros motores no hace nada
+        TrigramExtension(),
+        migrations.RunPython(crear_indices_busqueda, borrar_indices_busqueda),
+    ]
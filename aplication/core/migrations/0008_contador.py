@@ -0,0 +1,41 @@
+# Generated by Django 5.1.2 on 2026-10-18 14:27
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def sembrar_contadores(apps, schema_editor):
+    # totales iniciales de pacientes (ver aplication/core/counters.py)
+    Paciente = apps.get_model('core', 'Paciente')
+    Contador = apps.get_model('core', 'Contador')
+    db = schema_editor.connection.alias
+    valores = {'paciente': 0, 'paciente:sexo:M': 0, 'paciente:sexo:F': 0, 'paciente:activo:0': 0, 'paciente:activo:1': 0}
+    for fila in Paciente.objects.using(db).order_by().values('sexo', 'activo').annotate(total=Count('id')):
+        valores['paciente'] += fila['total']
+        clave_sexo = f"paciente:sexo:{fila['sexo']}"
+        valores[clave_sexo] = valores.get(clave_sexo, 0) + fila['total']
+        valores[f"paciente:activo:{int(fila['activo'])}"] += fila['total']
+    Contador.objects.using(db).bulk_create([Contador(clave=clave, valor=valor) for clave, valor in valores.items()])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_paciente_busqueda'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Contador',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=100, unique=True, verbose_name='Clave')),
+                ('valor', models.BigIntegerField(default=0, verbose_name='Valor')),
+            ],
+            options={
+                'verbose_name': 'Contador',
+                'verbose_name_plural': 'Contadores',
+            },
+        ),
+        migrations.RunPython(sembrar_contadores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,126 @@
+# Generated by Django 5.1.2 on 2026-10-18 15:02
+
+import datetime
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def combinar_fecha_hora(apps, schema_editor):
+    # fecha + hora (guardadas en UTC por save_audit) -> fecha_hora
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute("UPDATE core_audituser SET fecha_hora = (fecha + hora) AT TIME ZONE 'UTC'")
+        return
+    AuditUser = apps.get_model('core', 'AuditUser')
+    db = schema_editor.connection.alias
+    lote = []
+    for audit in AuditUser.objects.using(db).only('id', 'fecha', 'hora').iterator(chunk_size=2000):
+        audit.fecha_hora = datetime.datetime.combine(audit.fecha, audit.hora, tzinfo=datetime.timezone.utc)
+        lote.append(audit)
+        if len(lote) == 2000:
+            AuditUser.objects.using(db).bulk_update(lote, ['fecha_hora'])
+            lote = []
+    AuditUser.objects.using(db).bulk_update(lote, ['fecha_hora'])
+
+
+def _meses(desde, hasta):
+    anio, mes = desde.year, desde.month
+    while (anio, mes) <= (hasta.year, hasta.month):
+        yield anio, mes
+        anio, mes = (anio + 1, 1) if mes == 12 else (anio, mes + 1)
+
+
+def particionar(apps, schema_editor):
+    # Solo Postgres: se reemplaza la tabla por una particionada por mes (RANGE sobre
+    # fecha_hora). La PK pasa a (id, fecha_hora) porque debe incluir la clave de particion;
+    # el id sigue saliendo de una secuencia propia. En SQLite la tabla queda como esta.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    execute = schema_editor.execute
+    execute('ALTER TABLE core_audituser RENAME TO core_audituser_sin_particion')
+    execute('CREATE SEQUENCE core_audituser_particion_id_seq')
+    execute("""
+        CREATE TABLE core_audituser (
+            id bigint NOT NULL DEFAULT nextval('core_audituser_particion_id_seq'),
+            tabla varchar(100) NOT NULL,
+            registroid integer NOT NULL,
+            accion varchar(10) NOT NULL,
+            estacion varchar(100) NOT NULL,
+            fecha_hora timestamp with time zone NOT NULL,
+            usuario_id integer NOT NULL
+                CONSTRAINT core_audituser_usuario_id_fk_auth_user REFERENCES auth_user (id) DEFERRABLE INITIALLY DEFERRED,
+            CONSTRAINT core_audituser_particion_pkey PRIMARY KEY (id, fecha_hora)
+        ) PARTITION BY RANGE (fecha_hora)
+    """)
+    execute('ALTER SEQUENCE core_audituser_particion_id_seq OWNED BY core_audituser.id')
+    execute('CREATE TABLE core_audituser_default PARTITION OF core_audituser DEFAULT')
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT MIN(fecha_hora) FROM core_audituser_sin_particion')
+        minimo = cursor.fetchone()[0]
+    hoy = datetime.date.today()
+    desde = minimo.date() if minimo else hoy
+    hasta = hoy + datetime.timedelta(days=93)
+    for anio, mes in _meses(desde, hasta):
+        siguiente = datetime.date(anio + 1, 1, 1) if mes == 12 else datetime.date(anio, mes + 1, 1)
+        execute(
+            f"CREATE TABLE core_audituser_p{anio}_{mes:02d} PARTITION OF core_audituser "
+            f"FOR VALUES FROM ('{anio}-{mes:02d}-01 00:00:00+00') TO ('{siguiente.isoformat()} 00:00:00+00')"
+        )
+    execute("""
+        INSERT INTO core_audituser (id, tabla, registroid, accion, estacion, fecha_hora, usuario_id)
+        SELECT id, tabla, registroid, accion, estacion, fecha_hora, usuario_id FROM core_audituser_sin_particion
+    """)
+    execute("SELECT setval('core_audituser_particion_id_seq', COALESCE((SELECT MAX(id) FROM core_audituser), 0) + 1, false)")
+    execute('DROP TABLE core_audituser_sin_particion')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_contador'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audituser',
+            name='fecha_hora',
+            field=models.DateTimeField(null=True, verbose_name='Fecha y Hora'),
+        ),
+        migrations.RunPython(combinar_fecha_hora, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='audituser',
+            name='fecha_hora',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Fecha y Hora'),
+        ),
+        migrations.RemoveField(
+            model_name='audituser',
+            name='fecha',
+        ),
+        migrations.RemoveField(
+            model_name='audituser',
+            name='hora',
+        ),
+        migrations.AlterField(
+            model_name='audituser',
+            name='usuario',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, to=settings.AUTH_USER_MODEL, verbose_name='Usuario'),
+        ),
+        migrations.AlterModelOptions(
+            name='audituser',
+            options={'ordering': ('-fecha_hora',), 'verbose_name': 'Auditoria Usuario ', 'verbose_name_plural': 'Auditorias Usuarios'},
+        ),
+        # la conversion no es reversible de forma automatica
+        migrations.RunPython(particionar, migrations.RunPython.noop),
+        # en Postgres los indices se crean sobre la tabla padre y se propagan a cada particion
+        migrations.AddIndex(
+            model_name='audituser',
+            index=models.Index(fields=['tabla', 'registroid', '-fecha_hora'], name='idx_audit_registro'),
+        ),
+        migrations.AddIndex(
+            model_name='audituser',
+            index=models.Index(fields=['usuario', '-fecha_hora'], name='idx_audit_usuario'),
+        ),
+    ]
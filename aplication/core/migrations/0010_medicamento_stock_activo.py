@@ -0,0 +1,17 @@
+# Generated by Django 5.1.2 on 2026-10-18 14:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_audituser_particionada'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='medicamento',
+            index=models.Index(condition=models.Q(('activo', True)), fields=['cantidad'], name='idx_medicamento_stock_activo'),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.1.2 on 2026-10-18 14:57
+
+from django.db import migrations, models
+
+# Indices de busqueda de diagnosticos dependientes del motor (ver aplication/core/search.py).
+# Postgres: btree varchar_pattern_ops para el prefijo de codigo (LIKE 'E11%' no usa el
+# indice unico con una collation distinta de C) y GIN trigram sobre UPPER(descripcion::text),
+# que sirve tanto al icontains como a la similitud por palabras.
+# SQLite: el prefijo de codigo es un rango sobre el indice unico; la descripcion va a una
+# tabla FTS5 de contenido externo sincronizada por triggers.
+PG_INDICES = [
+    'CREATE INDEX IF NOT EXISTS idx_diagnostico_codigo_like ON core_diagnostico (codigo varchar_pattern_ops)',
+    'CREATE INDEX IF NOT EXISTS idx_diagnostico_descripcion_trgm ON core_diagnostico USING gin (UPPER(descripcion::text) gin_trgm_ops)',
+]
+PG_BORRAR = [
+    'DROP INDEX IF EXISTS idx_diagnostico_codigo_like',
+    'DROP INDEX IF EXISTS idx_diagnostico_descripcion_trgm',
+]
+SQLITE_FTS = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS core_diagnostico_fts USING fts5(
+        descripcion, content='core_diagnostico', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2')""",
+    """CREATE TRIGGER IF NOT EXISTS core_diagnostico_fts_ai AFTER INSERT ON core_diagnostico BEGIN
+        INSERT INTO core_diagnostico_fts(rowid, descripcion) VALUES (new.id, new.descripcion);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS core_diagnostico_fts_ad AFTER DELETE ON core_diagnostico BEGIN
+        INSERT INTO core_diagnostico_fts(core_diagnostico_fts, rowid, descripcion) VALUES ('delete', old.id, old.descripcion);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS core_diagnostico_fts_au AFTER UPDATE OF descripcion ON core_diagnostico BEGIN
+        INSERT INTO core_diagnostico_fts(core_diagnostico_fts, rowid, descripcion) VALUES ('delete', old.id, old.descripcion);
+        INSERT INTO core_diagnostico_fts(rowid, descripcion) VALUES (new.id, new.descripcion);
+    END""",
+    "INSERT INTO core_diagnostico_fts(core_diagnostico_fts) VALUES ('rebuild')",
+]
+SQLITE_BORRAR = [
+    'DROP TRIGGER IF EXISTS core_diagnostico_fts_ai',
+    'DROP TRIGGER IF EXISTS core_diagnostico_fts_ad',
+    'DROP TRIGGER IF EXISTS core_diagnostico_fts_au',
+    'DROP TABLE IF EXISTS core_diagnostico_fts',
+]
+
+
+def _ejecutar(schema_editor, por_motor):
+    for sql in por_motor.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def crear_indices_busqueda(apps, schema_editor):
+    _ejecutar(schema_editor, {'postgresql': PG_INDICES, 'sqlite': SQLITE_FTS})
+
+
+def borrar_indices_busqueda(apps, schema_editor):
+    _ejecutar(schema_editor, {'postgresql': PG_BORRAR, 'sqlite': SQLITE_BORRAR})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_medicamento_stock_activo'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='diagnostico',
+            options={'ordering': ['codigo'], 'verbose_name': 'Diagnóstico', 'verbose_name_plural': 'Diagnósticos'},
+        ),
+        # en SQLite el AlterField reconstruye la tabla: los triggers FTS se crean despues
+        migrations.AlterField(
+            model_name='diagnostico',
+            name='descripcion',
+            field=models.CharField(max_length=255, verbose_name='Descripción del Diagnóstico'),
+        ),
+        migrations.RunPython(crear_indices_busqueda, borrar_indices_busqueda),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-18 15:43
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_diagnostico_busqueda'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='medicamento',
+            index=models.Index(django.db.models.functions.text.Upper('nombre'), name='idx_medicamento_nombre_upper'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.2 on 2026-10-18 16:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_medicamento_nombre_upper'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='paciente',
+            name='core_pacien_apellid_53b526_idx',
+        ),
+        migrations.AddIndex(
+            model_name='paciente',
+            index=models.Index(fields=['apellidos', 'id'], name='idx_paciente_apellidos_id'),
+        ),
+    ]
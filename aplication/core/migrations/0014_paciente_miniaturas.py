@@ -0,0 +1,34 @@
+# Generated by Django 5.1.2 on 2026-10-18 16:17
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+# En SQLite agregar una columna NOT NULL reconstruye core_paciente y se pierden los
+# triggers que sincronizan core_paciente_fts (ver 0007_paciente_busqueda): se vuelven a crear.
+busqueda = import_module('aplication.core.migrations.0007_paciente_busqueda')
+
+
+def recrear_triggers_fts(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in busqueda.SQLITE_FTS:
+            if sql.startswith('CREATE TRIGGER'):
+                schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_paciente_apellidos_id'),
+    ]
+
+    operations = [
+        # al revertir, RemoveField tambien reconstruye la tabla
+        migrations.RunPython(migrations.RunPython.noop, recrear_triggers_fts),
+        migrations.AddField(
+            model_name='paciente',
+            name='miniaturas',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Miniaturas generadas'),
+        ),
+        migrations.RunPython(recrear_triggers_fts, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,9 @@
 from datetime import date
-from django.db import models
+from django.db import models, router, transaction
+from django.db.models.functions import Upper
 from doctor.const import CIVIL_CHOICES, SEX_CHOICES
 from django.contrib.auth.models import User
+from django.utils import timezone
 from doctor.utils import valida_cedula,phone_regex
 
       
@@ -62,6 +64,8 @@ class Paciente(models.Model):
     tipo_sangre = models.ForeignKey(TipoSangre, on_delete=models.SET_NULL, null=True, verbose_name="Tipo de Sangre",related_name="tipos_sangre")
     # foto del paciente
     foto = models.ImageField(upload_to='pacientes/', verbose_name="Foto", null=True, blank=True)
+    # las miniaturas de la foto ya estan generadas (se marca al generarlas, ver aplication/core/thumbnails.py)
+    miniaturas = models.BooleanField(default=False, editable=False, verbose_name="Miniaturas generadas")
     # Alergias conocidas del paciente
     alergias = models.CharField(max_length=100,verbose_name="Alergias", null=True, blank=True)
     # Enfermedades crónicas que sufre el paciente
@@ -82,7 +86,12 @@ class Paciente(models.Model):
     class Meta:
         # Define el orden predeterminado de los pacientes por nombre
         ordering = ['apellidos']
-        indexes = [models.Index(fields=['apellidos'])]
+        indexes = [
+            # orden del listado y de la paginacion por cursor (doctor/pagination.py)
+            models.Index(fields=['apellidos', 'id'], name='idx_paciente_apellidos_id'),
+            # busqueda exacta y por prefijo de cedula (ver aplication/core/search.py)
+            models.Index(fields=['cedula'], name='idx_paciente_cedula'),
+        ]
         # Nombre en singular y plural del modelo en la interfaz de administración
         verbose_name = "Paciente"
         verbose_name_plural = "Pacientes"
@@ -97,11 +106,23 @@ class Paciente(models.Model):
     def __str__(self):
         return self.nombres
     
-    def get_image(self):
+    # tamano: None (original), 'lista' o 'modal' (ver aplication/core/thumbnails.py)
+    def get_image(self, tamano=None):
         if self.foto:
+            if tamano and self.miniaturas:
+                from aplication.core.thumbnails import url_miniatura
+                return url_miniatura(self.foto.name, tamano, self.foto.storage)
             return self.foto.url
         else:
             return '/static/img/usuario_anonimo.png'
+    
+    @property
+    def imagen_lista(self):
+        return self.get_image('lista')
+    
+    @property
+    def imagen_modal(self):
+        return self.get_image('modal')
      # Método estático para calcular la edad del paciente
     @staticmethod
     def calcular_edad(fecha_nacimiento):
@@ -112,9 +133,26 @@ class Paciente(models.Model):
             edad -= 1  # Restar un año si el cumpleaños no ha pasado
         return edad  
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # valores leidos de la BD para saber que contadores mover al guardar
+        instance._contadores_originales = (instance.__dict__.get('sexo'), instance.__dict__.get('activo'))
+        return instance
+    
+    def save(self, *args, **kwargs):
+        from aplication.core.counters import registrar_guardado
+        # el registro y sus contadores se confirman (o revierten) juntos
+        using = kwargs.get('using') or router.db_for_write(self.__class__, instance=self)
+        with transaction.atomic(using=using):
+            creado = self._state.adding
+            super().save(*args, **kwargs)
+            registrar_guardado(self, creado)
+    
     @staticmethod
     def cantidad_pacientes():
-       return Paciente.objects.all().count()
+       from aplication.core.counters import contar_pacientes
+       return contar_pacientes()
        
 """
 Modelo que representa las diferentes especialidades médicas.
@@ -303,9 +341,27 @@ class Medicamento(models.Model):
     def __str__(self):
         return f"{self.nombre} - ({self.tipo})"
 
+    def save(self, *args, **kwargs):
+        # el stock de un medicamento existente solo cambia con el kardex
+        # (attention/stock.py: UPDATE cantidad = cantidad + n). Reescribir aqui el valor
+        # leido antes (p. ej. el de un formulario abierto) desharia las dispensaciones
+        # hechas mientras tanto.
+        if not self._state.adding and self.pk is not None:
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None:
+                update_fields = [field.name for field in self._meta.concrete_fields if not field.primary_key]
+            kwargs['update_fields'] = [campo for campo in update_fields if campo != 'cantidad']
+        super().save(*args, **kwargs)
+
     class Meta:
         # Ordena los medicamentos alfabéticamente por nombre
         ordering = ['nombre']
+        indexes = [
+            # consulta de stock bajo (attention/stock.py): solo indexa los activos
+            models.Index(fields=['cantidad'], condition=models.Q(activo=True), name='idx_medicamento_stock_activo'),
+            # busqueda por prefijo sin distinguir mayusculas (admin de detalles de atencion)
+            models.Index(Upper('nombre'), name='idx_medicamento_nombre_upper'),
+        ]
         # Nombre singular y plural del modelo en la interfaz administrativa
         verbose_name = "Medicamento"
         verbose_name_plural = "Medicamentos"
@@ -316,7 +372,7 @@ class Diagnostico(models.Model):
     # Código único del diagnóstico (ej. CIE-10, ICD-10, etc.)
     codigo = models.CharField(max_length=20, unique=True, verbose_name="Código del Diagnóstico")
     # Descripción detallada del diagnóstico
-    descripcion = models.CharField(max_length=100, verbose_name="Descripción del Diagnóstico")
+    descripcion = models.CharField(max_length=255, verbose_name="Descripción del Diagnóstico")
     # Campo adicional para información relevante sobre el diagnóstico (opcional)
     datos_adicionales = models.TextField(verbose_name="Datos Adicionales", null=True, blank=True)
 
@@ -329,6 +385,7 @@ class Diagnostico(models.Model):
         # Nombre singular y plural del modelo en la interfaz administrativa
         verbose_name = "Diagnóstico"
         verbose_name_plural = "Diagnósticos"
+        ordering = ['codigo']
 
 # Modelo que representa una categoría de exámenes.
 # Agrupa varios tipos de exámenes bajo una misma categoría (ej. Sangre, Orina, Colesterol).
@@ -377,26 +434,65 @@ class TipoCategoria(models.Model):
         verbose_name = "Tipo de Examen"
         verbose_name_plural = "Tipos de Exámenes"
 
+# Totales mantenidos de forma transaccional (ver aplication/core/counters.py)
+# para no ejecutar COUNT(*) sobre tablas grandes en cada pagina.
+class Contador(models.Model):
+    clave = models.CharField(max_length=100, unique=True, verbose_name="Clave")
+    valor = models.BigIntegerField(default=0, verbose_name="Valor")
+
+    def __str__(self):
+        return f"{self.clave} = {self.valor}"
+
+    class Meta:
+        verbose_name = "Contador"
+        verbose_name_plural = "Contadores"
+
+# Consultas de historial sobre AuditUser. Todas pueden acotarse por fecha_hora,
+# lo que en Postgres permite descartar particiones mensuales completas.
+class AuditUserQuerySet(models.QuerySet):
+    def entre(self, desde=None, hasta=None):
+        if desde is not None:
+            self = self.filter(fecha_hora__gte=desde)
+        if hasta is not None:
+            self = self.filter(fecha_hora__lt=hasta)
+        return self
+
+    # quien toco el registro (instancia o tabla + id); usa idx_audit_registro
+    def historial(self, tabla, registroid=None, desde=None, hasta=None):
+        if registroid is None:
+            tabla, registroid = tabla.__class__.__name__, tabla.pk
+        return self.filter(tabla=tabla, registroid=registroid).entre(desde, hasta).select_related('usuario').order_by('-fecha_hora')
+
+    # que hizo un usuario; usa idx_audit_usuario
+    def por_usuario(self, usuario, desde=None, hasta=None):
+        return self.filter(usuario=usuario).entre(desde, hasta).order_by('-fecha_hora')
+
 # modelo que alamacena todos los aciones de ingreso, actualizacion, eliminacion d elos usarios que manipulan las opciones de la aplicacion
+# En Postgres la tabla esta particionada por mes sobre fecha_hora (ver aplication/core/partitions.py).
 class AuditUser(models.Model):
     TIPOS_ACCIONES = (
         ('A', 'A'),   # Adicion
         ('M', 'M'),   # Modificacion
         ('E', 'E')    # Eliminacion
     )
-    usuario = models.ForeignKey(User, verbose_name='Usuario',on_delete=models.PROTECT)
+    # el indice propio de la FK lo cubre idx_audit_usuario
+    usuario = models.ForeignKey(User, verbose_name='Usuario',on_delete=models.PROTECT,db_index=False)
     tabla = models.CharField(max_length=100, verbose_name='Tabla')
     registroid = models.IntegerField(verbose_name='Registro Id')
     accion = models.CharField(choices=TIPOS_ACCIONES, max_length=10, verbose_name='Accion')
-    fecha = models.DateField(verbose_name='Fecha')
-    hora = models.TimeField(verbose_name='Hora')
+    fecha_hora = models.DateTimeField(default=timezone.now, verbose_name='Fecha y Hora')
     estacion = models.CharField(max_length=100, verbose_name='Estacion')
 
+    objects = AuditUserQuerySet.as_manager()
+
     def __str__(self):
         return "{} - {} [{}]".format(self.usuario.username, self.tabla, self.accion)
 
     class Meta:
         verbose_name = 'Auditoria Usuario '
         verbose_name_plural = 'Auditorias Usuarios'
-        ordering = ('-fecha', 'hora')
-        
+        ordering = ('-fecha_hora',)
+        indexes = [
+            models.Index(fields=['tabla', 'registroid', '-fecha_hora'], name='idx_audit_registro'),
+            models.Index(fields=['usuario', '-fecha_hora'], name='idx_audit_usuario'),
+        ]
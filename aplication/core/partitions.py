@@ -0,0 +1,128 @@
+import datetime
+import re
+
+from django.db import connections, router, transaction
+
+from aplication.core.models import AuditUser
+
+# Mantenimiento de las particiones mensuales de AuditUser en Postgres
+# (creadas por la migracion 0009). Cada particion se llama core_audituser_pAAAA_MM
+# y cubre [primer dia del mes, primer dia del mes siguiente) en UTC; las filas fuera
+# de rango caen en core_audituser_default. En SQLite la tabla no esta particionada.
+# Postgres no deja crear una particion si DEFAULT ya tiene filas de ese rango: al crear
+# se desvincula DEFAULT, se crean los meses, se mueven sus filas y se vuelve a vincular,
+# todo en una transaccion (la tabla queda bloqueada mientras tanto).
+
+TABLA = 'core_audituser'
+DEFAULT = f'{TABLA}_default'
+PATRON = re.compile(r'^core_audituser_p(\d{4})_(\d{2})$')
+
+
+def _conexion():
+    return connections[router.db_for_write(AuditUser)]
+
+
+def es_particionada(connection=None):
+    connection = connection or _conexion()
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = %s", [TABLA])
+        return cursor.fetchone() is not None
+
+
+def _siguiente_mes(anio, mes):
+    return (anio + 1, 1) if mes == 12 else (anio, mes + 1)
+
+
+def rango_meses(desde, cantidad):
+    # [(anio, mes)] del mes de 'desde' y los 'cantidad' siguientes
+    anio, mes = desde.year, desde.month
+    resultado = []
+    for _ in range(cantidad + 1):
+        resultado.append((anio, mes))
+        anio, mes = _siguiente_mes(anio, mes)
+    return resultado
+
+
+def _rango(anio, mes):
+    siguiente = _siguiente_mes(anio, mes)
+    return f'{anio}-{mes:02d}-01 00:00:00+00', f'{siguiente[0]}-{siguiente[1]:02d}-01 00:00:00+00'
+
+
+def sentencias_crear(pendientes):
+    # SQL para crear las particiones de 'pendientes' [(anio, mes)] moviendo las filas
+    # que ya estuvieran en DEFAULT
+    if not pendientes:
+        return []
+    columnas = ', '.join(campo.column for campo in AuditUser._meta.concrete_fields)
+    sentencias = [f'ALTER TABLE {TABLA} DETACH PARTITION {DEFAULT}']
+    for anio, mes in pendientes:
+        desde, hasta = _rango(anio, mes)
+        sentencias.append(
+            f"CREATE TABLE {TABLA}_p{anio}_{mes:02d} PARTITION OF {TABLA} FOR VALUES FROM ('{desde}') TO ('{hasta}')"
+        )
+        condicion = f"fecha_hora >= '{desde}' AND fecha_hora < '{hasta}'"
+        sentencias.append(f'INSERT INTO {TABLA} ({columnas}) SELECT {columnas} FROM {DEFAULT} WHERE {condicion}')
+        sentencias.append(f'DELETE FROM {DEFAULT} WHERE {condicion}')
+    sentencias.append(f'ALTER TABLE {TABLA} ATTACH PARTITION {DEFAULT} DEFAULT')
+    return sentencias
+
+
+def particiones(connection=None):
+    # [(nombre, date del primer dia del mes)] ordenadas por mes
+    connection = connection or _conexion()
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT hija.relname FROM pg_inherits i
+            JOIN pg_class padre ON padre.oid = i.inhparent
+            JOIN pg_class hija ON hija.oid = i.inhrelid
+            WHERE padre.relname = %s
+        """, [TABLA])
+        nombres = [fila[0] for fila in cursor.fetchall()]
+    resultado = []
+    for nombre in nombres:
+        coincidencia = PATRON.match(nombre)
+        if coincidencia:
+            resultado.append((nombre, datetime.date(int(coincidencia.group(1)), int(coincidencia.group(2)), 1)))
+    return sorted(resultado, key=lambda p: p[1])
+
+
+def crear_particiones(meses=3, desde=None):
+    # crea (si no existen) las particiones del mes de 'desde' y los 'meses' siguientes
+    connection = _conexion()
+    if not es_particionada(connection):
+        return []
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        existentes = {nombre for nombre, _ in particiones(connection)}
+        pendientes = [
+            (anio, mes) for anio, mes in rango_meses(desde or datetime.date.today(), meses)
+            if f'{TABLA}_p{anio}_{mes:02d}' not in existentes
+        ]
+        for sentencia in sentencias_crear(pendientes):
+            cursor.execute(sentencia)
+    return [f'{TABLA}_p{anio}_{mes:02d}' for anio, mes in pendientes]
+
+
+def desvincular_particiones(antes_de, borrar=False):
+    # separa de la tabla las particiones de meses anteriores a 'antes_de'. Quedan como
+    # tablas independientes (archivo consultable) salvo que se pida borrarlas.
+    # En motores sin particiones, borrar=True elimina las filas antiguas.
+    connection = _conexion()
+    if not es_particionada(connection):
+        if borrar:
+            return AuditUser.objects.using(connection.alias).filter(
+                fecha_hora__lt=datetime.datetime.combine(antes_de, datetime.time(), tzinfo=datetime.timezone.utc)
+            ).delete()[0]
+        return []
+    afectadas = []
+    limite = antes_de.replace(day=1)
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        for nombre, mes in particiones(connection):
+            if mes >= limite:
+                break
+            cursor.execute(f'ALTER TABLE {TABLA} DETACH PARTITION {nombre}')
+            if borrar:
+                cursor.execute(f'DROP TABLE {nombre}')
+            afectadas.append(nombre)
+    return afectadas
@@ -0,0 +1,151 @@
+import re
+
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connections
+from django.db.models import F, FloatField, Func, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Upper
+
+# Busqueda de pacientes y diagnosticos respaldada por indices.
+# - Cedula numerica: coincidencia exacta (10 digitos) o rango por prefijo sobre el indice btree.
+# - Codigo CIE-10 (letra + digito...): prefijo sobre el indice del codigo.
+# - Postgres: ILIKE acelerado por indices GIN trigram (pg_trgm) y ranking por similitud.
+# - SQLite: tabla virtual FTS5 (core_paciente_fts, core_diagnostico_fts) mantenida por
+#   triggers y ranking bm25.
+# - Otros motores: icontains sin indices (comportamiento anterior).
+# Todas las ramas anotan el campo 'rango' (mayor es mejor) para ordenar los resultados.
+
+LONGITUD_CEDULA = 10
+CODIGO_CIE10 = re.compile(r'^[A-Z][0-9][0-9A-Z]?(\.?[0-9A-Z]*)$')
+
+
+def buscar_pacientes(queryset, texto, ordenar=True):
+    # ordenar=False: solo filtra (sin rango), para usarlo como subconsulta (pk__in)
+    texto = (texto or '').strip()
+    if not texto:
+        return queryset
+    if texto.isdigit():
+        return _buscar_cedula(queryset, texto)
+    return buscar_texto(queryset, texto, campos=('apellidos', 'nombres'), tabla_fts='core_paciente_fts', ordenar=ordenar)
+
+
+def buscar_diagnosticos(queryset, texto):
+    texto = (texto or '').strip()
+    if not texto:
+        return queryset
+    codigo = normalizar_codigo(texto)
+    if CODIGO_CIE10.match(codigo):
+        return _buscar_codigo(queryset, codigo)
+    # en Postgres la descripcion tambien admite errores de tipeo (similitud trigram)
+    return buscar_texto(queryset, texto, campos=('descripcion',), tabla_fts='core_diagnostico_fts', difuso=True)
+
+
+def normalizar_codigo(codigo):
+    # 'e119' / 'E11.9' / ' e11.9 ' -> 'E11.9' (el catalogo se guarda con el punto tras la categoria)
+    codigo = codigo.strip().upper()
+    if len(codigo) > 3 and '.' not in codigo:
+        codigo = f'{codigo[:3]}.{codigo[3:]}'
+    return codigo
+
+
+def buscar_texto(queryset, texto, campos, tabla_fts=None, difuso=False, ordenar=True):
+    tokens = _tokens(texto)
+    if not tokens:
+        return queryset.none()
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        return _buscar_trigrama(queryset, texto, tokens, campos, difuso)
+    if vendor == 'sqlite' and tabla_fts:
+        return _buscar_fts(queryset, tokens, tabla_fts) if ordenar else _filtrar_fts(queryset, tokens, tabla_fts)
+    return _buscar_icontains(queryset, tokens, campos)
+
+
+def _tokens(texto):
+    # separa por espacios y descarta las comillas que romperian la sintaxis MATCH de FTS5
+    return [t.replace('"', '') for t in texto.split() if t.replace('"', '')]
+
+
+def _buscar_cedula(queryset, digitos):
+    if len(digitos) >= LONGITUD_CEDULA:
+        filtro = Q(cedula=digitos)
+    else:
+        # un prefijo numerico es un rango [prefijo, siguiente) que el btree resuelve sin LIKE
+        siguiente = str(int(digitos) + 1).zfill(len(digitos))
+        filtro = Q(cedula__gte=digitos, cedula__lt=siguiente) if len(siguiente) == len(digitos) else Q(cedula__gte=digitos)
+    return queryset.filter(filtro).annotate(rango=Value(1.0, output_field=FloatField())).order_by('cedula', 'id')
+
+
+def _buscar_codigo(queryset, prefijo):
+    if connections[queryset.db].vendor == 'postgresql':
+        # LIKE 'E11%' resuelto por idx_diagnostico_codigo_like (varchar_pattern_ops)
+        filtro = Q(codigo__startswith=prefijo)
+    else:
+        # rango [prefijo, prefijo + U+FFFF) sobre el indice unico; en SQLite el LIKE con
+        # ESCAPE que genera startswith no puede usar indices
+        filtro = Q(codigo__gte=prefijo, codigo__lt=prefijo + '\uffff')
+    return queryset.filter(filtro).annotate(rango=Value(1.0, output_field=FloatField())).order_by('codigo', 'id')
+
+
+def _filtro_tokens(tokens, campos):
+    filtro = Q()
+    for token in tokens:
+        por_campo = Q()
+        for campo in campos:
+            por_campo |= Q(**{f'{campo}__icontains': token})
+        filtro &= por_campo
+    return filtro
+
+
+def _buscar_trigrama(queryset, texto, tokens, campos, difuso=False):
+    # cada icontains se traduce a UPPER(col::text) LIKE UPPER(%s), que usa los indices GIN gin_trgm_ops
+    rango = sum((TrigramWordSimilarity(texto, campo) for campo in campos[1:]), TrigramWordSimilarity(texto, campos[0]))
+    filtro = _filtro_tokens(tokens, campos)
+    if difuso:
+        # 'diabetis' no contiene 'diabetes' pero si se le parece: el operador <% de
+        # pg_trgm (umbral word_similarity_threshold) usa el mismo indice sobre UPPER(col)
+        alias = {f'{campo}_mayus': Upper(campo) for campo in campos}
+        queryset = queryset.alias(**alias)
+        for nombre in alias:
+            filtro |= Q(**{f'{nombre}__trigram_word_similar': texto.upper()})
+    return queryset.filter(filtro).annotate(rango=rango).order_by('-rango', *campos, 'id')
+
+
+def _consulta_fts(tokens):
+    # cada termino se busca como prefijo ("ram"* encuentra "RAMIREZ") y todos deben aparecer
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+class _RangoFts(Func):
+    # -rank de la fila en la tabla FTS5 (bm25, mas negativo = mas relevante). El MATCH va
+    # en una subconsulta con LIMIT para que SQLite no la aplane: la evalua una sola vez y
+    # busca cada fila por un indice automatico sobre rowid (un MATCH por fila re-expande
+    # los prefijos "ram"* en cada una). El pk se compila como columna, asi que sirve
+    # tambien cuando Django renombra la tabla (U0).
+    output_field = FloatField()
+
+    def __init__(self, tabla_fts, consulta):
+        self.tabla_fts, self.consulta = tabla_fts, consulta
+        super().__init__(F('pk'))
+
+    def as_sql(self, compiler, connection, **extra_context):
+        pk, params = compiler.compile(self.source_expressions[0])
+        sql = (f'(SELECT rango FROM (SELECT rowid AS fila, -rank AS rango FROM {self.tabla_fts} '
+               f'WHERE {self.tabla_fts} MATCH %s LIMIT -1) WHERE fila = {pk})')
+        return sql, [self.consulta, *params]
+
+
+def _buscar_fts(queryset, tokens, tabla_fts):
+    return _filtrar_fts(queryset, tokens, tabla_fts).annotate(
+        rango=_RangoFts(tabla_fts, _consulta_fts(tokens))
+    ).order_by('-rango', 'id')
+
+
+def _filtrar_fts(queryset, tokens, tabla_fts):
+    ids = RawSQL(f'SELECT rowid FROM {tabla_fts} WHERE {tabla_fts} MATCH %s', [_consulta_fts(tokens)])
+    return queryset.filter(pk__in=ids)
+
+
+def _buscar_icontains(queryset, tokens, campos):
+    return queryset.filter(_filtro_tokens(tokens, campos)).annotate(
+        rango=Value(1.0, output_field=FloatField())
+    ).order_by(*campos, 'id')
@@ -0,0 +1,53 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from aplication.core.autocomplete import invalidar_catalogo
+from aplication.core.cache import invalidar_detalle
+from aplication.core.counters import registrar_borrado
+from aplication.core.models import (Cargo, CategoriaExamen, Especialidad, MarcaMedicamento, Medicamento, Paciente,
+                                    TipoMedicamento, TipoSangre)
+from doctor import catalogs
+
+
+# El borrado (individual o por queryset) corre dentro de la transaccion del Collector
+@receiver(post_delete, sender=Paciente)
+def paciente_borrado(sender, instance, using, **kwargs):
+    registrar_borrado(instance, using)
+    invalidar_detalle(instance.pk)
+
+
+# Cubre PatientUpdateView.form_valid, el admin y cualquier otro save()
+@receiver(post_save, sender=Paciente)
+def paciente_guardado(sender, instance, created, **kwargs):
+    if not created:
+        invalidar_detalle(instance.pk)
+
+
+# Nueva version del catalogo de medicamentos: cada proceso reconstruye su indice de
+# autocompletado. Se publica al confirmar para no reconstruir con datos sin confirmar.
+@receiver(post_save, sender=Medicamento)
+@receiver(post_delete, sender=Medicamento)
+@receiver(post_save, sender=TipoMedicamento)
+@receiver(post_delete, sender=TipoMedicamento)
+@receiver(post_save, sender=MarcaMedicamento)
+@receiver(post_delete, sender=MarcaMedicamento)
+def catalogo_modificado(sender, using, **kwargs):
+    transaction.on_commit(invalidar_catalogo, using=using)
+
+
+# Nueva version del catalogo en memoria de formularios y admin (doctor/catalogs.py)
+@receiver(post_save, sender=TipoSangre)
+@receiver(post_delete, sender=TipoSangre)
+@receiver(post_save, sender=Especialidad)
+@receiver(post_delete, sender=Especialidad)
+@receiver(post_save, sender=TipoMedicamento)
+@receiver(post_delete, sender=TipoMedicamento)
+@receiver(post_save, sender=MarcaMedicamento)
+@receiver(post_delete, sender=MarcaMedicamento)
+@receiver(post_save, sender=Cargo)
+@receiver(post_delete, sender=Cargo)
+@receiver(post_save, sender=CategoriaExamen)
+@receiver(post_delete, sender=CategoriaExamen)
+def catalogo_de_referencia_modificado(sender, using, **kwargs):
+    transaction.on_commit(lambda: catalogs.invalidar(sender), using=using)
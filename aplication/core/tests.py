@@ -1,3 +1,687 @@
-from django.test import TestCase
+import base64
+import csv
+import datetime
+import io
+import json
+import random
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.exceptions import ValidationError
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from aplication.core import importer
+from aplication.core.cie10 import cargar_catalogo, leer_csv
+from aplication.attention.models import Atencion, CitaMedica, DetalleAtencion
+from aplication.core.counters import actualizar_pacientes, contar_pacientes, recalcular_contadores
+from aplication.core.forms.patient import PatientForm
+from aplication.core.models import AuditUser, Contador, Diagnostico, Paciente, TipoMedicamento, TipoSangre
+from aplication.core.partitions import rango_meses, sentencias_crear
+from aplication.core.search import _buscar_trigrama, buscar_diagnosticos, buscar_pacientes
+from aplication.core.thumbnails import TAMANOS, generar_miniaturas, generar_miniaturas_seguro, ruta_miniatura
+from doctor import audit
+from doctor.benchmark import cedula_aleatoria, sembrar_clinica, sembrar_pacientes
+from doctor.catalogs import VERIFICAR_CADA, CatalogChoiceField
+from doctor.middleware import QueryBudgetMiddleware, huella
+from doctor.pagination import KeysetPaginator, _antes_de, _despues_de
+from doctor.testing import QueryBudgetMixin
+from doctor.utils import CEDULA_VALIDA, MENSAJES_CEDULA, phone_regex, save_audit, valida_cedula, valida_cedulas_lote
+
+
+def codigo_escalar(valor):
+    try:
+        valida_cedula(valor)
+    except ValidationError as error:
+        return next(codigo for codigo, mensaje in MENSAJES_CEDULA.items() if mensaje == error.message)
+    except ValueError:
+        return None
+    return CEDULA_VALIDA
+
+
+class ValidaCedulasLoteTest(SimpleTestCase):
+
+    def test_coincide_con_validador_escalar(self):
+        rnd = random.Random(8)
+        valores = [cedula_aleatoria(rnd) for _ in range(2000)]
+        # cedulas con el ultimo digito alterado, longitudes incorrectas y basura
+        valores += [c[:9] + str((int(c[9]) + rnd.randint(1, 9)) % 10) for c in valores[:500]]
+        valores += [''.join(rnd.choice('0123456789') for _ in range(rnd.randint(0, 14))) for _ in range(2000)]
+        valores += ['', ' ', '17101234 5', '1710123456 ', '-171012345', '17l0123456', 'abcdefghij', None,
+                    1710034065, 123, '١٧١٠٠٣٤٠٦٥', '１７１００３４０６５', '०१२३४५६७८९', '171003406٥']
+        codigos = valida_cedulas_lote(valores)
+        self.assertEqual(len(codigos), len(valores))
+        for valor, codigo in zip(valores, codigos):
+            with self.subTest(valor=valor):
+                self.assertEqual(int(codigo), codigo_escalar(valor))
+
+    def test_superindices_no_numericos(self):
+        # isdigit() acepta '²' pero valida_cedula falla al convertirlo
+        self.assertEqual(valida_cedulas_lote(['²' * 10]).tolist(), [1])
+
+    def test_lote_vacio(self):
+        self.assertEqual(len(valida_cedulas_lote([])), 0)
+
+
+class CargaCie10Test(TestCase):
+    CATALOGO = 'codigo;descripcion\nE11;Diabetes mellitus tipo 2\nE119;Diabetes mellitus tipo 2 sin complicaciones\n' \
+               'A00.0;Cólera debido a Vibrio cholerae\nJ18.9;Neumonía, no especificada\nZZ;invalido\nE11.9;repetido\n'
+
+    def cargar(self, texto, **kwargs):
+        return cargar_catalogo(leer_csv(io.StringIO(texto)), **kwargs)
+
+    def test_carga_idempotente(self):
+        resumen = self.cargar(self.CATALOGO)
+        self.assertEqual((resumen['creados'], resumen['rechazadas']), (4, 2))
+        self.assertEqual(Diagnostico.objects.get(codigo='E11.9').descripcion, 'Diabetes mellitus tipo 2 sin complicaciones')
+        resumen = self.cargar(self.CATALOGO)
+        self.assertEqual((resumen['creados'], resumen['actualizados'], resumen['sin_cambios']), (0, 0, 4))
+
+    def test_actualiza_y_desactiva(self):
+        self.cargar(self.CATALOGO)
+        resumen = self.cargar('E11,Diabetes tipo 2\nA00.0,Cólera debido a Vibrio cholerae\n', desactivar_faltantes=True)
+        self.assertEqual((resumen['actualizados'], resumen['sin_cambios'], resumen['desactivados']), (1, 1, 2))
+        self.assertFalse(Diagnostico.objects.get(codigo='J18.9').activo)
+        self.assertEqual(Diagnostico.objects.get(codigo='E11').descripcion, 'Diabetes tipo 2')
+
+    def test_busqueda(self):
+        self.cargar(self.CATALOGO)
+        codigos = lambda texto: [d.codigo for d in buscar_diagnosticos(Diagnostico.objects.all(), texto)]
+        self.assertEqual(codigos('e11'), ['E11', 'E11.9'])
+        self.assertEqual(codigos('E119'), ['E11.9'])
+        self.assertEqual(codigos('colera vibrio'), ['A00.0'])
+        self.assertEqual(sorted(codigos('diab compl')), ['E11.9'])
+
+
+class BusquedaPacientesTest(TestCase):
+
+    def setUp(self):
+        for cedula, apellidos, nombres in (('1710034065', 'RAMIREZ LOPEZ', 'ANA'), ('0912345675', 'RAMOS', 'LUIS RAMIRO'),
+                                           ('0102030405', 'PEREZ', 'MARIA')):
+            Paciente.objects.create(nombres=nombres, apellidos=apellidos, cedula=cedula, fecha_nacimiento='1990-01-01',
+                                    telefono='0991234567', sexo='F', estado_civil='S', direccion='Calle 1')
+
+    def test_rango_y_subconsulta(self):
+        queryset = buscar_pacientes(Paciente.objects.all(), 'ramirez lopez')
+        self.assertFalse(queryset.query.extra)
+        self.assertEqual([p.apellidos for p in queryset], ['RAMIREZ LOPEZ'])
+        ordenados = [p.pk for p in buscar_pacientes(Paciente.objects.all(), 'ram')]
+        self.assertEqual(len(ordenados), 2)
+        # el rango se arma con la columna del pk, que Django renombra dentro de una subconsulta
+        subconsulta = buscar_pacientes(Paciente.objects.all(), 'ram').values('pk')[:1]
+        self.assertEqual(list(Paciente.objects.filter(pk__in=subconsulta).values_list('pk', flat=True)), ordenados[:1])
+
+
+class BusquedaPostgresTest(SimpleTestCase):
+    # la rama de Postgres no corre con SQLite: se arma la consulta y se compila con el
+    # backend de Postgres sin conectarse
+
+    def sql_postgres(self, queryset):
+        from django.db.backends.postgresql.base import DatabaseWrapper
+        postgres = DatabaseWrapper({**connection.settings_dict, 'ENGINE': 'django.db.backends.postgresql'}, alias='postgres')
+        return queryset.query.get_compiler(connection=postgres).as_sql()
+
+    def test_descripcion_difusa(self):
+        queryset = _buscar_trigrama(Diagnostico.objects.all(), 'diabetis', ['diabetis'], ('descripcion',), difuso=True)
+        sql, params = self.sql_postgres(queryset)
+        # %%> es el operador %> de pg_trgm (texto <% columna) escapado para los parametros
+        self.assertIn('UPPER("core_diagnostico"."descripcion") %%> %s', sql)
+        self.assertIn('WORD_SIMILARITY', sql)
+        self.assertIn('DIABETIS', params)
+
+    def test_pacientes(self):
+        queryset = _buscar_trigrama(Paciente.objects.all(), 'perez ana', ['perez', 'ana'], ('apellidos', 'nombres'))
+        sql, _ = self.sql_postgres(queryset)
+        self.assertEqual(sql.count('LIKE'), 4)
+
+
+class PresupuestoConsultasTest(QueryBudgetMixin, TestCase):
+
+    def setUp(self):
+        sembrar_pacientes(30)
+        self.paciente = Paciente.objects.order_by('id').first()
+
+    def test_vistas_dentro_del_presupuesto(self):
+        usuario = Client()
+        usuario.force_login(User.objects.create_user('medico', password='clave-segura-1'))
+        for cliente in (Client(), usuario):
+            self.assertQueryBudget(reverse('core:home'), client=cliente)
+            self.assertQueryBudget(reverse('core:patient_list'), client=cliente)
+            self.assertQueryBudget(reverse('core:patient_list') + '?q=perez', client=cliente)
+            self.assertQueryBudget(reverse('core:patient_detail', args=[self.paciente.pk]), client=cliente)
+            self.assertQueryBudget(reverse('attention:patient_timeline', args=[self.paciente.pk]), client=cliente)
+
+    def test_presupuesto_excedido(self):
+        with self.assertRaisesMessage(AssertionError, 'el presupuesto es 1'):
+            self.assertQueryBudget(reverse('core:patient_list'), budget=1)
+
+    def medir(self, vista, presupuesto=None):
+        vista.query_budget = presupuesto
+        request = RequestFactory().get('/prueba/')
+        middleware = QueryBudgetMiddleware(lambda request: middleware.process_view(request, vista, (), {}) or vista(request))
+        with self.assertLogs('doctor.queries', 'INFO') as registro:
+            middleware(request)
+        return registro.records[0].levelname, json.loads(registro.records[0].getMessage())
+
+    def test_registro_y_n_mas_1(self):
+        ids = list(Paciente.objects.values_list('id', flat=True)[:6])
+
+        def por_lote(request):
+            list(Paciente.objects.filter(id__in=ids))
+            return HttpResponse()
+
+        def uno_por_uno(request):
+            for pk in ids:
+                Paciente.objects.get(pk=pk)
+            return HttpResponse()
+
+        nivel, linea = self.medir(por_lote, presupuesto=2)
+        self.assertEqual((nivel, linea['queries'], linea['n_plus_one'], linea['over_budget']), ('INFO', 1, False, False))
+        nivel, linea = self.medir(uno_por_uno, presupuesto=2)
+        self.assertEqual((nivel, linea['queries'], linea['n_plus_one'], linea['over_budget']), ('WARNING', 6, True, True))
+        self.assertEqual(linea['repeated'][0]['count'], 6)
+
+    def test_huella(self):
+        self.assertEqual(huella('SELECT * FROM t WHERE id IN (%s, %s, %s) AND nombre = \'ANA\' LIMIT 21'),
+                         'SELECT * FROM t WHERE id IN (...) AND nombre = %s LIMIT %s')
+        self.assertEqual(huella('SELECT * FROM t WHERE id IN (%s)'), 'SELECT * FROM t WHERE id IN (%s)')
+
+
+class SembrarClinicaTest(TestCase):
+
+    def test_historias_proporcionales(self):
+        sembrar_clinica(100, lote=40)
+        sembrar_clinica(200, lote=40)
+        self.assertEqual(contar_pacientes(), 200)
+        self.assertEqual(CitaMedica.objects.count(), 200)
+        # turnos sin repetir (uniq_cita_turno) y atenciones con sus detalles y diagnosticos
+        self.assertEqual(CitaMedica.objects.values('fecha', 'hora_cita').distinct().count(), 200)
+        atenciones = Atencion.objects.count()
+        self.assertTrue(200 <= atenciones <= 400)
+        self.assertTrue(DetalleAtencion.objects.count() > atenciones)
+        self.assertEqual(Atencion.diagnostico.through.objects.count(), atenciones)
+        self.assertFalse(Atencion.objects.filter(fecha_atencion__gt=timezone.now()).exists())
+        # los id siguen desde los generados
+        self.assertGreater(crear_paciente_minimo().id, 200)
+
+    def test_datos_validos(self):
+        sembrar_pacientes(500)
+        pacientes = list(Paciente.objects.values_list('cedula', 'telefono', 'fecha_nacimiento', 'estado_civil', 'tipo_sangre'))
+        cedulas = [cedula for cedula, *_ in pacientes]
+        self.assertFalse(valida_cedulas_lote(cedulas).any())
+        self.assertEqual(len(set(cedulas)), 500)
+        hoy = timezone.localdate()
+        for _, telefono, nacimiento, estado_civil, tipo_sangre in pacientes:
+            phone_regex(telefono)
+            self.assertIsNotNone(tipo_sangre)
+            if (hoy - nacimiento).days < 18 * 365:
+                self.assertEqual(estado_civil, 'S')
+
+
+def crear_paciente_minimo():
+    return Paciente.objects.create(nombres='Ana', apellidos='Perez', cedula='1710034065', fecha_nacimiento='1990-01-01',
+                                   telefono='0991234567', sexo='F', estado_civil='S', direccion='Calle 1')
+
+
+class CatalogosEnMemoriaTest(TestCase):
+
+    def setUp(self):
+        # la version se incrementa al confirmar: en TestCase hay que ejecutar los on_commit
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tipos = [TipoSangre.objects.create(tipo=tipo, descripcion=tipo) for tipo in ('A+', 'O-')]
+
+    def test_formulario_sin_consultas(self):
+        str(PatientForm())
+        with self.assertNumQueries(0):
+            html = str(PatientForm())
+        for tipo in self.tipos:
+            self.assertIn(f'<option value="{tipo.pk}">{tipo.tipo}</option>', html)
+
+    def test_cambios_en_el_proceso(self):
+        str(PatientForm())
+        with self.captureOnCommitCallbacks(execute=True):
+            TipoSangre.objects.create(tipo='AB+', descripcion='AB+')
+        self.assertIn('>AB+<', str(PatientForm()))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tipos[0].delete()
+        self.assertNotIn('>A+<', str(PatientForm()))
+
+    def test_cambios_de_otro_proceso(self):
+        str(PatientForm())
+        # update() no envia señales: como si otro proceso cambiara la fila e incrementara la version
+        TipoSangre.objects.filter(pk=self.tipos[1].pk).update(tipo='O+')
+        cache.incr('catalogo:core.TipoSangre:version')
+        self.assertIn('>O-<', str(PatientForm()))
+        with mock.patch('doctor.catalogs.time.monotonic', return_value=time.monotonic() + VERIFICAR_CADA):
+            self.assertIn('>O+<', str(PatientForm()))
+
+    def test_validacion_y_querysets_filtrados(self):
+        campo = CatalogChoiceField(TipoSangre.objects.all())
+        self.assertEqual(campo.clean(str(self.tipos[0].pk)), self.tipos[0])
+        with self.assertRaises(ValidationError):
+            campo.clean('999')
+        filtrado = CatalogChoiceField(TipoSangre.objects.filter(tipo='A+'), empty_label=None)
+        with self.assertNumQueries(1):
+            self.assertEqual([etiqueta for _, etiqueta in filtrado.choices], ['A+'])
+
+    def test_admin_sin_consultas_de_catalogos(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            TipoMedicamento.objects.create(nombre='Analgésico')
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@clinica.ec', 'clave-segura-1'))
+        url = reverse('admin:core_medicamento_add')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(url)
+        self.assertContains(respuesta, 'Analgésico')
+        tablas = ('core_tipomedicamento', 'core_marcamedicamento')
+        self.assertFalse([c['sql'] for c in consultas.captured_queries if any(t in c['sql'] for t in tablas)])
+
+
+class MiniaturasTest(TestCase):
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        ajustes = override_settings(MEDIA_ROOT=self.media)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+
+    def guardar(self, nombre, color, formato='PNG', tamano=(32, 32)):
+        contenido = io.BytesIO()
+        Image.new('RGB', tamano, color).save(contenido, formato)
+        return default_storage.save(nombre, ContentFile(contenido.getvalue()))
+
+    def test_fotos_con_el_mismo_nombre_no_comparten_miniatura(self):
+        roja = self.guardar('pacientes/juan.png', 'red')
+        azul = self.guardar('pacientes/juan.jpg', 'blue', 'JPEG')
+        for tamano in TAMANOS:
+            self.assertNotEqual(ruta_miniatura(roja, tamano), ruta_miniatura(azul, tamano))
+        generar_miniaturas(roja, forzar=True)
+        generar_miniaturas(azul, forzar=True)
+        for nombre, canal in ((roja, 0), (azul, 2)):
+            with default_storage.open(ruta_miniatura(nombre, 'lista'), 'rb') as archivo:
+                pixel = Image.open(archivo).convert('RGB').getpixel((0, 0))
+            self.assertGreater(pixel[canal], 200)
+
+    def test_imagen_invalida_o_demasiado_grande(self):
+        nombre = default_storage.save('pacientes/rota.png', ContentFile(b'no es una imagen'))
+        with self.assertLogs('aplication.core.thumbnails', 'ERROR'):
+            self.assertIsNone(generar_miniaturas_seguro(nombre))
+        grande = self.guardar('pacientes/grande.png', 'white', tamano=(400, 400))
+        with mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 100), self.assertLogs('aplication.core.thumbnails', 'ERROR'):
+            self.assertIsNone(generar_miniaturas_seguro(grande))
+        self.assertFalse(default_storage.exists(ruta_miniatura(grande, 'lista')))
+
+    def test_la_url_no_consulta_el_storage(self):
+        paciente = crear_paciente_minimo()
+        paciente.foto = self.guardar('pacientes/ana.png', 'red')
+        paciente.save()
+        with mock.patch.object(FileSystemStorage, 'exists') as exists:
+            # sin marcar: foto original
+            self.assertEqual(paciente.get_image('lista'), paciente.foto.url)
+            paciente.miniaturas = True
+            self.assertEqual(paciente.get_image('lista'), default_storage.url(ruta_miniatura(paciente.foto.name, 'lista')))
+        exists.assert_not_called()
+
+    def test_el_formulario_marca_las_miniaturas(self):
+        paciente = crear_paciente_minimo()
+        contenido = io.BytesIO()
+        Image.new('RGB', (32, 32), 'blue').save(contenido, 'PNG')
+        datos = {campo: valor for campo, valor in PatientForm(instance=paciente).initial.items() if valor is not None}
+        datos['tipo_sangre'] = TipoSangre.objects.create(tipo='O+', descripcion='O+').pk
+        formulario = PatientForm(datos, {'foto': SimpleUploadedFile('ana.png', contenido.getvalue())}, instance=paciente)
+        self.assertTrue(formulario.is_valid(), formulario.errors)
+        formulario.save()
+        paciente.refresh_from_db()
+        self.assertTrue(paciente.miniaturas)
+        self.assertTrue(default_storage.exists(ruta_miniatura(paciente.foto.name, 'modal')))
+        # una foto que no se puede procesar deja la marca en falso
+        with mock.patch('aplication.core.forms.patient.generar_miniaturas_seguro', return_value=None):
+            formulario = PatientForm(datos, {'foto': SimpleUploadedFile('otra.png', contenido.getvalue())},
+                                     instance=paciente)
+            self.assertTrue(formulario.is_valid(), formulario.errors)
+            formulario.save()
+        paciente.refresh_from_db()
+        self.assertFalse(paciente.miniaturas)
+
+    def test_backfill_marca_las_fotos_pendientes(self):
+        paciente = crear_paciente_minimo()
+        Paciente.objects.filter(pk=paciente.pk).update(foto=self.guardar('pacientes/sana.png', 'green'))
+        salida = io.StringIO()
+        call_command('generar_miniaturas', procesos=1, stdout=salida)
+        self.assertIn('1 fotos revisadas, 2 miniaturas generadas', salida.getvalue())
+        self.assertTrue(Paciente.objects.get(pk=paciente.pk).miniaturas)
+        # las ya marcadas no se vuelven a revisar
+        salida = io.StringIO()
+        call_command('generar_miniaturas', procesos=1, stdout=salida)
+        self.assertIn('0 fotos revisadas', salida.getvalue())
+
+
+class KeysetPaginatorTest(TestCase):
+
+    def setUp(self):
+        sembrar_pacientes(25)
+        self.paginador = KeysetPaginator(Paciente.objects.all(), 10)
+        self.orden = list(Paciente.objects.order_by('apellidos', 'id').values_list('id', flat=True))
+
+    def ids(self, pagina):
+        return [paciente.id for paciente in pagina]
+
+    def test_navegacion_adelante_y_atras(self):
+        primera = self.paginador.page()
+        segunda = self.paginador.page(primera.next_cursor)
+        tercera = self.paginador.page(segunda.next_cursor)
+        self.assertEqual((primera.number, segunda.number, tercera.number), (1, 2, 3))
+        self.assertEqual(self.ids(primera) + self.ids(segunda) + self.ids(tercera), self.orden)
+        self.assertFalse(tercera.has_next())
+        self.assertEqual(tercera.start_index(), 21)
+        # hacia atras con los cursores de la ventana
+        atras = self.paginador.page(tercera.previous_cursor)
+        self.assertEqual((atras.number, self.ids(atras)), (2, self.ids(segunda)))
+        self.assertIsNone(atras.previous_cursor)  # la primera pagina va sin cursor
+        self.assertEqual([p['numero'] for p in tercera.ventana], [1, 2, 3])
+
+    def test_paginas_profundas_recorren_el_indice_desde_el_cursor(self):
+        # una pagina profunda no recorre el indice desde el inicio: el plan empieza en la clave
+        ultima = Paciente.objects.order_by('apellidos', 'id').values_list('apellidos', 'id').last()
+        for filtro in (_despues_de(('apellidos', 'id'), ultima), _antes_de(('apellidos', 'id'), ultima)):
+            queryset = Paciente.objects.filter(filtro).order_by('apellidos', 'id')[:10]
+            if connection.vendor == 'sqlite':
+                sql, params = queryset.query.sql_with_params()
+                with connection.cursor() as cursor:
+                    cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                    plan = ' '.join(str(fila[-1]) for fila in cursor.fetchall())
+                self.assertIn('SEARCH core_paciente USING INDEX idx_paciente_apellidos_id (apellidos', plan)
+        self.assertEqual(list(Paciente.objects.filter(_antes_de(('apellidos', 'id'), ultima))
+                              .order_by('apellidos', 'id').values_list('id', flat=True)), self.orden[:-1])
+
+    def test_cursores_manipulados_vuelven_a_la_primera_pagina(self):
+        def cursor(datos):
+            return base64.urlsafe_b64encode(json.dumps(datos).encode()).decode()
+        primera = self.ids(self.paginador.page())
+        for manipulado in ('%%%', 'bm8gZXMganNvbg', cursor({'a': 1}), cursor(5), cursor([2, 'X', 'abc']),
+                           cursor([2, None, 1]), cursor([2, 'X']), cursor(['dos', 'X', 1]), cursor([1, 'X', 1])):
+            pagina = self.paginador.page(manipulado)
+            self.assertEqual((pagina.number, self.ids(pagina)), (1, primera), manipulado)
+        respuesta = Client().get(reverse('core:patient_list'), {'cursor': cursor([2, None, 1])})
+        self.assertEqual(respuesta.status_code, 200)
+
+
+class ImportarPacientesTest(TestCase):
+
+    def setUp(self):
+        TipoSangre.objects.create(tipo='O+', descripcion='O positivo')
+        rnd = random.Random(3)
+        self.cedulas = [cedula_aleatoria(rnd) for _ in range(6)]
+        Paciente.objects.create(nombres='Ana', apellidos='Vera', cedula=self.cedulas[5], fecha_nacimiento='1990-01-01',
+                                telefono='0991234567', sexo='F', estado_civil='S', direccion='Quito',
+                                email='ana@example.com')
+
+    def importar(self, filas, lote=2):
+        columnas = ['nombres', 'apellidos', 'cedula', 'fecha_nacimiento', 'telefono', 'sexo', 'estado_civil',
+                    'direccion', 'email', 'tipo_sangre']
+        texto = io.StringIO()
+        escritor = csv.writer(texto)
+        escritor.writerow(columnas)
+        for i, (cedula, email) in enumerate(filas):
+            escritor.writerow([f'Nombre{i}', 'Apellido', cedula, '01/02/1985', '0987654321', 'm', 's', 'Calle 1',
+                               email, 'o+'])
+        reporte = io.StringIO()
+        texto.seek(0)
+        resumen = importer.importar(importer.leer_csv(texto), csv.writer(reporte), lote=lote)
+        return resumen, [fila for fila in csv.reader(io.StringIO(reporte.getvalue()))]
+
+    def test_validas_rechazadas_y_reporte(self):
+        total = contar_pacientes()
+        resumen, reporte = self.importar([
+            (self.cedulas[0], 'uno@example.com'),
+            (self.cedulas[1], ''),
+            ('1234567890', 'dos@example.com'),       # cedula invalida
+            (self.cedulas[2], 'uno@example.com'),    # email repetido en el archivo
+            (self.cedulas[3], 'ANA@example.com'),    # email ya existente
+            ('', 'tres@example.com'),                # obligatorio vacio
+        ])
+        self.assertEqual(resumen, {'leidas': 6, 'importadas': 2, 'rechazadas': 4})
+        self.assertEqual(sorted(reporte), [
+            ['4', 'cedula', MENSAJES_CEDULA[int(valida_cedulas_lote(['1234567890'])[0])]],
+            ['5', 'email', 'Ya existe un paciente con este email.'],
+            ['6', 'email', 'Ya existe un paciente con este email.'],
+            ['7', 'cedula', 'Este campo es obligatorio.'],
+        ])
+        importado = Paciente.objects.get(email='uno@example.com')
+        self.assertEqual((importado.sexo, importado.estado_civil, importado.tipo_sangre.tipo), ('M', 'S', 'O+'))
+        self.assertEqual(contar_pacientes(), total + 2)
+
+    def test_email_insertado_por_otro_proceso(self):
+        # el email aparece despues de validar el bloque: el COPY falla y se reintenta fila por fila
+        validar = importer.ValidadorPaciente.validar_bloque
+
+        def validar_y_competir(validador, bloque):
+            resultado = validar(validador, bloque)
+            Paciente.objects.create(nombres='Luis', apellidos='Paz', cedula=self.cedulas[4],
+                                    fecha_nacimiento='1980-05-05', telefono='0991234567', sexo='M',
+                                    estado_civil='C', direccion='Quito', email='dos@example.com')
+            return resultado
+
+        total = contar_pacientes()
+        with mock.patch.object(importer.ValidadorPaciente, 'validar_bloque', validar_y_competir):
+            resumen, reporte = self.importar([
+                (self.cedulas[0], 'uno@example.com'),
+                (self.cedulas[1], 'dos@example.com'),
+                (self.cedulas[2], 'tres@example.com'),
+            ], lote=10)
+        self.assertEqual(resumen, {'leidas': 3, 'importadas': 2, 'rechazadas': 1})
+        self.assertEqual(reporte, [['3', 'email', 'Ya existe un paciente con este email.']])
+        self.assertEqual(Paciente.objects.filter(email__in=['uno@example.com', 'tres@example.com']).count(), 2)
+        self.assertEqual(contar_pacientes(), total + 3)
+
+
+class ParticionesAuditoriaTest(SimpleTestCase):
+
+    def test_rango_meses_cruza_el_anio(self):
+        self.assertEqual(rango_meses(datetime.date(2024, 11, 15), 3),
+                         [(2024, 11), (2024, 12), (2025, 1), (2025, 2)])
+        self.assertEqual(rango_meses(datetime.date(2024, 12, 31), 0), [(2024, 12)])
+
+    def test_sentencias_mueven_las_filas_de_default(self):
+        self.assertEqual(sentencias_crear([]), [])
+        sentencias = sentencias_crear([(2024, 12), (2025, 1)])
+        self.assertEqual(sentencias[0], 'ALTER TABLE core_audituser DETACH PARTITION core_audituser_default')
+        self.assertEqual(sentencias[-1], 'ALTER TABLE core_audituser ATTACH PARTITION core_audituser_default DEFAULT')
+        self.assertEqual(len(sentencias), 2 + 3 * 2)
+        crear, mover, borrar = sentencias[4:7]
+        self.assertEqual(crear, "CREATE TABLE core_audituser_p2025_01 PARTITION OF core_audituser "
+                                "FOR VALUES FROM ('2025-01-01 00:00:00+00') TO ('2025-02-01 00:00:00+00')")
+        rango = "fecha_hora >= '2025-01-01 00:00:00+00' AND fecha_hora < '2025-02-01 00:00:00+00'"
+        self.assertTrue(mover.startswith('INSERT INTO core_audituser (id, '))
+        self.assertTrue(mover.endswith(f'FROM core_audituser_default WHERE {rango}'))
+        self.assertEqual(borrar, f'DELETE FROM core_audituser_default WHERE {rango}')
+        self.assertIn("TO ('2025-01-01 00:00:00+00')", sentencias[1])
+
+
+class ContadoresPacientesTest(TestCase):
+
+    def crear(self, cedula, sexo='M', activo=True):
+        return Paciente.objects.create(nombres='Ana', apellidos='Vera', cedula=cedula, fecha_nacimiento='1990-01-01',
+                                       telefono='0991234567', sexo=sexo, estado_civil='S', direccion='Quito',
+                                       activo=activo)
+
+    def totales(self):
+        return (contar_pacientes(), contar_pacientes(sexo='M'), contar_pacientes(sexo='F'),
+                contar_pacientes(activo=True), contar_pacientes(activo=False))
+
+    def reales(self):
+        pacientes = Paciente.objects.all()
+        return (pacientes.count(), pacientes.filter(sexo='M').count(), pacientes.filter(sexo='F').count(),
+                pacientes.filter(activo=True).count(), pacientes.filter(activo=False).count())
+
+    def test_crear_modificar_y_borrar(self):
+        rnd = random.Random(5)
+        self.assertEqual(self.totales(), (0, 0, 0, 0, 0))
+        uno = self.crear(cedula_aleatoria(rnd))
+        self.crear(cedula_aleatoria(rnd), sexo='F', activo=False)
+        self.assertEqual(self.totales(), (2, 1, 1, 1, 1))
+        uno.sexo, uno.activo = 'F', False
+        uno.save()
+        self.assertEqual(self.totales(), (2, 0, 2, 0, 2))
+        # guardar sin cambios en sexo/activo no mueve nada
+        Paciente.objects.get(pk=uno.pk).save()
+        self.assertEqual(self.totales(), (2, 0, 2, 0, 2))
+        Paciente.objects.get(pk=uno.pk).delete()
+        self.assertEqual(self.totales(), (1, 0, 1, 0, 1))
+        self.assertEqual(self.totales(), self.reales())
+
+    def test_actualizar_en_bloque_y_recalcular(self):
+        rnd = random.Random(6)
+        for i in range(6):
+            self.crear(cedula_aleatoria(rnd), sexo='MF'[i % 2], activo=i < 4)
+        self.assertEqual(actualizar_pacientes(Paciente.objects.filter(sexo='M'), activo=False), 3)
+        self.assertEqual(self.totales(), (6, 3, 3, 2, 4))
+        actualizar_pacientes(Paciente.objects.filter(activo=False), sexo='F', activo=True)
+        self.assertEqual(self.totales(), self.reales())
+        # un update() directo desfasa los contadores hasta recalcular
+        Paciente.objects.filter(sexo='F').update(activo=False)
+        self.assertNotEqual(self.totales(), self.reales())
+        valores = recalcular_contadores()
+        self.assertEqual(self.totales(), self.reales())
+        self.assertEqual(valores['paciente'], 6)
+        Contador.objects.all().delete()
+        # sin filas en Contador la primera lectura las siembra con el COUNT real
+        self.assertEqual(self.totales(), self.reales())
+
+
+class DetallePacienteCacheTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.paciente = Paciente.objects.create(
+            nombres='Ana', apellidos='Vera', cedula=cedula_aleatoria(random.Random(7)), fecha_nacimiento='1990-01-01',
+            telefono='0991234567', sexo='F', estado_civil='S', direccion='Quito')
+        self.url = reverse('core:patient_detail', args=[self.paciente.pk])
+
+    def test_revalidacion_con_etag(self):
+        primera = self.client.get(self.url)
+        self.assertEqual(primera.status_code, 200)
+        self.assertEqual(primera.json()['dni'], self.paciente.cedula)
+        # la segunda peticion sale de la cache y el navegador recibe 304 sin cuerpo
+        with CaptureQueriesContext(connection) as consultas:
+            segunda = self.client.get(self.url, HTTP_IF_NONE_MATCH=primera['ETag'])
+        self.assertEqual(segunda.status_code, 304)
+        self.assertEqual(segunda.content, b'')
+        self.assertEqual(len(consultas), 0)
+
+    def test_lote_cubre_la_pagina_mas_grande(self):
+        sembrar_pacientes(100)
+        ids = list(Paciente.objects.order_by('apellidos', 'id').values_list('id', flat=True)[:100])
+        respuesta = self.client.get(reverse('core:patient_detail_batch'), {'ids': ','.join(map(str, ids))})
+        self.assertEqual([paciente['id'] for paciente in respuesta.json()['pacientes']], ids)
+
+    def test_editar_cambia_el_etag(self):
+        primera = self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.paciente.telefono = '0987654321'
+            self.paciente.save()
+        segunda = self.client.get(self.url, HTTP_IF_NONE_MATCH=primera['ETag'])
+        self.assertEqual(segunda.status_code, 200)
+        self.assertNotEqual(segunda['ETag'], primera['ETag'])
+        self.assertEqual(segunda.json()['telefono'], '0987654321')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.paciente.delete()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+def fila_auditoria(usuario, registroid=1):
+    return AuditUser(usuario=usuario, tabla='Paciente', registroid=registroid, accion='A', estacion='127.0.0.1')
+
+
+class AuditoriaTest(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('auditor')
+        self.request = RequestFactory().get('/')
+        self.request.user = self.usuario
+
+    def test_rollback_descarta_la_fila(self):
+        paciente = Paciente(pk=7)
+        with mock.patch('doctor.audit.registrar') as registrar:
+            with self.captureOnCommitCallbacks(execute=True):
+                try:
+                    with transaction.atomic():
+                        save_audit(self.request, paciente, 'M')
+                        raise ValueError
+                except ValueError:
+                    pass
+            self.assertFalse(registrar.called)
+            with self.captureOnCommitCallbacks(execute=True):
+                save_audit(self.request, paciente, 'M')
+        (entry,), _ = registrar.call_args
+        self.assertEqual((entry.tabla, entry.registroid, entry.accion), ('Paciente', 7, 'M'))
+
+    @override_settings(AUDIT_BUFFER={'ENABLED': False})
+    def test_sin_buffer_guarda_sincronico(self):
+        with mock.patch('doctor.audit.get_buffer') as get_buffer:
+            audit.registrar(fila_auditoria(self.usuario))
+        self.assertFalse(get_buffer.called)
+        self.assertEqual(AuditUser.objects.count(), 1)
+
+    def test_cola_llena_guarda_sincronico(self):
+        buffer = audit.AuditBuffer(max_size=1, batch_size=10, flush_interval=60)
+        with mock.patch.object(buffer, '_iniciar'):
+            buffer.put(fila_auditoria(self.usuario, 1))
+            buffer.put(fila_auditoria(self.usuario, 2))
+        self.assertEqual(list(AuditUser.objects.values_list('registroid', flat=True)), [2])
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(AuditUser.objects.count(), 2)
+
+
+class AuditoriaHiloTest(TransactionTestCase):
+    # el hilo del buffer escribe con su propia conexion; se espera a que termine su
+    # flush antes de leer (SQLite en memoria compartida no espera los bloqueos)
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('auditor')
+
+    def iniciar(self, **opciones):
+        buffer = audit.AuditBuffer(**opciones)
+        self.addCleanup(buffer.stop)
+        self.escrito = threading.Event()
+        flush = buffer.flush
+
+        def flush_y_avisar():
+            escritas = flush()
+            if escritas:
+                self.escrito.set()
+            return escritas
+        buffer.flush = flush_y_avisar
+        return buffer
+
+    def test_escribe_al_completar_el_lote(self):
+        buffer = self.iniciar(batch_size=3, flush_interval=60)
+        for registroid in range(2):
+            buffer.put(fila_auditoria(self.usuario, registroid))
+        self.assertFalse(self.escrito.wait(0.3))
+        buffer.put(fila_auditoria(self.usuario, 2))
+        self.assertTrue(self.escrito.wait(5))
+        self.assertEqual(AuditUser.objects.count(), 3)
+
+    def test_escribe_por_intervalo(self):
+        buffer = self.iniciar(batch_size=100, flush_interval=0.2)
+        inicio = time.monotonic()
+        buffer.put(fila_auditoria(self.usuario))
+        self.assertTrue(self.escrito.wait(5))
+        self.assertLess(time.monotonic() - inicio, 2)
+        self.assertEqual(AuditUser.objects.count(), 1)
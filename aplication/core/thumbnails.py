@@ -0,0 +1,85 @@
+import hashlib
+import logging
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Miniaturas de Paciente.foto. Cada foto genera un derivado cuadrado por tamaño en
+# pacientes/thumbs/<nombre>_<hash>_<tamaño>.<ext>; la ruta se deduce del nombre
+# guardado completo (carpeta y extension incluidas: juan.png y juan.jpg son fotos
+# distintas). Al generarlas se marca Paciente.miniaturas, asi Paciente.get_image(tamaño)
+# arma la url sin consultar el storage en cada render y devuelve la foto original
+# mientras no esten. Despues de cambiar THUMBNAIL_FORMAT hay que correr
+# `generar_miniaturas --forzar`.
+
+# lado en pixeles (el doble del tamaño mostrado, para pantallas de alta densidad)
+TAMANOS = {
+    'lista': 64,
+    'modal': 400,
+}
+FORMATOS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+CALIDAD = 80
+CARPETA = 'pacientes/thumbs'
+
+
+def formato():
+    return getattr(settings, 'THUMBNAIL_FORMAT', 'WEBP').upper()
+
+
+def ruta_miniatura(nombre, tamano):
+    base = os.path.splitext(os.path.basename(nombre))[0]
+    huella = hashlib.sha1(nombre.encode()).hexdigest()[:12]
+    return f'{CARPETA}/{base}_{huella}_{tamano}.{FORMATOS[formato()]}'
+
+
+def url_miniatura(nombre, tamano, storage=default_storage):
+    return storage.url(ruta_miniatura(nombre, tamano))
+
+
+def generar_miniaturas(nombre, forzar=False, storage=default_storage):
+    # genera todas las miniaturas de una foto; devuelve las rutas escritas
+    pendientes = {t: ruta_miniatura(nombre, t) for t in TAMANOS}
+    if not forzar:
+        pendientes = {t: ruta for t, ruta in pendientes.items() if not storage.exists(ruta)}
+    if not pendientes:
+        return []
+    with storage.open(nombre, 'rb') as archivo:
+        imagen = ImageOps.exif_transpose(Image.open(archivo))
+        imagen.load()
+    fmt = formato()
+    transparente = 'A' in imagen.getbands() or 'transparency' in imagen.info
+    imagen = imagen.convert('RGBA' if transparente else 'RGB')
+    if fmt == 'JPEG' and transparente:
+        # JPEG no admite transparencia: se compone sobre fondo blanco
+        fondo = Image.new('RGB', imagen.size, 'white')
+        fondo.paste(imagen, mask=imagen.getchannel('A'))
+        imagen = fondo
+    escritas = []
+    for tamano, ruta in pendientes.items():
+        lado = TAMANOS[tamano]
+        miniatura = ImageOps.fit(imagen, (lado, lado), Image.Resampling.LANCZOS)
+        contenido = BytesIO()
+        if fmt == 'WEBP':
+            miniatura.save(contenido, fmt, quality=CALIDAD, method=4)
+        else:
+            miniatura.save(contenido, fmt, quality=CALIDAD, optimize=True, progressive=True)
+        if storage.exists(ruta):
+            storage.delete(ruta)
+        escritas.append(storage.save(ruta, ContentFile(contenido.getvalue())))
+    return escritas
+
+
+def generar_miniaturas_seguro(nombre, forzar=False):
+    # version que no interrumpe el guardado del formulario ni el backfill; None si fallo
+    try:
+        return generar_miniaturas(nombre, forzar=forzar)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        # archivo que no es imagen, corrupto o con demasiados pixeles
+        logger.exception('No se pudo generar las miniaturas de %s', nombre)
+        return None
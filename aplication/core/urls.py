@@ -1,6 +1,8 @@
 from django.urls import path
+from aplication.core.views.diagnosis import DiagnosisSearchView
 from aplication.core.views.home import HomeTemplateView
-from aplication.core.views.patient import PatientCreateView, PatientDeleteView, PatientDetailView, PatientListView, PatientUpdateView
+from aplication.core.views.medication import MedicationAutocompleteView
+from aplication.core.views.patient import PatientCreateView, PatientDeleteView, PatientDetailBatchView, PatientDetailView, PatientListView, PatientUpdateView
  
 app_name='core' # define un espacio de nombre para la aplicacion
 urlpatterns = [
@@ -17,4 +19,9 @@ urlpatterns = [
   path('patient_update/<int:pk>/', PatientUpdateView.as_view(),name='patient_update'),
   path('patient_delete/<int:pk>/', PatientDeleteView.as_view(),name='patient_delete'),
   path('patient_detail/<int:pk>/', PatientDetailView.as_view(),name='patient_detail'),
+  path('patient_detail_batch/', PatientDetailBatchView.as_view(),name='patient_detail_batch'),
+  # rutas medicamentos
+  path('medication_autocomplete/', MedicationAutocompleteView.as_view(),name='medication_autocomplete'),
+  # rutas diagnosticos
+  path('diagnosis_search/', DiagnosisSearchView.as_view(),name='diagnosis_search'),
 ]
\ No newline at end of file
@@ -0,0 +1,26 @@
+from django.http import JsonResponse
+from django.views.generic import View
+
+from aplication.core.models import Diagnostico
+from aplication.core.search import buscar_diagnosticos
+from doctor.mixins import ReadOnlyMixin
+
+
+class DiagnosisSearchView(ReadOnlyMixin, View):
+    # ?q=texto&limite=N -> diagnosticos activos por prefijo de codigo (E11, E11.9) o por
+    # palabras de la descripcion, ordenados por relevancia
+    limite = 20
+    max_limite = 50
+
+    def get(self, request, *args, **kwargs):
+        texto = request.GET.get('q', '').strip()
+        limite = request.GET.get('limite', '')
+        limite = min(int(limite), self.max_limite) if limite.isdigit() and int(limite) > 0 else self.limite
+        if not texto:
+            return JsonResponse({'resultados': []})
+        diagnosticos = buscar_diagnosticos(Diagnostico.objects.filter(activo=True), texto)
+        resultados = [
+            {'id': id, 'codigo': codigo, 'descripcion': descripcion}
+            for id, codigo, descripcion in diagnosticos.values_list('id', 'codigo', 'descripcion')[:limite]
+        ]
+        return JsonResponse({'resultados': resultados})
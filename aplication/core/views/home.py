@@ -1,13 +1,15 @@
 from django.views.generic import TemplateView
 
 from aplication.core.models import Paciente
+from doctor.mixins import ReadOnlyMixin
 
-class HomeTemplateView(TemplateView):
+class HomeTemplateView(ReadOnlyMixin, TemplateView):
     template_name = 'core/home.html'
+    # consultas maximas por peticion (doctor/middleware.py), con sesion y usuario
+    query_budget = 4
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context = {"title1": "SaludSync", "title2": "Sistema Medico"}
         context["can_paci"] = Paciente.cantidad_pacientes()
-        print(context["can_paci"])
         return context
\ No newline at end of file
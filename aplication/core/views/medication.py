@@ -0,0 +1,18 @@
+from django.http import JsonResponse
+from django.views.generic import View
+
+from aplication.core.autocomplete import LIMITE, autocompletar
+from doctor.mixins import ReadOnlyMixin
+
+
+class MedicationAutocompleteView(ReadOnlyMixin, View):
+    # ?q=texto&limite=N -> medicamentos activos cuyo nombre, concentracion, tipo o
+    # marca empiezan por cada palabra (sin distinguir mayusculas ni tildes)
+    max_limite = 50
+    # el indice en memoria se arma con la version del catalogo: lee de la primaria
+    read_replica = False
+
+    def get(self, request, *args, **kwargs):
+        limite = request.GET.get('limite', '')
+        limite = min(int(limite), self.max_limite) if limite.isdigit() and int(limite) > 0 else LIMITE
+        return JsonResponse({'resultados': autocompletar(request.GET.get('q', ''), limite)})
@@ -1,29 +1,48 @@
 from django.urls import reverse_lazy
 from aplication.core.forms.patient import PatientForm
 from aplication.core.models import Paciente
-from django.views.generic import CreateView, ListView, UpdateView, DeleteView, DetailView
+from django.views.generic import CreateView, ListView, UpdateView, DeleteView, DetailView, View
+from django.views.decorators.http import condition
+from django.utils.decorators import method_decorator
 from django.http import JsonResponse
 from django.contrib import messages
 from django.db.models import Q
 from doctor.utils import save_audit
+from aplication.core.search import buscar_pacientes
+from aplication.core.cache import detalle_paciente, detalles_pacientes, etag as detalle_etag, respuesta as detalle_respuesta
+from aplication.core.counters import contar_pacientes
+from doctor.mixins import KeysetPaginationMixin, ReadOnlyMixin
+from doctor.pagination import EstimatedCountPaginator
 
-class PatientListView(ListView):
+class PatientListView(ReadOnlyMixin, KeysetPaginationMixin, ListView):
     template_name = "core/patient/list.html"
     model = Paciente
     context_object_name = 'pacientes'
     query = None
     paginate_by = 2
+    # consultas maximas por peticion (doctor/middleware.py), con sesion y usuario
+    query_budget = 6
+    
+    # con busqueda el total usa la estimacion del planificador si es grande
+    paginator_class = EstimatedCountPaginator
+    
+    def use_keyset(self, queryset):
+        # con busqueda los resultados van por relevancia: se pagina con OFFSET
+        return not self.request.GET.get('q', '').strip()
+    
+    def get_total_count(self, queryset):
+        # sin busqueda el total sale de los contadores mantenidos (O(1))
+        sex = self.request.GET.get('sex')
+        return contar_pacientes(sexo=sex if sex in ('M', 'F') else None)
     
     def get_queryset(self):
         self.query = Q()
         q1 = self.request.GET.get('q') # ver
         sex= self.request.GET.get('sex')
-        if q1 is not None: 
-            self.query.add(Q(nombres__icontains=q1), Q.OR) 
-            self.query.add(Q(apellidos__icontains=q1), Q.OR) 
-            self.query.add(Q(cedula__icontains=q1), Q.OR) 
-        if sex == "M" or sex=="F": self.query.add(Q(sexo__icontains=sex), Q.AND)   
-        return self.model.objects.filter(self.query).order_by('apellidos')
+        if sex == "M" or sex=="F": self.query.add(Q(sexo=sex), Q.AND)
+        queryset = self.model.objects.filter(self.query).order_by('apellidos')
+        # busqueda por indices (trigram/FTS5/cedula) ordenada por relevancia
+        return buscar_pacientes(queryset, q1)
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -106,21 +125,33 @@ class PatientDeleteView(DeleteView):
         # self.object.save()
         return super().delete(request, *args, **kwargs)
     
-class PatientDetailView(DetailView):
+def _detalle_etag(request, pk):
+    return detalle_etag(detalle_paciente(pk))
+
+def _detalle_modificado(request, pk):
+    return detalle_paciente(pk)['modificado']
+
+class PatientDetailView(ReadOnlyMixin, DetailView):
     model = Paciente
+    query_budget = 4
+    # llena la cache del detalle: lee de la primaria
+    read_replica = False
+    
+    # el navegador revalida con If-None-Match / If-Modified-Since y recibe 304 si no cambio
+    @method_decorator(condition(etag_func=_detalle_etag, last_modified_func=_detalle_modificado))
+    def get(self, request, *args, **kwargs):
+        data = detalle_respuesta(detalle_paciente(kwargs['pk']))
+        response = JsonResponse(data)
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+class PatientDetailBatchView(ReadOnlyMixin, View):
+    # detalle de varios pacientes en una sola peticion (?ids=1,2,3) para precargar el listado;
+    # el tope es la pagina mas grande del listado: la plantilla manda todos sus ids
+    max_ids = max(KeysetPaginationMixin.page_size_options)
+    read_replica = False
     
     def get(self, request, *args, **kwargs):
-        pacient = self.get_object()
-        data = {
-            'id': pacient.id,
-            'nombres': pacient.nombres,
-            'apellidos': pacient.apellidos,
-            'foto': pacient.get_image(),
-            'fecha_nac': pacient.fecha_nacimiento,
-            'edad': pacient.calcular_edad(pacient.fecha_nacimiento),
-            'dni': pacient.cedula,
-            'telefono': pacient.telefono,
-            'direccion': pacient.direccion,
-            # Añade más campos según tu modelo
-        }
-        return JsonResponse(data)
\ No newline at end of file
+        ids = [int(i) for i in request.GET.get('ids', '').split(',') if i.strip().isdigit()][:self.max_ids]
+        pacientes = [detalle_respuesta(detalle) for detalle in detalles_pacientes(list(dict.fromkeys(ids)))]
+        return JsonResponse({'pacientes': pacientes})
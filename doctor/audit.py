@@ -0,0 +1,123 @@
+import atexit
+import logging
+import queue
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+# Escritura diferida de la auditoria (AuditUser).
+# save_audit encola la fila cuando la transaccion de la peticion confirma y un hilo
+# del proceso la inserta junto con otras mediante bulk_create, por tamaño de lote
+# o por tiempo. Si la cola esta llena la fila se guarda de forma sincronica.
+# Configuracion en settings.AUDIT_BUFFER (ENABLED, MAX_SIZE, BATCH_SIZE, FLUSH_INTERVAL).
+
+DEFAULTS = {
+    'ENABLED': True,
+    'MAX_SIZE': 10000,
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 2.0,
+}
+
+
+def configuracion():
+    return {**DEFAULTS, **getattr(settings, 'AUDIT_BUFFER', {})}
+
+
+class AuditBuffer(object):
+    def __init__(self, max_size=10000, batch_size=500, flush_interval=2.0):
+        self.queue = queue.Queue(maxsize=max_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._despertar = threading.Event()
+        self._detenido = threading.Event()
+        self._lock = threading.Lock()
+        self._hilo = None
+
+    def _iniciar(self):
+        # el hilo se crea en el primer uso, ya dentro del proceso worker
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._detenido.clear()
+                self._hilo = threading.Thread(target=self._ejecutar, name='audit-buffer', daemon=True)
+                self._hilo.start()
+
+    def put(self, entry):
+        self._iniciar()
+        try:
+            self.queue.put_nowait(entry)
+        except queue.Full:
+            # desborde: la fila no se pierde, se escribe en el hilo de la peticion
+            entry.save()
+            return
+        if self.queue.qsize() >= self.batch_size:
+            self._despertar.set()
+
+    def _tomar_lote(self):
+        lote = []
+        while len(lote) < self.batch_size:
+            try:
+                lote.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return lote
+
+    def flush(self):
+        from aplication.core.models import AuditUser
+        escritas = 0
+        lote = self._tomar_lote()
+        while lote:
+            try:
+                AuditUser.objects.bulk_create(lote, batch_size=self.batch_size)
+            except Exception:
+                logger.exception('Fallo el bulk_create de auditoria; se reintenta fila por fila')
+                for entry in lote:
+                    try:
+                        entry.save()
+                    except Exception:
+                        logger.exception('No se pudo guardar la auditoria %s', entry.__dict__)
+            escritas += len(lote)
+            lote = self._tomar_lote()
+        return escritas
+
+    def _ejecutar(self):
+        while not self._detenido.is_set():
+            self._despertar.wait(self.flush_interval)
+            self._despertar.clear()
+            close_old_connections()
+            self.flush()
+        close_old_connections()
+
+    def stop(self):
+        # detiene el hilo y escribe lo pendiente en el hilo que llama (atexit)
+        self._detenido.set()
+        self._despertar.set()
+        if self._hilo is not None and self._hilo is not threading.current_thread():
+            self._hilo.join(timeout=self.flush_interval + 5)
+        return self.flush()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                conf = configuracion()
+                _buffer = AuditBuffer(conf['MAX_SIZE'], conf['BATCH_SIZE'], conf['FLUSH_INTERVAL'])
+                atexit.register(_buffer.stop)
+    return _buffer
+
+
+def registrar(entry):
+    if configuracion()['ENABLED']:
+        get_buffer().put(entry)
+    else:
+        entry.save()
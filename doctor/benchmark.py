@@ -0,0 +1,66 @@
+import statistics
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+
+from doctor.sintetico import LOTE, generar
+
+# Utilidades compartidas por los comandos de benchmark (bench_*).
+# Los benchmarks siempre corren sobre una base de pruebas creada y destruida
+# por el propio comando, nunca sobre la base de datos configurada.
+
+@contextmanager
+def base_de_pruebas(keepdb=False):
+    # crea la base de pruebas (migraciones incluidas) y la destruye al terminar
+    nombre_original = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(nombre_original, verbosity=0, keepdb=keepdb)
+
+
+def cedula_aleatoria(rnd):
+    # provincia (01-24), tercer digito menor a 6 y digito verificador de valida_cedula
+    provincia = rnd.randint(1, 24)
+    digitos = [provincia // 10, provincia % 10, rnd.randint(0, 5)] + [rnd.randint(0, 9) for _ in range(6)]
+    total = 0
+    for i, digito in enumerate(digitos):
+        producto = digito * (2 if i % 2 == 0 else 1)
+        total += producto - 9 if producto > 9 else producto
+    return ''.join(map(str, digitos)) + str((total * 9) % 10)
+
+
+def sembrar_pacientes(hasta, lote=LOTE, semilla=1):
+    # agrega pacientes sinteticos (doctor/sintetico.py) hasta alcanzar 'hasta' filas
+    from aplication.core.models import Paciente
+    actuales = Paciente.objects.count()
+    if actuales < hasta:
+        generar(hasta - actuales, historias=False, lote=lote, semilla=semilla)
+    return max(actuales, hasta)
+
+
+def sembrar_clinica(hasta, lote=LOTE, semilla=1):
+    # pacientes hasta 'hasta' filas y, para los nuevos, su historia clinica
+    # (citas, atenciones, medicamentos, diagnosticos y examenes)
+    from aplication.core.models import Paciente
+    actuales = Paciente.objects.count()
+    if actuales < hasta:
+        generar(hasta - actuales, historias=True, lote=lote, semilla=semilla)
+    return max(actuales, hasta)
+
+
+def medir(funcion, repeticiones=20):
+    # devuelve estadisticas de latencia en milisegundos
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    tiempos.sort()
+    return {
+        'mediana_ms': round(statistics.median(tiempos), 3),
+        'p95_ms': round(tiempos[max(0, int(len(tiempos) * 0.95) - 1)], 3),
+        'max_ms': round(tiempos[-1], 3),
+    }
@@ -0,0 +1,136 @@
+import threading
+import time
+
+from django import forms
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+# Catalogos de referencia en memoria del proceso.
+# Los catalogos pequeños (tipos de sangre, especialidades, tipos y marcas de medicamento,
+# cargos, categorias de examen) se leen una vez por proceso y se reutilizan en cada
+# formulario y pagina del admin: CatalogChoiceField arma las opciones del select sin
+# consultar la base. Cada catalogo tiene un numero de version en la cache compartida
+# (settings.CACHES); al confirmar un cambio se incrementa (ver core/signals.py) y cada
+# proceso vuelve a leer el catalogo cuando ve otra version. La version se consulta como
+# mucho una vez cada VERIFICAR_CADA segundos: otro proceso puede mostrar el catalogo
+# anterior ese tiempo. Las instancias se comparten entre peticiones: solo lectura.
+
+CATALOGOS = ('core.TipoSangre', 'core.Especialidad', 'core.TipoMedicamento', 'core.MarcaMedicamento',
+             'core.Cargo', 'core.CategoriaExamen')
+VERIFICAR_CADA = 1.0
+
+
+def _version_nueva():
+    # si la cache pierde la clave, la siguiente version no repite ninguna anterior
+    return time.time_ns()
+
+
+def version(clave):
+    valor = cache.get(clave)
+    if valor is None:
+        cache.add(clave, _version_nueva(), None)
+        valor = cache.get(clave)
+    return valor
+
+
+def incrementar(clave):
+    try:
+        cache.incr(clave)
+    except ValueError:
+        cache.add(clave, _version_nueva(), None)
+
+
+class Versionado(object):
+    # valor que devuelve cargar(), guardado en el proceso mientras no cambie la version
+    # de 'clave' en la cache compartida
+    def __init__(self, clave, cargar, verificar_cada=VERIFICAR_CADA):
+        self.clave = clave
+        self.cargar = cargar
+        self.verificar_cada = verificar_cada
+        self.valor = None
+        self.version = None
+        self.verificado = 0.0
+        self._lock = threading.Lock()
+
+    def obtener(self):
+        ahora = time.monotonic()
+        if self.version is not None and ahora - self.verificado < self.verificar_cada:
+            return self.valor
+        actual = version(self.clave)
+        if actual != self.version:
+            with self._lock:
+                # otro hilo pudo recargarlo mientras se esperaba el lock
+                if actual != self.version:
+                    self.valor = self.cargar()
+                    self.version = actual
+        self.verificado = ahora
+        return self.valor
+
+    def invalidar(self):
+        incrementar(self.clave)
+        # en este proceso el cambio se ve en la siguiente consulta
+        self.verificado = 0.0
+
+
+_catalogos = {}
+
+
+def es_catalogo(modelo):
+    return modelo._meta.label in CATALOGOS
+
+
+def _catalogo(modelo):
+    etiqueta = modelo._meta.label
+    if etiqueta not in CATALOGOS:
+        raise ValueError(f'{etiqueta} no es un catalogo (ver CATALOGOS)')
+    catalogo = _catalogos.get(etiqueta)
+    if catalogo is None:
+        # filas en el orden del modelo (Meta.ordering), de la primaria: una replica
+        # atrasada dejaria en el proceso el catalogo anterior con la version nueva
+        def cargar():
+            return tuple(modelo._default_manager.using(DEFAULT_DB_ALIAS))
+        catalogo = _catalogos.setdefault(etiqueta, Versionado(f'catalogo:{etiqueta}:version', cargar))
+    return catalogo
+
+
+def filas(modelo):
+    return _catalogo(modelo).obtener()
+
+
+def invalidar(modelo):
+    _catalogo(modelo).invalidar()
+
+
+class CatalogChoiceIterator(forms.models.ModelChoiceIterator):
+    # opciones desde el catalogo en memoria; si el queryset del campo esta filtrado
+    # (limit_choices_to, un queryset propio) se usa la consulta de Django
+    def _en_memoria(self):
+        return es_catalogo(self.queryset.model) and not self.queryset.query.has_filters()
+
+    def __iter__(self):
+        if not self._en_memoria():
+            yield from super().__iter__()
+            return
+        if self.field.empty_label is not None:
+            yield ('', self.field.empty_label)
+        for obj in filas(self.queryset.model):
+            yield self.choice(obj)
+
+    def __len__(self):
+        if not self._en_memoria():
+            return super().__len__()
+        return len(filas(self.queryset.model)) + (1 if self.field.empty_label is not None else 0)
+
+    def __bool__(self):
+        if not self._en_memoria():
+            return super().__bool__()
+        return self.field.empty_label is not None or bool(filas(self.queryset.model))
+
+
+# La validacion del valor enviado sigue consultando la base (una fila por pk)
+class CatalogChoiceField(forms.ModelChoiceField):
+    iterator = CatalogChoiceIterator
+
+
+class CatalogMultipleChoiceField(forms.ModelMultipleChoiceField):
+    iterator = CatalogChoiceIterator
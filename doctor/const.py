@@ -12,3 +12,6 @@ DIA_SEMANA_CHOICES = [
     ]
 CITA_CHOICES = [('P', 'Programada'), ('C', 'Cancelada'), ('R', 'Realizada')]
 EXAMEN_CHOICES=[('S', 'Solicitado'),('R', 'Realizado')]
+MOVIMIENTO_CHOICES = [('S', 'Saldo'), ('D', 'Dispensación'), ('I', 'Ingreso'), ('A', 'Ajuste')]
+PERIODO_CHOICES = [('D', 'Diario'), ('M', 'Mensual')]
+CARGA_CHOICES = [('P', 'Pendiente'), ('C', 'Completada')]
@@ -0,0 +1,163 @@
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from doctor import routers
+
+logger = logging.getLogger('doctor.queries')
+
+# Presupuesto de consultas SQL por peticion.
+# QueryBudgetMiddleware instala un execute_wrapper en cada conexion mientras se atiende
+# la peticion (y mientras se envia una respuesta streaming) y registra cuantas
+# consultas se hicieron, el tiempo total en la base y las huellas repetidas: la misma
+# sentencia con otros parametros ejecutada REPETIDAS o mas veces suele ser un N+1
+# (un acceso a una relacion dentro de un bucle). Escribe una linea JSON por peticion en
+# el logger 'doctor.queries': INFO si todo esta bien, WARNING si hay N+1 o si se paso
+# del presupuesto de la vista (atributo query_budget de la vista o de su clase).
+# Configuracion en settings.QUERY_BUDGET (ENABLED, REPEATED, DEFAULT_BUDGET).
+
+DEFAULTS = {
+    'ENABLED': True,
+    'REPEATED': 5,
+    'DEFAULT_BUDGET': None,
+}
+MAXIMO_SQL = 300
+
+_literales = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_listas = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+_espacios = re.compile(r'\s+')
+
+
+def configuracion():
+    return {**DEFAULTS, **getattr(settings, 'QUERY_BUDGET', {})}
+
+
+def huella(sql):
+    # la sentencia sin valores: literales -> %s y listas IN de cualquier largo -> (...)
+    sql = _literales.sub('%s', sql)
+    sql = _listas.sub('(...)', sql)
+    return _espacios.sub(' ', sql).strip()
+
+
+class RegistroConsultas(object):
+    # execute_wrapper que cuenta consultas, tiempo y huellas
+    def __init__(self):
+        self.cantidad = 0
+        self.segundos = 0.0
+        self.huellas = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.segundos += time.perf_counter() - inicio
+            self.cantidad += 1
+            self.huellas[huella(sql)] += 1
+
+    def instalar(self):
+        # el wrapper se activa en todas las conexiones del hilo actual
+        stack = ExitStack()
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(self))
+        return stack
+
+    def repetidas(self, minimo):
+        return [(sql, veces) for sql, veces in self.huellas.most_common() if veces >= minimo]
+
+
+def presupuesto_de(view_func):
+    # query_budget de la funcion (decorada) o de la clase de una vista basada en clases
+    presupuesto = getattr(view_func, 'query_budget', None)
+    if presupuesto is None:
+        presupuesto = getattr(getattr(view_func, 'view_class', None), 'query_budget', None)
+    return presupuesto
+
+
+class QueryBudgetMiddleware(object):
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        conf = configuracion()
+        if not conf['ENABLED']:
+            return self.get_response(request)
+        registro = RegistroConsultas()
+        request.query_budget = conf['DEFAULT_BUDGET']
+        inicio = time.perf_counter()
+        with registro.instalar():
+            response = self.get_response(request)
+        if response.streaming:
+            # el contenido se genera (y consulta) mientras se envia
+            response.streaming_content = self._streaming(response.streaming_content, registro, request,
+                                                         response, inicio, conf)
+        else:
+            self._registrar(registro, request, response, inicio, conf)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        presupuesto = presupuesto_de(view_func)
+        if presupuesto is not None:
+            request.query_budget = presupuesto
+
+    def _streaming(self, contenido, registro, request, response, inicio, conf):
+        try:
+            with registro.instalar():
+                yield from contenido
+        finally:
+            self._registrar(registro, request, response, inicio, conf)
+
+    def _registrar(self, registro, request, response, inicio, conf):
+        presupuesto = getattr(request, 'query_budget', None)
+        repetidas = registro.repetidas(conf['REPEATED'])
+        excedido = presupuesto is not None and registro.cantidad > presupuesto
+        match = getattr(request, 'resolver_match', None)
+        linea = {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'queries': registro.cantidad,
+            'db_ms': round(registro.segundos * 1000, 2),
+            'total_ms': round((time.perf_counter() - inicio) * 1000, 2),
+            'budget': presupuesto,
+            'over_budget': excedido,
+            'n_plus_one': bool(repetidas),
+            'repeated': [{'sql': sql[:MAXIMO_SQL], 'count': veces} for sql, veces in repetidas],
+        }
+        logger.log(logging.WARNING if excedido or repetidas else logging.INFO, json.dumps(linea), extra={'consultas': linea})
+
+
+class ReplicaRoutingMiddleware(object):
+    # Lecturas a una replica en las peticiones GET/HEAD a vistas con read_replica
+    # (ReadOnlyMixin, ver doctor/routers.py), salvo que la sesion haya escrito hace menos
+    # de STICKY_SECONDS. Si la peticion escribe guarda la hora en la sesion.
+    # Va despues de SessionMiddleware.
+    metodos = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with routers.contexto() as estado:
+            response = self.get_response(request)
+        if estado['escritura'] and hasattr(request, 'session'):
+            request.session[routers.ULTIMA_ESCRITURA] = time.time()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in self.metodos or not getattr(view_func, 'read_replica', False):
+            return
+        conf = routers.configuracion()
+        if hasattr(request, 'session'):
+            ultima = request.session.get(routers.ULTIMA_ESCRITURA, 0)
+            if time.time() - ultima < conf['STICKY_SECONDS']:
+                return
+        routers.usar_replica(routers.elegir_replica())
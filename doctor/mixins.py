@@ -1,4 +1,11 @@
+from django.db import transaction
 from django.db.models import Q
+from django.db.models.functions import Upper
+
+from aplication.core.models import Paciente
+from aplication.core.search import buscar_pacientes
+from doctor.catalogs import CatalogChoiceField, CatalogMultipleChoiceField, es_catalogo
+from doctor.pagination import EstimatedCountPaginator, KeysetPage, KeysetPaginator
 
 class ListViewMixin(object):
     query = None
@@ -18,4 +25,135 @@ class ListViewMixin(object):
         ### context['permissions'] = self._get_permission_dict_of_group() 
         # crear la data y la session con los menus y modulos del usuario 
         ### MenuModule(self.request).fill(context)
-        return context
\ No newline at end of file
+        return context
+
+
+class ReadOnlyMixin(object):
+    # Vistas que solo leen: sin la transaccion de ATOMIC_REQUESTS y, con read_replica,
+    # sus GET leen de una replica (ReplicaRoutingMiddleware, doctor/routers.py). Las
+    # vistas que llenan una cache dejan read_replica = False: una replica atrasada
+    # volveria a guardar en la cache datos que ya se invalidaron.
+    read_replica = True
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        view.read_replica = cls.read_replica
+        return transaction.non_atomic_requests(view)
+
+
+class KeysetPaginationMixin(object):
+    # Paginacion por cursor sobre (apellidos, id) para ListView. Cuando use_keyset()
+    # devuelve False (p. ej. resultados ordenados por relevancia) se usa el
+    # paginador OFFSET de Django y la navegacion se construye con get_elided_page_range.
+    keyset_fields = ('apellidos', 'id')
+    page_window = 2
+    page_size_options = (10, 25, 50, 100)
+    cursor_kwarg = 'cursor'
+    size_kwarg = 'size'
+
+    def use_keyset(self, queryset):
+        return True
+
+    def get_total_count(self, queryset):
+        # total mostrado en la paginacion; las vistas pueden leerlo de contadores
+        return queryset.count()
+
+    def get_paginate_by(self, queryset):
+        size = self.request.GET.get(self.size_kwarg, '')
+        if size.isdigit() and int(size) in self.page_size_options:
+            return int(size)
+        return super().get_paginate_by(queryset)
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.use_keyset(queryset):
+            return super().paginate_queryset(queryset, page_size)
+        paginator = KeysetPaginator(queryset, page_size, self.keyset_fields, self.page_window,
+                                    count=lambda: self.get_total_count(queryset))
+        page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+    def _page_url(self, **params):
+        query = self.request.GET.copy()
+        for key in (self.cursor_kwarg, self.page_kwarg):
+            query.pop(key, None)
+        for key, value in params.items():
+            if value is not None:
+                query[key] = value
+        return f'?{query.urlencode()}'
+
+    def get_page_links(self, page):
+        # enlaces de la barra de paginacion: primera, anterior, ventana y siguiente
+        if isinstance(page, KeysetPage):
+            ventana = [
+                {'numero': p['numero'], 'actual': p['actual'], 'url': self._page_url(**{self.cursor_kwarg: p['cursor']})}
+                for p in page.ventana
+            ]
+            anterior = self._page_url(**{self.cursor_kwarg: page.previous_cursor}) if page.has_previous() else None
+            siguiente = self._page_url(**{self.cursor_kwarg: page.next_cursor}) if page.has_next() else None
+        else:
+            ventana = [
+                {'numero': numero, 'actual': numero == page.number,
+                 'url': None if numero == page.paginator.ELLIPSIS else self._page_url(**{self.page_kwarg: numero})}
+                for numero in page.paginator.get_elided_page_range(page.number, on_each_side=self.page_window, on_ends=1)
+            ]
+            anterior = self._page_url(**{self.page_kwarg: page.previous_page_number()}) if page.has_previous() else None
+            siguiente = self._page_url(**{self.page_kwarg: page.next_page_number()}) if page.has_next() else None
+        return {
+            'primera': self._page_url() if page.has_previous() else None,
+            'anterior': anterior,
+            'ventana': ventana,
+            'siguiente': siguiente,
+            'tamanos': self.page_size_options,
+        }
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        if context.get('page_obj') is not None:
+            context['navegacion'] = self.get_page_links(context['page_obj'])
+        return context
+
+
+class TablaGrandeAdminMixin(object):
+    # Changelist del admin para tablas grandes: el total de la paginacion usa la
+    # estimacion del planificador (Postgres, mas de 10k filas) y con filtros o busqueda
+    # no se hace el segundo COUNT(*) de toda la tabla ("x de N en total").
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class BusquedaPacienteAdminMixin(object):
+    # Busqueda del admin por el paciente relacionado con los indices de
+    # core/search.py (cedula exacta o por prefijo, trigram/FTS5 en nombres y apellidos)
+    # en lugar de icontains sin indice sobre cada campo.
+    # prefijo_fields: campos de texto que ademas se buscan por prefijo sin distinguir
+    # mayusculas, como rango sobre un indice de UPPER(campo) (p. ej. 'medicamento__nombre').
+    paciente_lookup = 'paciente'
+    prefijo_fields = ()
+
+    def get_search_results(self, request, queryset, search_term):
+        texto = search_term.strip()
+        if not texto:
+            return queryset, False
+        pacientes = buscar_pacientes(Paciente.objects.all(), texto, ordenar=False).values('pk')
+        filtro = Q(**{f'{self.paciente_lookup}__in': pacientes})
+        prefijo = texto.upper()
+        for i, campo in enumerate(self.prefijo_fields):
+            alias = f'_prefijo_{i}'
+            queryset = queryset.alias(**{alias: Upper(campo)})
+            filtro |= Q(**{f'{alias}__gte': prefijo, f'{alias}__lt': prefijo + '\uffff'})
+        return queryset.filter(filtro), False
+
+
+class CatalogoAdminMixin(object):
+    # selects de FK y M2M a catalogos de referencia desde la memoria del proceso
+    # (doctor/catalogs.py): el formulario del admin no los consulta en cada pagina
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if es_catalogo(db_field.related_model):
+            kwargs.setdefault('form_class', CatalogChoiceField)
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def formfield_for_manytomany(self, db_field, request, **kwargs):
+        if es_catalogo(db_field.related_model):
+            kwargs.setdefault('form_class', CatalogMultipleChoiceField)
+        return super().formfield_for_manytomany(db_field, request, **kwargs)
@@ -0,0 +1,197 @@
+import base64
+import json
+import math
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from doctor.utils import conteo_estimado
+
+# Paginacion por cursor (keyset). En lugar de OFFSET cada pagina se pide como
+# "filas despues de la clave (apellidos, id) de la ultima fila vista", de modo que
+# la pagina 1000 cuesta lo mismo que la pagina 1: un rango sobre el indice.
+# El cursor viaja en la url como base64 de [numero_pagina, *clave].
+
+
+def _comparar(campos, clave, operador):
+    # (a, b) > (x, y)  ==  a >= x AND (a > x OR (a = x AND b > y)). El primer termino
+    # es redundante pero le da al planificador donde empezar el recorrido del indice
+    # (apellidos, id); sin el, el OR se evalua fila por fila desde el inicio del indice
+    filtro = Q()
+    for i, campo in enumerate(campos):
+        iguales = {c: v for c, v in zip(campos[:i], clave[:i])}
+        filtro |= Q(**iguales, **{f'{campo}__{operador}': clave[i]})
+    if len(campos) > 1:
+        filtro &= Q(**{f'{campos[0]}__{operador}e': clave[0]})
+    return filtro
+
+
+def _despues_de(campos, clave):
+    return _comparar(campos, clave, 'gt')
+
+
+def _antes_de(campos, clave):
+    return _comparar(campos, clave, 'lt')
+
+
+class KeysetPage(object):
+    def __init__(self, paginator, object_list, number, has_next, ventana):
+        self.paginator = paginator
+        self.object_list = object_list
+        self.number = number
+        self._has_next = has_next
+        # lista de {'numero', 'cursor', 'actual'} con las paginas vecinas alcanzables
+        self.ventana = ventana
+
+    def __repr__(self):
+        return f'<KeysetPage {self.number}>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self.number > 1
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def _cursor_de(self, numero):
+        for pagina in self.ventana:
+            if pagina['numero'] == numero:
+                return pagina['cursor']
+        return None
+
+    @property
+    def next_cursor(self):
+        return self._cursor_de(self.number + 1)
+
+    @property
+    def previous_cursor(self):
+        return self._cursor_de(self.number - 1)
+
+    def start_index(self):
+        if not self.object_list:
+            return 0
+        return (self.number - 1) * self.paginator.per_page + 1
+
+    def end_index(self):
+        return self.start_index() + len(self.object_list) - 1 if self.object_list else 0
+
+
+class KeysetPaginator(object):
+    def __init__(self, queryset, per_page, fields=('apellidos', 'id'), window=2, count=None):
+        # los campos deben ser no nulos y el ultimo unico (normalmente el id)
+        self.fields = tuple(fields)
+        self.queryset = queryset.order_by(*self.fields)
+        self.per_page = int(per_page)
+        self.window = window
+        # funcion opcional que devuelve el total sin recorrer la tabla (contadores, estimaciones)
+        self._count = count
+
+    def encode(self, numero, clave):
+        if clave is None:
+            return None
+        datos = json.dumps([numero, *clave], cls=DjangoJSONEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(datos.encode()).decode().rstrip('=')
+
+    def decode(self, cursor):
+        # un cursor invalido o manipulado equivale a la primera pagina
+        try:
+            datos = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            if not isinstance(datos, list) or len(datos) != len(self.fields) + 1:
+                return 1, None
+            numero, clave = int(datos[0]), self._validar(datos[1:])
+        except (TypeError, ValueError, KeyError, ValidationError, FieldDoesNotExist):
+            return 1, None
+        if numero < 2:
+            return 1, None
+        return numero, clave
+
+    def _validar(self, valores):
+        # cada componente convertido al tipo de su campo (si no, el filter() fallaria)
+        opciones = self.queryset.model._meta
+        clave = []
+        for campo, valor in zip(self.fields, valores):
+            field = opciones.pk if campo == 'pk' else opciones.get_field(campo)
+            valor = field.to_python(valor)
+            if valor is None:
+                raise ValueError(f'{campo} nulo en el cursor')
+            clave.append(valor)
+        return tuple(clave)
+
+    def _clave(self, obj):
+        return tuple(getattr(obj, campo) for campo in self.fields)
+
+    @cached_property
+    def count(self):
+        if self._count is not None:
+            return self._count()
+        return self.queryset.count()
+
+    @property
+    def num_pages(self):
+        return max(1, math.ceil(self.count / self.per_page))
+
+    def page(self, cursor=None):
+        numero, clave = self.decode(cursor) if cursor else (1, None)
+        filas = self.queryset.filter(_despues_de(self.fields, clave)) if clave else self.queryset
+        object_list = list(filas[:self.per_page])
+        if not object_list and clave:
+            # el cursor apunta mas alla del final (filas borradas): se vuelve al inicio
+            return self.page(None)
+
+        ventana = [{'numero': numero, 'cursor': cursor if clave else None, 'actual': True}]
+        if object_list:
+            ultima = self._clave(object_list[-1])
+            # claves de las paginas siguientes: un rango acotado a per_page * window filas
+            siguientes = list(self.queryset.filter(_despues_de(self.fields, ultima))
+                              .values_list(*self.fields)[:self.per_page * self.window])
+            for j in range(1, self.window + 1):
+                if len(siguientes) <= self.per_page * (j - 1):
+                    break
+                inicio = ultima if j == 1 else siguientes[self.per_page * (j - 1) - 1]
+                ventana.append({'numero': numero + j, 'cursor': self.encode(numero + j, inicio), 'actual': False})
+            has_next = bool(siguientes)
+        else:
+            has_next = False
+
+        if clave and object_list:
+            # claves anteriores en orden descendente para construir los enlaces hacia atras
+            limite = self.per_page * self.window + 1
+            orden_inverso = [f'-{campo}' for campo in self.fields]
+            anteriores = list(self.queryset.filter(_antes_de(self.fields, self._clave(object_list[0])))
+                              .order_by(*orden_inverso).values_list(*self.fields)[:limite])
+            if len(anteriores) < limite:
+                # se conoce el inicio de la lista: el numero real puede diferir si hubo altas o bajas
+                numero = math.ceil(len(anteriores) / self.per_page) + 1
+                ventana[0]['numero'] = numero
+                for k, pagina in enumerate(ventana[1:], start=1):
+                    pagina['numero'] = numero + k
+                    pagina['cursor'] = self.encode(numero + k, self.decode(pagina['cursor'])[1])
+            for j in range(1, self.window + 1):
+                if numero - j < 1:
+                    break
+                if len(anteriores) > self.per_page * j and numero - j > 1:
+                    cursor_anterior = self.encode(numero - j, anteriores[self.per_page * j])
+                else:
+                    cursor_anterior = None
+                ventana.insert(0, {'numero': numero - j, 'cursor': cursor_anterior, 'actual': False})
+                if cursor_anterior is None:
+                    break
+        return KeysetPage(self, object_list, numero, has_next, ventana)
+
+
+class EstimatedCountPaginator(Paginator):
+    # Paginator OFFSET cuyo total usa la estimacion del planificador cuando es grande
+    @cached_property
+    def count(self):
+        return conteo_estimado(self.object_list)
@@ -0,0 +1,87 @@
+import contextvars
+import random
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# Enrutamiento de lecturas a replicas.
+# Las escrituras van siempre a la primaria (default). Las lecturas van a una replica solo
+# dentro de un contexto de lectura: una peticion GET a una vista ReadOnlyMixin con
+# read_replica (lo activa ReplicaRoutingMiddleware) o un bloque desde_replica() en
+# reportes y comandos. Fuera de esos contextos todo se lee de la primaria.
+# Lectura de lo propio: cuando una peticion escribe, el middleware guarda la hora en la
+# sesion y durante STICKY_SECONDS las siguientes peticiones de esa sesion leen de la
+# primaria (la replica puede no tener aun lo que se acaba de guardar).
+# Configuracion en settings.REPLICA_ROUTING (REPLICAS, STICKY_SECONDS).
+
+DEFAULTS = {
+    'REPLICAS': [],
+    'STICKY_SECONDS': 10,
+}
+ULTIMA_ESCRITURA = '_db_ultima_escritura'
+
+# {'replica': alias o None, 'escritura': bool} del contexto actual (peticion o bloque)
+_estado = contextvars.ContextVar('doctor_db_estado', default=None)
+
+
+def configuracion():
+    return {**DEFAULTS, **getattr(settings, 'REPLICA_ROUTING', {})}
+
+
+def elegir_replica():
+    # una replica por contexto: todas sus lecturas ven el mismo estado
+    replicas = configuracion()['REPLICAS']
+    return random.choice(replicas) if replicas else None
+
+
+@contextmanager
+def contexto(replica=None):
+    # estado nuevo para una peticion o bloque; devuelve el dict para consultar 'escritura'
+    estado = {'replica': replica, 'escritura': False}
+    token = _estado.set(estado)
+    try:
+        yield estado
+    finally:
+        _estado.reset(token)
+
+
+@contextmanager
+def desde_replica():
+    # lecturas del bloque desde una replica (reportes, exportaciones); las escrituras
+    # siguen yendo a la primaria
+    with contexto(elegir_replica()) as estado:
+        yield estado
+
+
+def usar_replica(alias):
+    # cambia el destino de las lecturas del contexto actual (p. ej. en process_view)
+    estado = _estado.get()
+    if estado is not None:
+        estado['replica'] = alias
+
+
+class ReplicaRouter(object):
+
+    def db_for_read(self, model, **hints):
+        estado = _estado.get()
+        return estado['replica'] if estado else None
+
+    def db_for_write(self, model, **hints):
+        estado = _estado.get()
+        if estado is not None:
+            estado['escritura'] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # las replicas tienen los mismos datos que la primaria
+        bases = {DEFAULT_DB_ALIAS, *configuracion()['REPLICAS']}
+        if obj1._state.db in bases and obj2._state.db in bases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # las replicas reciben el esquema por la replicacion
+        if db in configuracion()['REPLICAS']:
+            return False
+        return None
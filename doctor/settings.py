@@ -22,6 +22,8 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    # lookups de pg_trgm (trigram_word_similar) para la busqueda de core/search.py
+    'django.contrib.postgres',
     
     # my apps 
     'aplication.core.apps.CoreConfig',
@@ -36,12 +38,16 @@ SHELL_PLUS_PRINT_SQL = True
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # primero: cuenta tambien las consultas de sesion y autenticacion
+    'doctor.middleware.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # despues de la sesion: lecturas a replicas en las vistas de solo lectura
+    'doctor.middleware.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'doctor.urls'
@@ -68,18 +74,112 @@ WSGI_APPLICATION = 'doctor.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
-    "default": {
+# Conexiones: DB_CONN_MAX_AGE segundos de conexion persistente por hilo (0 = una por
+# peticion) o, con Postgres, un pool por proceso con DB_POOL_MAX > 0 (DB_POOL_MIN,
+# DB_POOL_TIMEOUT; usa psycopg_pool, ver requirements.txt). Django no permite pool y
+# conexiones persistentes a la vez.
+DB_POOL_MAX = int(os.environ.get("DB_POOL_MAX", "0"))
+
+def _conexion(**extra):
+    conexion = {
         'ENGINE': os.environ.get("DB_ENGINE", "django.db.backends.postgresql"),
         'NAME': os.environ.get("DB_DATABASE", ""),
         'USER': os.environ.get("DB_USERNAME", ""),
         'PASSWORD': os.environ.get("DB_PASSWORD", ""),
         'HOST': os.environ.get("DB_SOCKET", ""),
         'PORT': os.environ.get("DB_PORT", "5432"),
-        'ATOMIC_REQUESTS': True
+        'CONN_MAX_AGE': 0 if DB_POOL_MAX else int(os.environ.get("DB_CONN_MAX_AGE", "0")),
+        'CONN_HEALTH_CHECKS': True,
+    }
+    if DB_POOL_MAX:
+        conexion['OPTIONS'] = {'pool': {
+            'min_size': int(os.environ.get("DB_POOL_MIN", "1")),
+            'max_size': DB_POOL_MAX,
+            'timeout': float(os.environ.get("DB_POOL_TIMEOUT", "10")),
+        }}
+    conexion.update(extra)
+    return conexion
+
+DATABASES = {
+    "default": _conexion(ATOMIC_REQUESTS=True),
+}
+
+# Replicas de solo lectura (doctor/routers.py): DB_REPLICAS="host1,host2:5433"; con
+# SQLite son rutas de archivos. Se llaman replica1, replica2...; en los tests son un
+# espejo de default. Sin replicas todo se lee de la primaria.
+for numero, replica in enumerate(filter(None, os.environ.get("DB_REPLICAS", "").split(',')), 1):
+    if 'sqlite' in DATABASES['default']['ENGINE']:
+        destino = {'NAME': replica.strip()}
+    else:
+        host, _, puerto = replica.strip().partition(':')
+        destino = {'HOST': host, 'PORT': puerto or DATABASES['default']['PORT']}
+    DATABASES[f'replica{numero}'] = _conexion(**destino, TEST={'MIRROR': 'default'})
+
+DATABASE_ROUTERS = ['doctor.routers.ReplicaRouter']
+REPLICA_ROUTING = {
+    'REPLICAS': [alias for alias in DATABASES if alias != 'default'],
+    # segundos que una sesion lee de la primaria despues de escribir
+    'STICKY_SECONDS': int(os.environ.get("DB_STICKY_SECONDS", "10")),
+}
+
+# Segunda base 'replica' para los tests de enrutamiento: fuera de los tests apunta a la
+# primaria y no se usa (no esta en REPLICA_ROUTING); en los tests es otra base local (no
+# un espejo) para ver a donde va cada consulta. Solo la crean y usan los tests que la
+# declaran en 'databases' y la activan con override_settings(REPLICA_ROUTING=...).
+DATABASES['replica'] = _conexion(TEST={} if 'sqlite' in DATABASES['default']['ENGINE']
+                                 else {'NAME': f"test_{DATABASES['default']['NAME']}_replica"})
+
+# Cache. Por defecto en memoria del proceso; con varios procesos (gunicorn, uwsgi) debe
+# ser compartida para que las versiones de los catalogos (doctor/catalogs.py) y las
+# invalidaciones lleguen a todos, p. ej.
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache CACHE_LOCATION=redis://127.0.0.1:6379/1
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        'LOCATION': os.environ.get("CACHE_LOCATION", "doctor"),
+        'KEY_PREFIX': 'doctor',
     }
 }
 
+# Auditoria diferida (doctor/audit.py): las filas de AuditUser se insertan por lotes
+# desde un hilo del proceso. ENABLED=False vuelve a la escritura sincronica.
+AUDIT_BUFFER = {
+    'ENABLED': os.environ.get("AUDIT_BUFFER_ENABLED", "1") == "1",
+    'MAX_SIZE': 10000,        # filas maximas en cola antes de escribir de forma sincronica
+    'BATCH_SIZE': 500,        # filas por bulk_create
+    'FLUSH_INTERVAL': 2.0,    # segundos maximos que una fila espera en la cola
+}
+
+# Consultas SQL por peticion (doctor/middleware.py): una linea JSON por peticion en el
+# logger 'doctor.queries'; WARNING si hay N+1 (REPEATED consultas iguales) o si se pasa
+# del query_budget de la vista (DEFAULT_BUDGET para las vistas que no lo declaran).
+QUERY_BUDGET = {
+    'ENABLED': os.environ.get("QUERY_BUDGET_ENABLED", "1") == "1",
+    'REPEATED': 5,
+    'DEFAULT_BUDGET': None,
+}
+
+# En desarrollo (DEBUG) se muestran todas las lineas; si no, solo los WARNING
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'require_debug_true': {'()': 'django.utils.log.RequireDebugTrue'},
+        'require_debug_false': {'()': 'django.utils.log.RequireDebugFalse'},
+    },
+    'handlers': {
+        'consultas_debug': {'class': 'logging.StreamHandler', 'filters': ['require_debug_true']},
+        'consultas_avisos': {'class': 'logging.StreamHandler', 'level': 'WARNING', 'filters': ['require_debug_false']},
+    },
+    'loggers': {
+        'doctor.queries': {
+            'handlers': ['consultas_debug', 'consultas_avisos'],
+            'level': os.environ.get("QUERY_LOG_LEVEL", "INFO"),
+            'propagate': False,
+        },
+    },
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -118,6 +218,9 @@ STATIC_URL = 'static/' # url de archivos estaticos
 STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)#carpeta fisica de archivos estaticos
 MEDIA_ROOT = os.path.join(BASE_DIR,'media') # carpeta fisica de archivos de Imagenes
 MEDIA_URL = '/media/' # 
+THUMBNAIL_FORMAT = 'WEBP' # formato de las miniaturas de fotos (WEBP o JPEG)
+CARGAS_DIR = os.path.join(BASE_DIR,'cargas') # cargas por partes en curso (fuera de MEDIA_ROOT: no se publican)
+CARGA_TAMANO_MAXIMO = 1024 * 1024 * 1024 # tamaño maximo de un resultado de examen (1 GB)
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
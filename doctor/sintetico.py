@@ -0,0 +1,243 @@
+from datetime import date, datetime, time as hora, timezone as tz
+
+import numpy as np
+from django.core.management.color import no_style
+from django.db import connections, router, transaction
+
+from doctor.utils import _COEFICIENTES_CEDULA, copiar_filas
+
+# Generador de datos sinteticos para pruebas de carga: pacientes con cedula valida
+# (digito verificador de valida_cedula, sin repetir), telefono que cumple phone_regex,
+# sexo coherente con el nombre, estado civil segun la edad y tipo de sangre con la
+# distribucion de la poblacion, y su historia clinica (citas, atenciones con
+# medicamentos y diagnostico, examenes).
+# Cada lote se genera por columnas con NumPy y se escribe con copiar_filas (COPY en
+# Postgres, INSERT por lotes en SQLite) con los id ya asignados, asi las relaciones se
+# arman sin volver a leer la base. No pasa por save() ni por las señales: al terminar
+# se reinician las secuencias de id y se recalculan los contadores de pacientes.
+
+NOMBRES = {
+    'M': ['JUAN', 'CARLOS', 'LUIS', 'PEDRO', 'JOSE', 'MIGUEL', 'DIEGO', 'ANDRES', 'JORGE', 'RAUL',
+          'FERNANDO', 'DAVID', 'MARIO', 'XAVIER', 'PABLO', 'SEBASTIAN', 'MATEO', 'DANIEL', 'ROBERTO', 'VICENTE'],
+    'F': ['MARIA', 'ANA', 'SOFIA', 'LUCIA', 'ELENA', 'CARMEN', 'ROSA', 'PAULA', 'VALERIA', 'DANIELA',
+          'GABRIELA', 'ANDREA', 'KARLA', 'PATRICIA', 'MONICA', 'VERONICA', 'ISABEL', 'CAMILA', 'TERESA', 'NATALIA'],
+}
+APELLIDOS = ['PEREZ', 'GOMEZ', 'RAMIREZ', 'TORRES', 'VERA', 'MORA', 'CEDEÑO', 'ZAMBRANO', 'LOPEZ', 'MENDOZA',
+             'CASTRO', 'VILLACIS', 'SANCHEZ', 'MOREIRA', 'BRAVO', 'ORTIZ', 'PAZMIÑO', 'GUERRERO', 'AVILES', 'REYES',
+             'CEVALLOS', 'MACIAS', 'INTRIAGO', 'ALCIVAR', 'DELGADO', 'SALAZAR', 'QUIROZ', 'LOOR', 'ANCHUNDIA', 'BARRE']
+# tipo: (descripcion, proporcion aproximada en Ecuador)
+TIPOS_SANGRE = {
+    'O+': ('O positivo', 0.75), 'A+': ('A positivo', 0.14), 'B+': ('B positivo', 0.07), 'AB+': ('AB positivo', 0.01),
+    'O-': ('O negativo', 0.02), 'A-': ('A negativo', 0.005), 'B-': ('B negativo', 0.003), 'AB-': ('AB negativo', 0.002),
+}
+MOTIVOS = ['Dolor de cabeza', 'Fiebre', 'Control', 'Tos persistente', 'Dolor abdominal', 'Chequeo anual']
+EXAMENES = ['Hemograma', 'Glucosa', 'Perfil lipidico', 'Radiografia de torax', 'Ecografia', 'Urea y creatinina']
+
+# Historia por paciente (promedios, distribucion de Poisson salvo las citas). Las citas
+# ocupan turnos de 5 minutos de todo el dia hacia atras desde dentro de DIAS_FUTUROS
+# dias, sin cancelar, para no chocar con uniq_cita_turno: ~35 dias de agenda con 10k
+# pacientes y ~9 años con 1M.
+PROPORCIONES = {'citas': 1, 'atenciones': 1.5, 'detalles': 2, 'examenes': 0.5}
+TURNO_MINUTOS = 5
+TURNOS_POR_DIA = 24 * 60 // TURNO_MINUTOS
+DIAS_FUTUROS = 14
+LOTE = 50000
+
+# la cedula sale de una permutacion de 0..CEDULAS-1 (24 provincias x tercer digito 0-5
+# x 6 digitos): multiplicar por un primo que no divide a CEDULAS es biyectivo
+CEDULAS = 24 * 6 * 10 ** 6
+_PERMUTACION = 1_000_003
+
+
+def sembrar_catalogos(medicamentos=100, diagnosticos=200):
+    # tipos de sangre, horario de lunes a domingo, medicamentos (con su saldo de
+    # kardex) y diagnosticos; solo los que falten
+    from aplication.attention.models import HorarioAtencion
+    from aplication.core.models import Diagnostico, Medicamento, TipoMedicamento, TipoSangre
+    from doctor.const import DIA_SEMANA_CHOICES
+    for tipo, (descripcion, _) in TIPOS_SANGRE.items():
+        TipoSangre.objects.get_or_create(tipo=tipo, defaults={'descripcion': descripcion})
+    for dia, _ in DIA_SEMANA_CHOICES:
+        HorarioAtencion.objects.get_or_create(dia_semana=dia, defaults={
+            'hora_inicio': hora(8), 'hora_fin': hora(18), 'Intervalo_desde': hora(12), 'Intervalo_hasta': hora(13)})
+    tipo, _ = TipoMedicamento.objects.get_or_create(nombre='General')
+    existentes = set(Medicamento.objects.values_list('nombre', flat=True))
+    for i in range(medicamentos):
+        if f'MEDICAMENTO {i:04d}' not in existentes:
+            Medicamento.objects.create(tipo=tipo, nombre=f'MEDICAMENTO {i:04d}', concentracion='500 mg',
+                                       cantidad=10 ** 9, precio=1)
+    Diagnostico.objects.bulk_create([
+        Diagnostico(codigo=f'Z{i // 10:02d}.{i % 10}', descripcion=f'DIAGNOSTICO SINTETICO {i}')
+        for i in range(diagnosticos)
+    ], ignore_conflicts=True)
+
+
+def cedulas(ids):
+    # cedula valida y unica para cada id (< CEDULAS)
+    secuencia = (ids.astype(np.int64) * _PERMUTACION) % CEDULAS
+    digitos = np.empty((len(ids), 10), dtype=np.int16)
+    provincia = secuencia // (6 * 10 ** 6) + 1
+    digitos[:, 0], digitos[:, 1] = provincia // 10, provincia % 10
+    digitos[:, 2] = (secuencia // 10 ** 6) % 6
+    resto = secuencia % 10 ** 6
+    for i in range(6):
+        digitos[:, 8 - i] = (resto // 10 ** i) % 10
+    productos = digitos[:, :9] * _COEFICIENTES_CEDULA
+    productos -= 9 * (productos > 9)
+    digitos[:, 9] = (productos.sum(axis=1) * 9) % 10
+    return (digitos.astype(np.uint8) + ord('0')).tobytes().decode('ascii')
+
+
+def _texto_cedulas(ids):
+    texto = cedulas(ids)
+    return [texto[i:i + 10] for i in range(0, len(texto), 10)]
+
+
+def _elegir(rng, opciones, n):
+    return np.asarray(opciones, dtype=object)[rng.integers(0, len(opciones), n)]
+
+
+def _unir(*columnas):
+    # concatena columnas de textos (object) elemento a elemento
+    resultado = columnas[0]
+    for columna in columnas[1:]:
+        resultado = resultado + columna
+    return resultado
+
+
+def _fechas(base, dias):
+    # base (date) + dias (arreglo) -> textos AAAA-MM-DD
+    return (np.datetime64(base, 'D') + dias.astype('timedelta64[D]')).astype(str).tolist()
+
+
+def _momentos(base, segundos):
+    # datetime UTC + segundos -> textos 'AAAA-MM-DD HH:MM:SS' en UTC (la zona de la
+    # conexion de Django en Postgres y el formato que Django guarda en SQLite)
+    textos = (np.datetime64(base.replace(tzinfo=None), 's') + segundos.astype('timedelta64[s]')).astype(str)
+    return np.char.replace(textos, 'T', ' ').tolist()
+
+
+def _pacientes(rng, ids, hoy, tipos_sangre):
+    n = len(ids)
+    sexo = np.where(rng.random(n) < 0.5, 'M', 'F').astype(object)
+    nombres = np.where(sexo == 'M', _elegir(rng, NOMBRES['M'], n), _elegir(rng, NOMBRES['F'], n))
+    segundo_nombre = np.where(sexo == 'M', _elegir(rng, NOMBRES['M'], n), _elegir(rng, NOMBRES['F'], n))
+    apellidos = _unir(_elegir(rng, APELLIDOS, n), ' ', _elegir(rng, APELLIDOS, n))
+    # edades de 0 a 95 años, menos frecuentes las mayores
+    edad_dias = (rng.triangular(0, 20, 95, n) * 365.25).astype(np.int64)
+    edad = edad_dias // 365
+    estado_civil = np.full(n, 'S', dtype=object)
+    adultos = edad >= 18
+    sorteo = rng.random(n)
+    estado_civil[adultos & (sorteo >= 0.30)] = 'C'
+    estado_civil[adultos & (sorteo >= 0.65)] = 'U'
+    estado_civil[adultos & (sorteo >= 0.80)] = 'D'
+    estado_civil[adultos & (sorteo >= 0.90) & (edad >= 45)] = 'V'
+    tipos, proporciones = zip(*((tipos_sangre[tipo], datos[1]) for tipo, datos in TIPOS_SANGRE.items()))
+    telefono = np.char.add('09', np.char.zfill(rng.integers(0, 10 ** 8, n).astype(str), 8))
+    con_email = rng.random(n) < 0.6
+    return edad_dias, list(zip(
+        ids.tolist(),
+        _unir(nombres, ' ', segundo_nombre).tolist(),
+        apellidos.tolist(),
+        _texto_cedulas(ids),
+        _fechas(hoy, -edad_dias),
+        telefono.tolist(),
+        [f'paciente{id}@correo.test' if email else None for id, email in zip(ids.tolist(), con_email.tolist())],
+        sexo.tolist(),
+        estado_civil.tolist(),
+        _unir(np.full(n, 'Calle ', dtype=object), rng.integers(1, 200, n).astype(str).astype(object), ' y Av. ',
+              _elegir(rng, APELLIDOS, n)).tolist(),
+        rng.choice(tipos, n, p=np.array(proporciones) / sum(proporciones)).tolist(),
+        (rng.random(n) < 0.97).tolist(),
+        [False] * n,  # sin foto
+    ))
+
+
+COLUMNAS_PACIENTE = ['id', 'nombres', 'apellidos', 'cedula', 'fecha_nacimiento', 'telefono', 'email', 'sexo',
+                     'estado_civil', 'direccion', 'tipo_sangre_id', 'activo', 'miniaturas']
+
+
+def _siguiente_id(modelo, using):
+    return (modelo.objects.using(using).order_by('-id').values_list('id', flat=True).first() or 0) + 1
+
+
+def generar(cantidad, historias=True, lote=LOTE, semilla=1, using=None):
+    # agrega 'cantidad' pacientes (y sus historias). Devuelve las filas creadas por tabla
+    from aplication.attention.models import Atencion, CitaMedica, DetalleAtencion, ExamenSolicitado
+    from aplication.core.counters import recalcular_contadores
+    from aplication.core.models import Diagnostico, Medicamento, Paciente, TipoSangre
+    using = using or router.db_for_write(Paciente)
+    sembrar_catalogos()
+    tipos_sangre = dict(TipoSangre.objects.using(using).values_list('tipo', 'id'))
+    medicamentos = np.array(Medicamento.objects.using(using).values_list('id', flat=True))
+    diagnosticos = np.array(Diagnostico.objects.using(using).values_list('id', flat=True))
+    Diagnosticos = Atencion.diagnostico.through
+    modelos = [Paciente, CitaMedica, Atencion, DetalleAtencion, ExamenSolicitado, Diagnosticos]
+    siguiente = {modelo: _siguiente_id(modelo, using) for modelo in modelos}
+    if siguiente[Paciente] + cantidad > CEDULAS:
+        raise ValueError(f'El generador admite hasta {CEDULAS} pacientes.')
+    turno = CitaMedica.objects.using(using).count()
+    hoy = date.today()
+    ahora = datetime.now(tz.utc).replace(microsecond=0)
+    creados = dict.fromkeys((modelo._meta.model_name for modelo in modelos), 0)
+    rng = np.random.default_rng([semilla, siguiente[Paciente]])
+
+    def copiar(modelo, columnas, filas):
+        copiar_filas(modelo, columnas, filas, using, lote=5000)
+        creados[modelo._meta.model_name] += len(filas)
+        siguiente[modelo] += len(filas)
+
+    for inicio in range(0, cantidad, lote):
+        n = min(lote, cantidad - inicio)
+        ids = np.arange(siguiente[Paciente], siguiente[Paciente] + n)
+        edad_dias, pacientes = _pacientes(rng, ids, hoy, tipos_sangre)
+        with transaction.atomic(using=using):
+            copiar(Paciente, COLUMNAS_PACIENTE, pacientes)
+            if not historias:
+                continue
+            # citas: turnos consecutivos hacia atras; las futuras quedan Programadas
+            citas = np.repeat(ids, PROPORCIONES['citas'])
+            turnos = np.arange(turno, turno + len(citas))
+            turno += len(citas)
+            dias = DIAS_FUTUROS - turnos // TURNOS_POR_DIA
+            minutos = (turnos % TURNOS_POR_DIA) * TURNO_MINUTOS
+            horas = [hora(m // 60, m % 60).isoformat() for m in range(0, 24 * 60, TURNO_MINUTOS)]
+            copiar(CitaMedica, ['id', 'paciente_id', 'fecha', 'hora_cita', 'estado'], list(zip(
+                range(siguiente[CitaMedica], siguiente[CitaMedica] + len(citas)), citas.tolist(), _fechas(hoy, dias),
+                [horas[m // TURNO_MINUTOS] for m in minutos.tolist()], np.where(dias >= 0, 'P', 'R').tolist())))
+            # atenciones de los ultimos 5 años (nunca antes de nacer)
+            por_paciente = rng.poisson(PROPORCIONES['atenciones'], n)
+            pacientes_atencion = np.repeat(ids, por_paciente)
+            limite = np.minimum(np.repeat(edad_dias, por_paciente) * 86400, 5 * 365 * 86400) + 1
+            segundos = -(rng.random(len(pacientes_atencion)) * limite).astype(np.int64)
+            atenciones = np.arange(siguiente[Atencion], siguiente[Atencion] + len(pacientes_atencion))
+            copiar(Atencion, ['id', 'paciente_id', 'fecha_atencion', 'motivo_consulta', 'tratamiento'], list(zip(
+                atenciones.tolist(), pacientes_atencion.tolist(), _momentos(ahora, segundos),
+                _elegir(rng, MOTIVOS, len(atenciones)).tolist(), ['Segun indicaciones'] * len(atenciones))))
+            # medicamentos recetados y un diagnostico por atencion
+            detalles = np.repeat(atenciones, rng.poisson(PROPORCIONES['detalles'], len(atenciones)))
+            copiar(DetalleAtencion, ['id', 'atencion_id', 'medicamento_id', 'cantidad', 'prescripcion',
+                                     'duracion_tratamiento'], list(zip(
+                range(siguiente[DetalleAtencion], siguiente[DetalleAtencion] + len(detalles)), detalles.tolist(),
+                medicamentos[rng.integers(0, len(medicamentos), len(detalles))].tolist(),
+                rng.integers(1, 31, len(detalles)).tolist(), ['Cada 8 horas'] * len(detalles),
+                rng.integers(1, 11, len(detalles)).tolist())))
+            copiar(Diagnosticos, ['id', 'atencion_id', 'diagnostico_id'], list(zip(
+                range(siguiente[Diagnosticos], siguiente[Diagnosticos] + len(atenciones)), atenciones.tolist(),
+                diagnosticos[rng.integers(0, len(diagnosticos), len(atenciones))].tolist())))
+            # examenes de los ultimos 5 años
+            examenes = np.repeat(ids, rng.poisson(PROPORCIONES['examenes'], n))
+            copiar(ExamenSolicitado, ['id', 'nombre_examen', 'paciente_id', 'fecha_solicitud', 'estado'], list(zip(
+                range(siguiente[ExamenSolicitado], siguiente[ExamenSolicitado] + len(examenes)),
+                _elegir(rng, EXAMENES, len(examenes)).tolist(), examenes.tolist(),
+                _fechas(hoy, -rng.integers(0, 5 * 365, len(examenes))),
+                np.where(rng.random(len(examenes)) < 0.7, 'R', 'S').tolist())))
+
+    # los id se escribieron a mano: las secuencias de Postgres deben seguir desde el maximo
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), modelos):
+            cursor.execute(sql)
+    recalcular_contadores(using)
+    return creados
@@ -0,0 +1,34 @@
+from urllib.parse import urlsplit
+
+from django.test import Client
+from django.urls import resolve
+
+from doctor.middleware import RegistroConsultas, configuracion, presupuesto_de
+
+# Ayudas para los tests de rendimiento de las vistas.
+
+
+class QueryBudgetMixin(object):
+    # Para TestCase: assertQueryBudget(url) hace la peticion y falla si la vista hace
+    # mas consultas que su query_budget (o que 'budget') o si repite la misma consulta
+    # REPEATED o mas veces (N+1). Devuelve la respuesta; si es streaming su contenido ya
+    # se genero (dentro de la medicion) y se puede volver a leer.
+
+    def assertQueryBudget(self, url, budget=None, client=None, method='get', data=None, n_plus_one=False, **extra):
+        if budget is None:
+            budget = presupuesto_de(resolve(urlsplit(url).path).func)
+        if budget is None:
+            self.fail(f'La vista de {url} no declara query_budget')
+        client = client or Client()
+        registro = RegistroConsultas()
+        with registro.instalar():
+            response = getattr(client, method)(url, data, **extra)
+            if response.streaming:
+                response.streaming_content = [b''.join(response.streaming_content)]
+        detalle = '\n'.join(f'  {veces} x {sql}' for sql, veces in registro.huellas.most_common())
+        if registro.cantidad > budget:
+            self.fail(f'{url}: {registro.cantidad} consultas, el presupuesto es {budget}\n{detalle}')
+        repetidas = registro.repetidas(configuracion()['REPEATED'])
+        if repetidas and not n_plus_one:
+            self.fail(f'{url}: consultas repetidas (N+1)\n{detalle}')
+        return response
@@ -6,5 +6,6 @@ from django.urls import path,include
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('aplication.core.urls',namespace='core')),
+    path('attention/', include('aplication.attention.urls',namespace='attention')),
     
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT) # configuracion imagenes
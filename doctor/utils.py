@@ -1,7 +1,12 @@
+import io
+import itertools
+import json
 from datetime import datetime
 from decimal import Decimal
+
 from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator
+from django.db import connections, router, transaction
 from django.utils import timezone
 
 
@@ -30,6 +35,65 @@ def valida_cedula(value):
     if digito_verificador != int(cedula[9]):
         raise ValidationError('La cédula no es válida.')
       
+# Validacion de cedulas por lotes (importaciones y auditorias de datos): aplica las
+# mismas reglas que valida_cedula pero sobre arreglos de NumPy y devuelve un codigo
+# por fila en vez de lanzar ValidationError. NumPy se importa al validar el primer
+# lote: los modelos importan este modulo y no lo necesitan.
+CEDULA_VALIDA = 0
+CEDULA_NO_NUMERICA = 1
+CEDULA_LONGITUD = 2
+CEDULA_VERIFICADOR = 3
+
+MENSAJES_CEDULA = {
+    CEDULA_NO_NUMERICA: 'La cédula debe contener solo números.',
+    CEDULA_LONGITUD: 'Cantidad de dígitos incorrecta.',
+    CEDULA_VERIFICADOR: 'La cédula no es válida.',
+}
+
+_COEFICIENTES_CEDULA = (2, 1, 2, 1, 2, 1, 2, 1, 2)
+
+
+def _codigo_cedula(cedula):
+    # camino escalar para los casos raros (digitos unicode que no son ASCII)
+    try:
+        valida_cedula(cedula)
+    except ValidationError as error:
+        return next(codigo for codigo, mensaje in MENSAJES_CEDULA.items() if mensaje == error.message)
+    except ValueError:
+        # p. ej. superindices: isdigit() los acepta pero int() no
+        return CEDULA_NO_NUMERICA
+    return CEDULA_VALIDA
+
+
+def valida_cedulas_lote(valores):
+    import numpy as np
+
+    textos = [str(valor) for valor in valores]
+    total = len(textos)
+    codigos = np.zeros(total, dtype=np.uint8)
+    if not total:
+        return codigos
+    numericas = np.fromiter((t.isdigit() for t in textos), dtype=bool, count=total)
+    ascii_ = np.fromiter((t.isascii() for t in textos), dtype=bool, count=total)
+    longitudes = np.fromiter((len(t) for t in textos), dtype=np.int64, count=total)
+    codigos[~numericas] = CEDULA_NO_NUMERICA
+    codigos[numericas & (longitudes != 10)] = CEDULA_LONGITUD
+
+    candidatas = np.flatnonzero(numericas & (longitudes == 10) & ascii_)
+    if candidatas.size:
+        # matriz (n, 10) de digitos a partir de los bytes ASCII
+        buffer = ''.join([textos[i] for i in candidatas]).encode('ascii')
+        digitos = (np.frombuffer(buffer, dtype=np.uint8).reshape(-1, 10) - ord('0')).astype(np.int16)
+        productos = digitos[:, :9] * _COEFICIENTES_CEDULA
+        productos -= 9 * (productos > 9)
+        verificador = (productos.sum(axis=1) * 9) % 10
+        codigos[candidatas[verificador != digitos[:, 9]]] = CEDULA_VERIFICADOR
+
+    for i in np.flatnonzero(numericas & (longitudes == 10) & ~ascii_):
+        codigos[i] = _codigo_cedula(textos[i])
+    return codigos
+
+
 def valida_numero_entero_positivo(value):
     if not str(value).isdigit() or int(value) <= 0:
         raise ValidationError('Debe ingresar un número entero positivo válido.')
@@ -49,8 +113,89 @@ def custom_serializer(obj):
         return obj.isoformat()
     raise TypeError(f"Type {type(obj)} not serializable")
     
+# Conteo de un queryset que evita recorrer la tabla cuando el resultado es grande:
+# en Postgres se consulta la estimacion del planificador (EXPLAIN) y solo si es menor
+# al umbral se hace el COUNT(*) exacto. En otros motores siempre es exacto.
+def conteo_estimado(queryset, umbral=10000):
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    estimado = int(plan[0]['Plan']['Plan Rows'])
+    if estimado < umbral:
+        return queryset.count()
+    return estimado
+    
+# Insercion masiva con COPY ... FROM STDIN en Postgres (varias veces mas rapida que
+# los INSERT de bulk_create); en otros motores cae a bulk_create. Igual que
+# bulk_create no llama a save() ni envia señales, y no asigna los id a los objetos.
+def _celda_copy(valor):
+    # formato csv de COPY: los textos van entre comillas ("" es cadena vacia) y
+    # el campo vacio sin comillas es NULL
+    if type(valor) is str:
+        return '"' + valor.replace('"', '""') + '"'
+    if valor is None:
+        return ''
+    if isinstance(valor, bool):
+        return 't' if valor else 'f'
+    if isinstance(valor, (int, float, Decimal)):
+        return str(valor)
+    return '"' + str(valor).replace('"', '""') + '"'
+
+
+def copiar_objetos(modelo, objetos, using, lote=5000):
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        modelo.objects.using(using).bulk_create(objetos, batch_size=lote)
+        return
+    campos = [campo for campo in modelo._meta.concrete_fields if not campo.primary_key]
+    filas = ([campo.get_db_prep_save(campo.pre_save(objeto, True), connection) for campo in campos] for objeto in objetos)
+    copiar_filas(modelo, [campo.column for campo in campos], filas, using, lote)
+
+
+# Igual que copiar_objetos pero con filas ya preparadas para la base (tuplas en el orden
+# de 'columnas'), sin crear instancias del modelo: COPY en Postgres y INSERT por lotes
+# con executemany en los demas motores. Para cargas de millones de filas (doctor/sintetico.py).
+def copiar_filas(modelo, columnas, filas, using, lote=5000):
+    connection = connections[using]
+    tabla = connection.ops.quote_name(modelo._meta.db_table)
+    nombres = ', '.join(connection.ops.quote_name(columna) for columna in columnas)
+    if connection.vendor == 'postgresql':
+        from django.db.backends.postgresql.psycopg_any import is_psycopg3
+        copy = f'COPY {tabla} ({nombres}) FROM STDIN WITH (FORMAT csv)'
+        lineas = (','.join(_celda_copy(valor) for valor in fila) + '\n' for fila in filas)
+        # el COPY va directo al cursor del driver: sin wrap_database_errors sus errores no
+        # llegarian como IntegrityError/DataError de Django
+        with connection.cursor() as cursor, connection.wrap_database_errors:
+            if is_psycopg3:
+                # psycopg 3: se envia por bloques de 'lote' filas
+                with cursor.copy(copy) as destino:
+                    while True:
+                        bloque = ''.join(itertools.islice(lineas, lote))
+                        if not bloque:
+                            break
+                        destino.write(bloque)
+            else:
+                cursor.copy_expert(copy, io.StringIO(''.join(lineas)))
+        return
+    sql = f'INSERT INTO {tabla} ({nombres}) VALUES ({", ".join(["%s"] * len(columnas))})'
+    filas = iter(filas)
+    with connection.cursor() as cursor:
+        while True:
+            bloque = list(itertools.islice(filas, lote))
+            if not bloque:
+                break
+            cursor.executemany(sql, bloque)
+
+
 def save_audit(request, model, action):
     from aplication.core.models import AuditUser
+    from doctor.audit import registrar
     user = request.user
     # Obtain client ip address
     client_address = ip_client_address(request)
@@ -59,10 +204,10 @@ def save_audit(request, model, action):
                                          tabla=model.__class__.__name__,
                                          registroid=model.id,
                                          accion=action,
-                                         fecha=timezone.now().date(),
-                                         hora=timezone.now().time(),
+                                         fecha_hora=timezone.now(),
                                          estacion=client_address)
-    auditusuariotabla.save()
+    # se encola solo si la transaccion de la peticion confirma; un rollback la descarta
+    transaction.on_commit(lambda: registrar(auditusuariotabla), using=router.db_for_write(AuditUser))
 
 # Obtener el IP desde donde se esta accediendo
 def ip_client_address(request):